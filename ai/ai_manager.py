@@ -3,19 +3,65 @@ AI model management system for PixelCrafterX.
 Handles AI models, their loading, and inference.
 """
 
+import threading
+import time
 from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
 from typing import Dict, List, Optional, Type, Any
-import torch
 import numpy as np
 from PyQt6.QtGui import QImage
 
+from ai.batching import run_batched
+from utils.image.image_buffer import array_to_qimage, qimage_to_array
+from utils.lazy_import import lazy_import
+
+# Imported on first use; torch alone takes seconds to load
+torch = lazy_import("torch")
+
+@dataclass
+class ModelStats:
+    """Load and inference latency of a model."""
+    load_ms: float = 0.0
+    inference_count: int = 0
+    inference_total_ms: float = 0.0
+    last_inference_ms: float = 0.0
+    
+    def record_inference(self, seconds: float):
+        self.last_inference_ms = seconds * 1000
+        self.inference_count += 1
+        self.inference_total_ms += self.last_inference_ms
+        
+    @property
+    def mean_inference_ms(self) -> float:
+        return self.inference_total_ms / self.inference_count if self.inference_count else 0.0
+
 class AIModel(ABC):
     def __init__(self):
         self.name = "Base Model"
         self.category = "General"
         self.description = "Base AI model class"
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self._device: Optional[str] = None
         self.model = None
+        # Tiling used by the inference service; tile_size = 0 disables tiling
+        self.tile_size = 512
+        self.tile_overlap = 32
+        # Batching: 0 = use the manager default; activation memory is an
+        # estimate used to keep auto-tuned batches under the memory cap
+        self.batch_size = 0
+        self.activation_bytes_per_pixel = 256
+        self.stats = ModelStats()
+        
+    @property
+    def device(self) -> str:
+        """Get the compute device (resolved on first use, which imports torch)."""
+        if self._device is None:
+            self._device = "cuda" if torch.cuda.is_available() else "cpu"
+        return self._device
+        
+    @device.setter
+    def device(self, value: str):
+        self._device = value
         
     @abstractmethod
     def load(self):
@@ -32,6 +78,14 @@ class AIModel(ABC):
         """Process an image using the model."""
         pass
         
+    def process_array(self, arr: np.ndarray, **kwargs) -> np.ndarray:
+        """Process an H x W x 4 ARGB32 array (may be called from worker threads)."""
+        return qimage_to_array(self.process(array_to_qimage(arr), **kwargs))
+        
+    def process_batch(self, batch: np.ndarray, **kwargs) -> np.ndarray:
+        """Process an N x H x W x 4 stack of equally sized ARGB32 arrays."""
+        return np.stack([self.process_array(arr, **kwargs) for arr in batch])
+        
     def get_parameters(self) -> Dict:
         """Get model parameters."""
         return {}
@@ -51,10 +105,11 @@ class StyleTransferModel(AIModel):
     def load(self):
         """Load the style transfer model."""
         try:
-            # Load model from torch hub or local path
-            self.model = torch.hub.load('pytorch/vision:v0.10.0', 'resnet50', pretrained=True)
-            self.model.to(self.device)
-            self.model.eval()
+            # Load model from torch hub or local path; publish it only once it is ready
+            model = torch.hub.load('pytorch/vision:v0.10.0', 'resnet50', pretrained=True)
+            model.to(self.device)
+            model.eval()
+            self.model = model
             return True
         except Exception as e:
             print(f"Error loading model: {e}")
@@ -62,35 +117,45 @@ class StyleTransferModel(AIModel):
             
     def unload(self):
         """Unload the model."""
-        if self.model is not None:
-            self.model.cpu()
+        model, self.model = self.model, None
+        if model is not None:
+            model.cpu()
             torch.cuda.empty_cache()
-            self.model = None
             
     def process(self, image: QImage, **kwargs) -> QImage:
         """Process an image using style transfer."""
         if self.model is None:
             return image
-            
-        # Convert QImage to tensor
-        width = image.width()
-        height = image.height()
-        ptr = image.bits()
-        ptr.setsize(height * width * 4)
-        arr = np.frombuffer(ptr, np.uint8).reshape((height, width, 4))
-        tensor = torch.from_numpy(arr).float().div(255.0)
-        tensor = tensor.permute(2, 0, 1).unsqueeze(0)
+        return array_to_qimage(self.process_array(qimage_to_array(image), **kwargs))
+        
+    def process_array(self, arr: np.ndarray, **kwargs) -> np.ndarray:
+        """Process an ARGB32 array using style transfer."""
+        return self.process_batch(arr[None], **kwargs)[0]
+        
+    def process_batch(self, batch: np.ndarray, **kwargs) -> np.ndarray:
+        """Process a stack of ARGB32 arrays in one forward pass."""
+        # Another thread may unload the model meanwhile; keep the session for this call
+        model = self.model
+        if model is None:
+            return batch
+        strength = float(kwargs.get('style_strength', self.style_strength))
+        
+        # ARGB32 (B, G, R, A) -> RGB tensor
+        rgb = np.ascontiguousarray(batch[..., [2, 1, 0]])
+        tensor = torch.from_numpy(rgb).float().div(255.0)
+        tensor = tensor.permute(0, 3, 1, 2)
         tensor = tensor.to(self.device)
         
         # Apply style transfer
         with torch.no_grad():
-            output = self.model(tensor)
+            output = model(tensor)
             
-        # Convert back to QImage
-        output = output.squeeze(0).permute(1, 2, 0)
+        # Convert back, blending with the input by the style strength
+        output = output.permute(0, 2, 3, 1)
         output = output.cpu().numpy()
-        output = (output * 255).astype(np.uint8)
-        result = QImage(output.tobytes(), width, height, QImage.Format.Format_ARGB32)
+        styled = np.clip(output * 255.0 + 0.5, 0, 255)
+        result = batch.copy()
+        result[..., [2, 1, 0]] = (rgb * (1.0 - strength) + styled * strength).astype(np.uint8)
         return result
         
     def get_parameters(self) -> Dict:
@@ -101,13 +166,22 @@ class StyleTransferModel(AIModel):
             self.style_strength = float(kwargs['style_strength'])
 
 class AIModelManager:
-    def __init__(self):
+    def __init__(self, max_loaded_models: int = 2, default_batch_size: int = 4):
         self.models: Dict[str, AIModel] = {}
         self.categories: Dict[str, List[str]] = {}
+        # Warm pool of loaded models, least recently used first
+        self.max_loaded_models = max_loaded_models
+        self.loaded: "OrderedDict[str, AIModel]" = OrderedDict()
+        # Guards loading, unloading and the LRU order, which run on inference threads too
+        self._lock = threading.RLock()
+        self.default_batch_size = default_batch_size
         
     def register_model(self, model_class: Type[AIModel]) -> bool:
         """Register a new AI model."""
-        model_instance = model_class()
+        return self.add_model(model_class())
+        
+    def add_model(self, model_instance: AIModel) -> bool:
+        """Register an already constructed AI model."""
         name = model_instance.name
         
         if name not in self.models:
@@ -120,17 +194,29 @@ class AIModelManager:
         return False
         
     def load_model(self, name: str) -> bool:
-        """Load a model by name."""
+        """Load a model by name, unloading the least recently used ones."""
         model = self.get_model(name)
-        if model:
-            return model.load()
-        return False
+        if not model:
+            return False
+        with self._lock:
+            if model.model is None:
+                start = time.perf_counter()
+                if not model.load():
+                    return False
+                model.stats.load_ms = (time.perf_counter() - start) * 1000
+            self.loaded[name] = model
+            self.loaded.move_to_end(name)
+            while len(self.loaded) > max(self.max_loaded_models, 1):
+                self.unload_model(next(iter(self.loaded)))
+            return True
         
     def unload_model(self, name: str):
         """Unload a model by name."""
         model = self.get_model(name)
-        if model:
-            model.unload()
+        with self._lock:
+            if model:
+                model.unload()
+            self.loaded.pop(name, None)
             
     def get_model(self, name: str) -> Optional[AIModel]:
         """Get a model by name."""
@@ -150,9 +236,29 @@ class AIModelManager:
         """Process an image using a model."""
         model = self.get_model(name)
         if model:
-            return model.process(image, **kwargs)
+            # Loads the model if needed and marks it as recently used
+            self.load_model(name)
+            start = time.perf_counter()
+            result = model.process(image, **kwargs)
+            model.stats.record_inference(time.perf_counter() - start)
+            return result
         return None
         
+    def process_batch(self, name: str, images: List[np.ndarray], batch_size: Optional[int] = None,
+                      **kwargs) -> Optional[List[np.ndarray]]:
+        """Process many ARGB32 arrays, one forward pass per batch of equal-size images."""
+        model = self.get_model(name)
+        if not model:
+            return None
+        if not self.load_model(name):
+            return None
+        return run_batched(model, images, self.get_batch_size(name, batch_size), **kwargs)
+        
+    def get_batch_size(self, name: str, batch_size: Optional[int] = None) -> int:
+        """Get the batch size to use for a model."""
+        model = self.get_model(name)
+        return max(1, batch_size or (model.batch_size if model else 0) or self.default_batch_size)
+        
     def get_model_parameters(self, name: str) -> Dict:
         """Get parameters for a model."""
         model = self.get_model(name)
@@ -164,4 +270,17 @@ class AIModelManager:
         """Set parameters for a model."""
         model = self.get_model(name)
         if model:
-            model.set_parameters(**kwargs) 
\ No newline at end of file
+            model.set_parameters(**kwargs) 
+            
+    def get_model_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Get load and inference latency for every model."""
+        return {
+            name: {
+                'loaded': name in self.loaded,
+                'load_ms': model.stats.load_ms,
+                'inference_count': model.stats.inference_count,
+                'mean_inference_ms': model.stats.mean_inference_ms,
+                'last_inference_ms': model.stats.last_inference_ms
+            }
+            for name, model in self.models.items()
+        }
@@ -0,0 +1,118 @@
+"""
+Batched inference for PixelCrafterX.
+Groups equally sized images into batches and tunes the batch size.
+"""
+
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Batch sizes tried by the auto-tuner
+BATCH_CANDIDATES = (1, 2, 4, 8, 16, 32)
+
+# A larger batch must beat the best so far by this much to be chosen
+MIN_THROUGHPUT_GAIN = 0.05
+
+
+def group_indices(shapes: Sequence[Tuple[int, ...]], batch_size: int) -> Iterator[List[int]]:
+    """Yield index chunks of at most ``batch_size`` items sharing a shape."""
+    groups: "OrderedDict[Tuple[int, ...], List[int]]" = OrderedDict()
+    for index, shape in enumerate(shapes):
+        groups.setdefault(tuple(shape), []).append(index)
+    for indices in groups.values():
+        for start in range(0, len(indices), batch_size):
+            yield indices[start:start + batch_size]
+
+
+def iter_batches(images: Sequence[np.ndarray], batch_size: int) -> Iterator[Tuple[List[int], np.ndarray]]:
+    """Yield (indices, stacked batch) for groups of equally shaped images."""
+    for chunk in group_indices([image.shape for image in images], batch_size):
+        yield chunk, np.stack([images[i] for i in chunk])
+
+
+def run_batched(model, images: Sequence[np.ndarray], batch_size: int, **kwargs) -> List[np.ndarray]:
+    """Process images through ``model.process_batch`` and return them in input order."""
+    results: List[np.ndarray] = [None] * len(images)
+    for indices, batch in iter_batches(images, max(1, batch_size)):
+        start = time.perf_counter()
+        output = model.process_batch(batch, **kwargs)
+        model.stats.record_inference(time.perf_counter() - start)
+        for i, result in zip(indices, output):
+            results[i] = result
+    return results
+
+
+def estimate_batch_memory(model, batch_size: int, height: int, width: int) -> int:
+    """Estimate the bytes needed to run one batch (input, output and activations)."""
+    pixels = batch_size * height * width
+    return pixels * (2 * 3 * 4 + model.activation_bytes_per_pixel)
+
+
+def measure_throughput(model, shape: Tuple[int, int], batch_size: int,
+                       batches: int = 3, **kwargs) -> float:
+    """Measure images per second on synthetic input after one warm-up batch."""
+    rng = np.random.default_rng(0)
+    batch = rng.integers(0, 256, (batch_size,) + tuple(shape) + (4,), dtype=np.uint8)
+    model.process_batch(batch, **kwargs)
+    start = time.perf_counter()
+    for _ in range(batches):
+        model.process_batch(batch, **kwargs)
+    seconds = time.perf_counter() - start
+    return batch_size * batches / seconds if seconds > 0 else float('inf')
+
+
+@dataclass
+class BatchTuning:
+    """Result of tuning the batch size of a model."""
+    batch_size: int
+    throughput: Dict[int, float] = field(default_factory=dict)  # batch size -> images/s
+    skipped: List[int] = field(default_factory=list)  # over the memory cap
+
+
+def tune_batch_size(model, shape: Tuple[int, int], memory_cap_mb: int,
+                    candidates: Sequence[int] = BATCH_CANDIDATES, **kwargs) -> BatchTuning:
+    """Pick the batch size with the best throughput that fits the memory cap.
+
+    Candidates are tried in increasing order; tuning stops early once a
+    larger batch no longer improves throughput meaningfully. The chosen size
+    is stored on the model.
+    """
+    cap = memory_cap_mb * 1024 * 1024
+    tuning = BatchTuning(batch_size=1)
+    best = 0.0
+    for batch_size in sorted(candidates):
+        if batch_size > 1 and estimate_batch_memory(model, batch_size, *shape) > cap:
+            tuning.skipped.append(batch_size)
+            continue
+        throughput = measure_throughput(model, shape, batch_size, **kwargs)
+        tuning.throughput[batch_size] = throughput
+        if throughput > best * (1 + MIN_THROUGHPUT_GAIN):
+            best = throughput
+            tuning.batch_size = batch_size
+        elif batch_size > tuning.batch_size * 2:
+            break
+    model.batch_size = tuning.batch_size
+    logger.info(f"Tuned batch size for {model.name} at {shape[1]}x{shape[0]}: {tuning.batch_size} "
+                f"({best:.1f} images/s)")
+    return tuning
+
+
+def benchmark_batch_sizes(model, shape: Tuple[int, int], count: int = 64,
+                          candidates: Sequence[int] = BATCH_CANDIDATES, **kwargs) -> Dict[int, float]:
+    """Process ``count`` synthetic images at each batch size and report images/s."""
+    rng = np.random.default_rng(0)
+    images = [rng.integers(0, 256, tuple(shape) + (4,), dtype=np.uint8) for _ in range(count)]
+    run_batched(model, images[:1], 1, **kwargs)  # warm-up
+    results = {}
+    for batch_size in candidates:
+        start = time.perf_counter()
+        run_batched(model, images, batch_size, **kwargs)
+        seconds = time.perf_counter() - start
+        results[batch_size] = count / seconds if seconds > 0 else float('inf')
+    return results
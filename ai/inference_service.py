@@ -0,0 +1,338 @@
+"""
+AI inference service for PixelCrafterX.
+Runs models off the UI thread, tile by tile, with result caching.
+"""
+
+import hashlib
+import itertools
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+from PyQt6.QtCore import QObject, pyqtSignal
+from PyQt6.QtGui import QImage
+
+from ai.ai_manager import AIModel, AIModelManager
+from ai.batching import group_indices, run_batched, tune_batch_size
+from utils.config import load_config
+from utils.image.image_buffer import qimage_to_array
+from utils.lazy_import import is_loaded, lazy_import
+
+torch = lazy_import("torch")
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceCache:
+    """LRU cache of processed tiles keyed by (model, params, input tile hash)."""
+
+    def __init__(self, budget_mb: int = 256):
+        self.budget = budget_mb * 1024 * 1024
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(model_name: str, params: Dict[str, Any], tile: np.ndarray) -> Tuple:
+        """Build the cache key for a tile."""
+        digest = hashlib.blake2b(tile.tobytes(), digest_size=16).hexdigest()
+        return model_name, repr(sorted(params.items())), tile.shape, digest
+
+    def get(self, key: Tuple) -> Optional[np.ndarray]:
+        with self._lock:
+            result = self._entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key: Tuple, result: np.ndarray):
+        if result.nbytes > self.budget:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = result
+            self.size += result.nbytes
+            while self.size > self.budget:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= evicted.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {'entries': len(self._entries), 'size_mb': self.size / (1024 * 1024),
+                'hits': self.hits, 'misses': self.misses}
+
+
+def _tile_starts(length: int, tile: int, overlap: int) -> List[int]:
+    """Tile origins along one axis; all tiles are full size when the image allows it."""
+    if tile <= 0 or length <= tile:
+        return [0]
+    stride = max(1, tile - overlap)
+    starts = list(range(0, length - tile, stride))
+    starts.append(length - tile)
+    return starts
+
+
+def plan_tiles(width: int, height: int, tile: int, overlap: int) -> List[Tuple[int, int, int, int]]:
+    """Split an image into overlapping (x, y, w, h) tiles."""
+    return [
+        (x, y, min(tile, width) if tile > 0 else width, min(tile, height) if tile > 0 else height)
+        for y in _tile_starts(height, tile, overlap)
+        for x in _tile_starts(width, tile, overlap)
+    ]
+
+
+def _ramp(length: int, overlap: int, ramp_start: bool, ramp_end: bool) -> np.ndarray:
+    """1D blend weights rising over ``overlap`` pixels at interior edges."""
+    weights = np.ones(length, dtype=np.float32)
+    if overlap <= 0:
+        return weights
+    ramp = (np.arange(min(overlap, length), dtype=np.float32) + 0.5) / overlap
+    if ramp_start:
+        weights[:len(ramp)] = np.minimum(weights[:len(ramp)], ramp)
+    if ramp_end:
+        weights[-len(ramp):] = np.minimum(weights[-len(ramp):], ramp[::-1])
+    return weights
+
+
+def tile_weights(rect: Tuple[int, int, int, int], width: int, height: int, overlap: int) -> np.ndarray:
+    """Feathered h x w x 1 weights for a tile; image borders are not feathered."""
+    x, y, w, h = rect
+    wx = _ramp(w, overlap, x > 0, x + w < width)
+    wy = _ramp(h, overlap, y > 0, y + h < height)
+    return (wy[:, None] * wx[None, :])[..., None]
+
+
+@dataclass
+class InferenceJob:
+    """State of a submitted inference request."""
+    job_id: int
+    model_name: str
+    params: Dict[str, Any]
+    image: np.ndarray
+    target: Any = None  # optional TiledImage receiving partial results
+    future: Future = field(default_factory=Future)  # cancelling it cancels the job
+    tiles_done: int = 0
+    tiles_total: int = 0
+    cache_hits: int = 0
+
+
+class InferenceService(QObject):
+    """Runs AIModelManager models asynchronously on overlapping tiles.
+
+    Each job is coordinated on its own thread: tiles are looked up in the
+    cache, the misses are batched and fanned out to a worker pool, and
+    finished tiles are feather-blended into the output and streamed back
+    via ``tile_ready``. Only running jobs are kept in ``jobs``; callers hold
+    on to the future returned by ``submit``.
+    Torch's intra-op thread count is divided between the workers so the
+    pool as a whole uses ``performance.threads`` cores.
+    """
+
+    # Signals
+    tile_ready = pyqtSignal(int, int, int, object)  # job id, x, y, blended ARGB32 region
+    progress = pyqtSignal(int, int, int)  # job id, tiles done, tiles total
+    job_finished = pyqtSignal(int, object)  # job id, ARGB32 result
+    job_failed = pyqtSignal(int, str)  # job id, error message
+    job_cancelled = pyqtSignal(int)
+    _partial_ready = pyqtSignal(object, int, int, object)  # job, x, y, blended ARGB32 region
+
+    def __init__(self, model_manager: AIModelManager, config: Optional[Dict[str, Any]] = None,
+                 parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self.model_manager = model_manager
+        self.config = config or load_config()
+        performance = self.config.get('performance', {})
+
+        threads = performance.get('threads', 0) or os.cpu_count() or 1
+        workers = performance.get('inference_workers', 0) or (2 if threads >= 4 else 1)
+        self.workers = max(1, min(workers, threads))
+        self.threads_per_worker = max(1, threads // self.workers)
+
+        self.cache = InferenceCache(performance.get('inference_cache_mb', 256))
+        self.memory_cap_mb = performance.get('inference_memory_mb', 1024)
+        self.autotune = performance.get('inference_autotune', True)
+        self.jobs: Dict[int, InferenceJob] = {}
+        self._job_ids = itertools.count(1)
+        self._load_lock = threading.Lock()
+        self._coordinator = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference-job")
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inference-tile")
+
+        self._partial_ready.connect(self._write_partial)
+
+    def submit(self, model_name: str, image: Union[np.ndarray, QImage], target=None, **params) -> Future:
+        """Queue an image for processing; returns a future for the result.
+
+        The future's ``job_id`` is the id used by the signals. ``target`` may
+        be a TiledImage that receives blended tiles as they finish, so the
+        canvas can show progress in place.
+        """
+        if isinstance(image, QImage):
+            image = qimage_to_array(image)
+        job = InferenceJob(next(self._job_ids), model_name, params, image, target)
+        job.future.job_id = job.job_id
+        self.jobs[job.job_id] = job
+        self._coordinator.submit(self._run_job, job)
+        return job.future
+
+    def cancel(self, future: Future):
+        """Cancel a job; tiles already running are allowed to finish."""
+        future.cancel()
+
+    def wait(self, future: Future, timeout: Optional[float] = None) -> np.ndarray:
+        """Block until a job is done (mainly for scripts and batch use)."""
+        return future.result(timeout)
+
+    def shutdown(self):
+        """Cancel all jobs and stop the workers."""
+        for job in list(self.jobs.values()):
+            job.future.cancel()
+        self._coordinator.shutdown(wait=True)
+        self._pool.shutdown(wait=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get worker and cache statistics."""
+        return dict(self.cache.get_stats(), workers=self.workers,
+                    threads_per_worker=self.threads_per_worker)
+
+    def _ensure_loaded(self, model: AIModel):
+        """Load a model on first use (runs on the coordinator thread)."""
+        with self._load_lock:
+            if model.model is None and not self.model_manager.load_model(model.name):
+                raise RuntimeError(f"Could not load model {model.name}")
+
+    def _batch_size(self, model: AIModel, rect: Tuple[int, int, int, int]) -> int:
+        """Get the tile batch size for a model, auto-tuning it on first use."""
+        if not model.batch_size and self.autotune:
+            shape = (rect[3], rect[2])
+            with self._load_lock:
+                if not model.batch_size:
+                    tune_batch_size(model, shape, self.memory_cap_mb)
+        return self.model_manager.get_batch_size(model.name)
+
+    def _run_job(self, job: InferenceJob):
+        """Run a job and settle its future (runs on the coordinator thread)."""
+        try:
+            outcome = self._process_job(job)
+        except CancelledError:
+            outcome = None
+        except Exception as e:
+            logger.error(f"Inference job {job.job_id} failed: {e}")
+            outcome = e
+        finally:
+            job.image = None
+            # Finished jobs are only reachable through their futures
+            self.jobs.pop(job.job_id, None)
+
+        # A job cancelled after its last tile still counts as cancelled
+        if outcome is None or not job.future.set_running_or_notify_cancel():
+            job.future.cancel()
+            self.job_cancelled.emit(job.job_id)
+        elif isinstance(outcome, Exception):
+            job.future.set_exception(outcome)
+            self.job_failed.emit(job.job_id, str(outcome))
+        else:
+            job.future.set_result(outcome)
+            self.job_finished.emit(job.job_id, outcome)
+
+    def _process_job(self, job: InferenceJob) -> np.ndarray:
+        if job.future.cancelled():
+            raise CancelledError()
+        model = self.model_manager.get_model(job.model_name)
+        if model is None:
+            raise KeyError(f"Unknown model: {job.model_name}")
+        self._ensure_loaded(model)
+        if is_loaded("torch"):
+            # Only torch models need this; setting it would import torch
+            torch.set_num_threads(self.threads_per_worker)
+        return self._process_tiles(job, model)
+
+    def _process_tiles(self, job: InferenceJob, model: AIModel) -> np.ndarray:
+        image = job.image
+        height, width = image.shape[:2]
+        overlap = model.tile_overlap if model.tile_size > 0 else 0
+        rects = plan_tiles(width, height, model.tile_size, overlap)
+        params = dict(model.get_parameters(), **job.params)
+        job.tiles_total = len(rects)
+
+        color = np.zeros((height, width, 3), dtype=np.float32)
+        weight = np.zeros((height, width, 1), dtype=np.float32)
+
+        def run_batch(batch_rects, keys):
+            if job.future.cancelled():
+                raise CancelledError()
+            tiles = [np.ascontiguousarray(image[y:y + h, x:x + w]) for x, y, w, h in batch_rects]
+            results = run_batched(model, tiles, len(tiles), **job.params)
+            for key, result in zip(keys, results):
+                self.cache.put(key, result)
+            return results
+
+        misses = []
+        ready = []
+        for rect in rects:
+            x, y, w, h = rect
+            key = InferenceCache.make_key(job.model_name, params, image[y:y + h, x:x + w])
+            cached = self.cache.get(key)
+            if cached is not None:
+                job.cache_hits += 1
+                ready.append((rect, cached))
+            else:
+                misses.append((rect, key))
+
+        # Equally sized misses go to the workers in batches
+        futures = {}
+        batch_size = self._batch_size(model, rects[0])
+        for indices in group_indices([(h, w) for (_, _, w, h), _ in misses], batch_size):
+            batch = [misses[i] for i in indices]
+            batch_rects = [rect for rect, _ in batch]
+            futures[self._pool.submit(run_batch, batch_rects, [key for _, key in batch])] = batch_rects
+
+        def accumulate(rect, result):
+            x, y, w, h = rect
+            tile_weight = tile_weights(rect, width, height, overlap)
+            color[y:y + h, x:x + w] += result[..., :3] * tile_weight
+            weight[y:y + h, x:x + w] += tile_weight
+            job.tiles_done += 1
+            region = image[y:y + h, x:x + w].copy()
+            region[..., :3] = np.clip(color[y:y + h, x:x + w] / weight[y:y + h, x:x + w] + 0.5, 0, 255)
+            self.tile_ready.emit(job.job_id, x, y, region)
+            if job.target is not None:
+                self._partial_ready.emit(job, x, y, region)
+            self.progress.emit(job.job_id, job.tiles_done, job.tiles_total)
+
+        try:
+            for rect, result in ready:
+                accumulate(rect, result)
+            for future in as_completed(futures):
+                if job.future.cancelled():
+                    raise CancelledError()
+                for rect, result in zip(futures[future], future.result()):
+                    accumulate(rect, result)
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+
+        # The models only change color; alpha comes from the input
+        output = image.copy()
+        output[..., :3] = np.clip(color / np.maximum(weight, 1e-6) + 0.5, 0, 255)
+        return output
+
+    def _write_partial(self, job: InferenceJob, x: int, y: int, region: np.ndarray):
+        """Copy a finished region into the job's target image (UI thread)."""
+        if not job.future.cancelled():
+            job.target.write_region(x, y, region)
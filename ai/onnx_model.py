@@ -0,0 +1,169 @@
+"""
+ONNX Runtime backend for PixelCrafterX.
+Runs local ONNX image models on the CPU.
+"""
+
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from PyQt6.QtGui import QImage
+
+from ai.ai_manager import AIModel, AIModelManager
+from utils.config import load_config
+from utils.image.image_buffer import array_to_qimage, qimage_to_array
+from utils.lazy_import import lazy_import
+
+ort = lazy_import("onnxruntime")
+
+logger = logging.getLogger(__name__)
+
+BACKEND_NAME = "onnx"
+
+# Suffix of the graph-optimized copy written next to the model on first load
+OPTIMIZED_SUFFIX = ".opt.onnx"
+
+
+class ONNXModel(AIModel):
+    """An image-to-image model stored as a local ONNX file.
+
+    Configured from an ``config/ai_models.json`` entry such as::
+
+        "Denoise": {
+            "backend": "onnx",
+            "path": "denoise.onnx",
+            "category": "Enhance",
+            "scale": 255.0,
+            "mean": [0.0, 0.0, 0.0],
+            "std": [1.0, 1.0, 1.0],
+            "intra_op_threads": 0,
+            "inter_op_threads": 1,
+            "tile_size": 512,
+            "tile_overlap": 32
+        }
+
+    Inputs and outputs are NCHW float32 RGB with the same spatial size.
+    """
+
+    def __init__(self, name: str, config: Dict[str, Any], model_dir: str = "models"):
+        super().__init__()
+        self.name = name
+        self.category = config.get('category', "General")
+        self.description = config.get('description', "ONNX model")
+        self.device = "cpu"
+        self.config = config
+
+        path = Path(config['path'])
+        self.path = path if path.is_absolute() else Path(model_dir) / path
+        self.scale = float(config.get('scale', 255.0))
+        self.mean = np.asarray(config.get('mean', [0.0, 0.0, 0.0]), dtype=np.float32).reshape(1, 3, 1, 1)
+        self.std = np.asarray(config.get('std', [1.0, 1.0, 1.0]), dtype=np.float32).reshape(1, 3, 1, 1)
+        self.intra_op_threads = int(config.get('intra_op_threads', 0))
+        self.inter_op_threads = int(config.get('inter_op_threads', 1))
+        self.cache_optimized = bool(config.get('cache_optimized', True))
+        self.tile_size = int(config.get('tile_size', self.tile_size))
+        self.tile_overlap = int(config.get('tile_overlap', self.tile_overlap))
+        self.parameters: Dict[str, Any] = dict(config.get('parameters', {}))
+
+        self.input_name: Optional[str] = None
+        self.output_name: Optional[str] = None
+        self.dynamic_batch = False
+
+    def _session_options(self, save_optimized: bool) -> "ort.SessionOptions":
+        """Create session options tuned for CPU inference."""
+        options = ort.SessionOptions()
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.inter_op_num_threads = self.inter_op_threads
+        intra = self.intra_op_threads or load_config().get('performance', {}).get('threads', 0)
+        if intra:
+            options.intra_op_num_threads = intra
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if save_optimized:
+            # Only portable passes go into the cached copy; layout-specific ones
+            # are cheap and run again on every load
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED
+            options.optimized_model_filepath = str(self.path) + OPTIMIZED_SUFFIX
+        return options
+
+    def load(self):
+        """Create an inference session for the model."""
+        try:
+            optimized = Path(str(self.path) + OPTIMIZED_SUFFIX)
+            if (self.cache_optimized and optimized.exists()
+                    and optimized.stat().st_mtime >= self.path.stat().st_mtime):
+                session = ort.InferenceSession(str(optimized), self._session_options(False),
+                                               providers=['CPUExecutionProvider'])
+            else:
+                session = ort.InferenceSession(str(self.path), self._session_options(self.cache_optimized),
+                                               providers=['CPUExecutionProvider'])
+            model_input = session.get_inputs()[0]
+            self.input_name = model_input.name
+            self.dynamic_batch = not isinstance(model_input.shape[0], int)
+            self.output_name = session.get_outputs()[0].name
+            self.model = session
+            return True
+        except Exception as e:
+            print(f"Error loading model {self.path}: {e}")
+            return False
+
+    def unload(self):
+        """Release the inference session."""
+        self.model = None
+
+    def process(self, image: QImage, **kwargs) -> QImage:
+        """Process an image with the ONNX model."""
+        if self.model is None:
+            return image
+        return array_to_qimage(self.process_array(qimage_to_array(image), **kwargs))
+
+    def process_array(self, arr: np.ndarray, **kwargs) -> np.ndarray:
+        """Process an ARGB32 array with the ONNX model."""
+        return self._run(self.model, arr[None])[0]
+
+    def process_batch(self, batch: np.ndarray, **kwargs) -> np.ndarray:
+        """Process a stack of ARGB32 arrays, in one run if the model has a dynamic batch axis."""
+        session = self.model
+        if not self.dynamic_batch:
+            return np.stack([self._run(session, arr[None])[0] for arr in batch])
+        return self._run(session, batch)
+
+    def _run(self, session, batch: np.ndarray) -> np.ndarray:
+        """Run the session on an N x H x W x 4 ARGB32 batch."""
+        if session is None:  # keep a reference in case the pool unloads us meanwhile
+            return batch
+
+        # ARGB32 (B, G, R, A) -> normalized NCHW RGB
+        rgb = batch[..., [2, 1, 0]].astype(np.float32)
+        tensor = rgb.transpose(0, 3, 1, 2) / self.scale
+        tensor = np.ascontiguousarray((tensor - self.mean) / self.std)
+
+        output = session.run([self.output_name], {self.input_name: tensor})[0]
+
+        output = (output * self.std + self.mean) * self.scale
+        result = batch.copy()
+        result[..., [2, 1, 0]] = np.clip(output.transpose(0, 2, 3, 1) + 0.5, 0, 255).astype(np.uint8)
+        return result
+
+    def get_parameters(self) -> Dict:
+        return dict(self.parameters)
+
+    def set_parameters(self, **kwargs):
+        self.parameters.update(kwargs)
+
+
+def register_onnx_models(manager: AIModelManager, config_manager) -> List[str]:
+    """Register every ONNX model listed in ``config/ai_models.json``."""
+    model_dir = config_manager.get_setting('ai_model_path') or "models"
+    manager.max_loaded_models = config_manager.get_setting('max_loaded_models') or manager.max_loaded_models
+    registered = []
+    for name in list(config_manager.ai_models):
+        config = config_manager.get_ai_model(name)
+        if not config or config.get('backend') != BACKEND_NAME:
+            continue
+        if 'path' not in config:
+            logger.error(f"ONNX model {name} has no path")
+            continue
+        if manager.add_model(ONNXModel(name, config, model_dir)):
+            registered.append(name)
+    return registered
@@ -0,0 +1,58 @@
+"""
+AI batch size benchmark for PixelCrafterX.
+Reports images/s per batch size on synthetic images.
+
+Usage:
+    python -m benchmarks.ai_batch_benchmark --model Denoise --size 256 --count 64
+    python -m benchmarks.ai_batch_benchmark --onnx models/denoise.onnx
+"""
+
+import argparse
+import sys
+
+from ai.ai_manager import AIModelManager
+from ai.batching import BATCH_CANDIDATES, benchmark_batch_sizes, tune_batch_size
+from ai.onnx_model import ONNXModel, register_onnx_models
+from config.config_manager import ConfigManager
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--model', help="model name from config/ai_models.json")
+    source.add_argument('--onnx', help="path to a local ONNX file")
+    parser.add_argument('--size', type=int, default=256, help="square image size in pixels")
+    parser.add_argument('--count', type=int, default=64, help="images per batch size")
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=list(BATCH_CANDIDATES))
+    parser.add_argument('--memory-mb', type=int, default=1024, help="memory cap for the auto-tuner")
+    args = parser.parse_args(argv)
+
+    manager = AIModelManager()
+    if args.onnx:
+        model = ONNXModel("benchmark", {'path': args.onnx}, "")
+        manager.add_model(model)
+    else:
+        register_onnx_models(manager, ConfigManager())
+        model = manager.get_model(args.model)
+        if model is None:
+            print(f"Unknown model: {args.model}")
+            return 1
+    if not manager.load_model(model.name):
+        print(f"Could not load model {model.name}")
+        return 1
+
+    shape = (args.size, args.size)
+    results = benchmark_batch_sizes(model, shape, args.count, args.batch_sizes)
+    print(f"{model.name}: {args.count} images of {args.size}x{args.size}")
+    print(f"{'batch':>6}  {'images/s':>10}")
+    for batch_size, throughput in results.items():
+        print(f"{batch_size:>6}  {throughput:>10.1f}")
+
+    tuning = tune_batch_size(model, shape, args.memory_mb, args.batch_sizes)
+    skipped = f" (over the cap: {tuning.skipped})" if tuning.skipped else ""
+    print(f"auto-tuned batch size under {args.memory_mb} MB: {tuning.batch_size}{skipped}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
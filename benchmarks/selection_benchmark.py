@@ -0,0 +1,129 @@
+"""
+Rubber-band selection benchmark for PixelCrafterX.
+Compares the canvas's per-layer spatial index against QGraphicsScene.items on many vector items.
+
+Usage:
+    QT_QPA_PLATFORM=offscreen python -m benchmarks.selection_benchmark --items 50000
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import time
+
+from PyQt6.QtCore import QPointF, QRectF, Qt
+from PyQt6.QtGui import QBrush, QColor, QPainterPath, QPen
+from PyQt6.QtWidgets import QApplication, QGraphicsEllipseItem, QGraphicsRectItem
+
+from core.canvas import Canvas, StrokeItem
+
+DOCUMENT_SIZE = 20000
+LAYERS = 4  # the third layer is hidden and the fourth locked, so they must not be selected
+BAND_SIZES = (200, 1000, 5000)
+
+
+def make_item(rng: random.Random, pen: QPen):
+    """Create a random small shape or a long freehand stroke."""
+    x, y = rng.uniform(0, DOCUMENT_SIZE), rng.uniform(0, DOCUMENT_SIZE)
+    kind = rng.random()
+    if kind < 0.4:
+        return QGraphicsRectItem(QRectF(x, y, rng.uniform(5, 80), rng.uniform(5, 80)))
+    if kind < 0.6:
+        item = QGraphicsEllipseItem(QRectF(x, y, rng.uniform(5, 80), rng.uniform(5, 80)))
+        item.setBrush(QBrush(QColor(200, 80, 80)))
+        return item
+    start = QPointF(x, y)
+    path = QPainterPath(start)
+    for _ in range(rng.randint(20, 200)):
+        x += rng.uniform(-12, 12)
+        y += rng.uniform(-12, 12)
+        path.lineTo(x, y)
+    stroke = StrokeItem(start, pen)
+    stroke.setPath(path)
+    return stroke
+
+
+def build_canvas(count: int, seed: int) -> Canvas:
+    canvas = Canvas({'performance': {'stroke_compaction': False}})
+    canvas.scene.setSceneRect(0, 0, DOCUMENT_SIZE, DOCUMENT_SIZE)
+    for i in range(1, LAYERS):
+        canvas.add_layer(f"Layer {i + 1}")
+    canvas.layers[2]['visible'] = False
+    canvas.layers[3]['locked'] = True
+
+    rng = random.Random(seed)
+    pen = QPen(QColor(0, 0, 0), 4)
+    for i in range(count):
+        layer = canvas.layers[i % LAYERS]
+        item = make_item(rng, pen)
+        canvas.scene.addItem(item)
+        layer['items'].append(item)
+        canvas.index_item(layer, item)
+    return canvas
+
+
+def time_ms(func) -> float:
+    start = time.perf_counter()
+    func()
+    return (time.perf_counter() - start) * 1000
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--items', type=int, default=50000, help="number of vector items")
+    parser.add_argument('--queries', type=int, default=20, help="selections per band size")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    start = time.perf_counter()
+    canvas = build_canvas(args.items, args.seed)
+    print(f"{args.items} items in {LAYERS} layers built in {time.perf_counter() - start:.1f} s")
+
+    selectable = {item for layer in canvas.layers if layer['visible'] and not layer['locked']
+                  for item in layer['items']}
+    rng = random.Random(args.seed + 1)
+    print(f"{'band':>6}  {'scene.items ms':>15}  {'index ms':>9}  {'select ms':>10}  {'selected':>9}  "
+          f"{'exact tests':>12}")
+    mismatches = 0
+    for size in BAND_SIZES:
+        scene_times, index_times, select_times, selected, exact = [], [], [], [], []
+        for _ in range(args.queries):
+            x, y = rng.uniform(0, DOCUMENT_SIZE - size), rng.uniform(0, DOCUMENT_SIZE - size)
+            rect = QRectF(x, y, size, size)
+            found = []
+            scene_times.append(time_ms(lambda: found.extend(
+                canvas.scene.items(rect, Qt.ItemSelectionMode.ContainsItemShape))))
+
+            tests_before = sum(layer['index'].exact_tests for layer in canvas.layers)
+            index_times.append(time_ms(lambda: [
+                layer['index'].query(rect, Qt.ItemSelectionMode.ContainsItemShape) for layer in canvas.layers
+                if layer['visible'] and not layer['locked']]))
+            exact.append(sum(layer['index'].exact_tests for layer in canvas.layers) - tests_before)
+
+            canvas.selection_start, canvas.selection_end = rect.topLeft(), rect.bottomRight()
+            select_times.append(time_ms(canvas.select_items_in_rect))
+            selected.append(len(canvas.selected_items))
+
+            # The scene also requires the bounding rect inside, so the index may add items
+            # whose shape is inside but whose antialiasing margin is not
+            ours = set(canvas.selected_items)
+            expected = {item for item in found if item in selectable}
+            extra = [item for item in ours - expected if not rect.contains(item.mapToScene(item.shape()).boundingRect())]
+            if expected - ours or extra:
+                mismatches += 1
+        print(f"{size:>6}  {statistics.median(scene_times):>15.2f}  {statistics.median(index_times):>9.2f}  "
+              f"{statistics.median(select_times):>10.2f}  {statistics.median(selected):>9.0f}  "
+              f"{statistics.median(exact):>12.0f}")
+
+    if mismatches:
+        print(f"FAIL: {mismatches} selections differ from the scene's answer")
+        return 1
+    print("OK")
+    app.quit()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
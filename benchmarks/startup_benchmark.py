@@ -0,0 +1,50 @@
+"""
+Startup regression benchmark for PixelCrafterX.
+Fails when time to first window exceeds the budget or heavy modules load eagerly.
+
+Usage:
+    python -m benchmarks.startup_benchmark --runs 5 --budget-ms 1500
+"""
+
+import argparse
+import statistics
+import sys
+from pathlib import Path
+
+from utils.startup_profiler import run_startup_probe
+
+# Median time from main.py start to the first processed frame of the main window
+STARTUP_BUDGET_MS = 1500
+
+MAIN_SCRIPT = Path(__file__).resolve().parent.parent / "main.py"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help="number of cold starts to measure")
+    parser.add_argument('--budget-ms', type=float, default=STARTUP_BUDGET_MS)
+    args = parser.parse_args(argv)
+
+    # One untimed start warms the OS file cache and the bytecode cache
+    run_startup_probe(MAIN_SCRIPT, importtime=False)
+    profiles = [run_startup_probe(MAIN_SCRIPT, importtime=False) for _ in range(args.runs)]
+    times = [profile.first_window_ms for profile in profiles]
+    median = statistics.median(times)
+    heavy = sorted({name for profile in profiles for name in profile.heavy_modules})
+
+    print(f"time to first window: median {median:.1f} ms, min {min(times):.1f} ms, "
+          f"max {max(times):.1f} ms over {args.runs} runs (budget {args.budget_ms:.0f} ms)")
+    failed = False
+    if median > args.budget_ms:
+        print(f"FAIL: startup is {median - args.budget_ms:.1f} ms over budget")
+        failed = True
+    if heavy:
+        print(f"FAIL: heavy modules imported before the first window: {', '.join(heavy)}")
+        failed = True
+    if not failed:
+        print("OK")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
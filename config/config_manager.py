@@ -37,6 +37,7 @@ class AppConfig:
     ai_model_path: str = "models"
     use_cuda: bool = True
     batch_size: int = 4
+    max_loaded_models: int = 2  # warm pool size
     
     # Export settings
     default_export_format: str = "png"
@@ -0,0 +1,545 @@
+"""
+Autosave system for PixelCrafterX.
+Writes incremental snapshots of the layer stack and the canvas items
+to a recovery file from a background thread and restores them after a crash.
+"""
+
+import json
+import logging
+import os
+import pickle
+import struct
+import threading
+import time
+import zlib
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from PyQt6.QtCore import QByteArray, QDataStream, QIODevice, QObject, QPointF, QRectF, QTimer, pyqtSignal
+from PyQt6.QtGui import QBrush, QColor, QFont, QPainterPath, QPen, QTransform
+from PyQt6.QtWidgets import (
+    QGraphicsEllipseItem, QGraphicsItem, QGraphicsPathItem, QGraphicsRectItem, QGraphicsTextItem
+)
+
+from core.canvas import StrokeItem
+from core.history.scene_commands import ItemState
+from core.layers.layer_manager import AdjustmentLayer, Layer, LayerManager
+from core.layers.tile_store import TILE_SIZE, TiledImage
+from utils.config import get_config_dir, load_config
+
+logger = logging.getLogger(__name__)
+
+RECOVERY_MAGIC = b"PXCR"
+RECOVERY_VERSION = 1
+RECOVERY_SUFFIX = ".pxr"
+
+# Start a fresh recovery file once it holds this many times more tiles or items than the document
+COMPACTION_RATIO = 4
+
+# Canvas item classes by the kind stored in recovery files
+ITEM_KINDS = {
+    'stroke': StrokeItem,
+    'path': QGraphicsPathItem,
+    'rect': QGraphicsRectItem,
+    'ellipse': QGraphicsEllipseItem,
+    'text': QGraphicsTextItem
+}
+
+
+def get_recovery_dir() -> Path:
+    """Get the directory holding recovery files."""
+    recovery_dir = get_config_dir() / 'recovery'
+    recovery_dir.mkdir(parents=True, exist_ok=True)
+    return recovery_dir
+
+
+class RecoveryWriter:
+    """Append-only writer for recovery files.
+
+    A recovery file is a header followed by length-prefixed records. Each
+    snapshot writes a ``document`` record, ``reset``/``tile`` records for the
+    changed layers, ``adjustment`` records holding the pickled adjustments of
+    new or changed adjustment layers, ``item`` records holding new or changed
+    canvas items and a closing ``commit`` record; readers
+    ignore anything after the last commit, so a crash mid-write never
+    corrupts older state.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.tile_records = 0
+        self.item_records = 0
+        self._file = open(path, 'wb')
+        header = json.dumps({'pid': os.getpid(), 'created': time.time()}).encode()
+        self._file.write(RECOVERY_MAGIC + struct.pack('<HI', RECOVERY_VERSION, len(header)) + header)
+        self._file.flush()
+
+    def write_record(self, header: Dict[str, Any], payload: bytes = b""):
+        """Write a single record."""
+        header = dict(header, size=len(payload))
+        data = json.dumps(header).encode()
+        self._file.write(struct.pack('<I', len(data)) + data + payload)
+        if header['type'] == 'tile':
+            self.tile_records += 1
+        elif header['type'] == 'item':
+            self.item_records += 1
+
+    def commit(self, seq: int):
+        """Close a snapshot and make it durable."""
+        self.write_record({'type': 'commit', 'seq': seq, 'time': time.time()})
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+def read_recovery_header(path: Path) -> Optional[Dict[str, Any]]:
+    """Read the header of a recovery file, or None if it is not one."""
+    try:
+        with open(path, 'rb') as f:
+            if f.read(4) != RECOVERY_MAGIC:
+                return None
+            version, length = struct.unpack('<HI', f.read(6))
+            header = json.loads(f.read(length))
+            header['version'] = version
+            return header
+    except Exception as e:
+        logger.error(f"Error reading recovery file {path}: {e}")
+        return None
+
+
+def _pid_alive(pid: int) -> bool:
+    """Best-effort check whether another process is still running."""
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except Exception:
+        # No permission or unsupported platform: assume it is alive
+        return True
+    return True
+
+
+def find_recovery_files() -> List[Path]:
+    """Find recovery files left behind by sessions that did not exit cleanly."""
+    files = []
+    for path in sorted(get_recovery_dir().glob(f"*{RECOVERY_SUFFIX}")):
+        header = read_recovery_header(path)
+        if header is not None and not _pid_alive(header.get('pid', -1)):
+            files.append(path)
+    return files
+
+
+def item_kind(item: QGraphicsItem) -> Optional[str]:
+    """Get the recovery file kind of a canvas item, or None if it cannot be saved."""
+    for kind, item_class in ITEM_KINDS.items():
+        if type(item) is item_class:
+            return kind
+    return None
+
+
+def encode_item(state: ItemState) -> bytes:
+    """Serialize the state of a canvas item."""
+    data = QByteArray()
+    stream = QDataStream(data, QIODevice.OpenModeFlag.WriteOnly)
+    stream << state.pos << state.transform
+    stream.writeDouble(state.z)
+    stream.writeDouble(state.opacity)
+    for value in (state.pen, state.brush):
+        stream.writeBool(value is not None)
+        if value is not None:
+            stream << value
+    if isinstance(state.geometry, tuple):
+        html, font, color = state.geometry
+        stream.writeQString(html)
+        stream << font << color
+    else:
+        stream << state.geometry
+    return bytes(data)
+
+
+def decode_item(kind: str, payload: bytes) -> QGraphicsItem:
+    """Create a canvas item from a state written by ``encode_item``."""
+    if kind not in ITEM_KINDS:
+        raise ValueError(f"Unknown item kind: {kind}")
+    data = QByteArray(payload)
+    stream = QDataStream(data, QIODevice.OpenModeFlag.ReadOnly)
+    pos, transform = QPointF(), QTransform()
+    stream >> pos
+    stream >> transform
+    z = stream.readDouble()
+    opacity = stream.readDouble()
+    pen = brush = None
+    if stream.readBool():
+        pen = QPen()
+        stream >> pen
+    if stream.readBool():
+        brush = QBrush()
+        stream >> brush
+    if kind == 'text':
+        html, font, color = stream.readQString(), QFont(), QColor()
+        stream >> font
+        stream >> color
+        geometry = (html, font, color)
+    elif kind in ('rect', 'ellipse'):
+        geometry = QRectF()
+        stream >> geometry
+    else:
+        geometry = QPainterPath()
+        stream >> geometry
+    if stream.status() != QDataStream.Status.Ok:
+        raise ValueError(f"Truncated {kind} item")
+
+    item = StrokeItem(QPointF(), pen) if kind == 'stroke' else ITEM_KINDS[kind]()
+    ItemState(pos, transform, z, opacity, pen, brush, geometry).apply(item)
+    return item
+
+
+@dataclass
+class RecoveredDocument:
+    """Document state rebuilt from a recovery file."""
+    layers: List[Layer] = field(default_factory=list)  # raster layers, bottom to top
+    canvas_layers: List[Dict[str, Any]] = field(default_factory=list)  # canvas layer properties and their items
+
+    def is_empty(self) -> bool:
+        return not self.layers and not self.canvas_layers
+
+
+def load_recovery_file(path: Path, layer_manager: Optional[LayerManager] = None) -> RecoveredDocument:
+    """Rebuild the layers and canvas items stored in a recovery file up to its last commit."""
+    document: Optional[Dict[str, Any]] = None
+    layers: Dict[int, Dict[str, Any]] = {}
+    adjustments: Dict[int, bytes] = {}
+    items: Dict[int, Tuple[str, bytes]] = {}
+    pending: List[Tuple[Dict[str, Any], bytes]] = []
+    with open(path, 'rb') as f:
+        if f.read(4) != RECOVERY_MAGIC:
+            raise ValueError(f"Not a recovery file: {path}")
+        _, length = struct.unpack('<HI', f.read(6))
+        f.seek(length, os.SEEK_CUR)
+
+        while True:
+            prefix = f.read(4)
+            if len(prefix) < 4:
+                break
+            (length,) = struct.unpack('<I', prefix)
+            raw = f.read(length)
+            if len(raw) < length:
+                break
+            try:
+                header = json.loads(raw)
+            except ValueError:
+                break
+            payload = f.read(header.get('size', 0))
+            if len(payload) < header.get('size', 0):
+                break
+
+            if header['type'] != 'commit':
+                pending.append((header, payload))
+                continue
+
+            # Apply a complete snapshot
+            for record, data in pending:
+                if record['type'] == 'document':
+                    document = record
+                elif record['type'] == 'reset':
+                    layers[record['layer']] = {'fill': record['fill'], 'tiles': {}}
+                elif record['type'] == 'tile':
+                    state = layers.setdefault(record['layer'], {'fill': 0, 'tiles': {}})
+                    state['tiles'][(record['tx'], record['ty'])] = data
+                elif record['type'] == 'adjustment':
+                    adjustments[record['layer']] = data
+                elif record['type'] == 'item':
+                    items[record['item']] = (record['kind'], data)
+            pending.clear()
+
+    if document is None:
+        return RecoveredDocument()
+
+    cache = layer_manager.tile_cache if layer_manager is not None else None
+    result = []
+    for info in document['layers']:
+        adjustment = None
+        if info.get('kind') == 'adjustment':
+            try:
+                adjustment = pickle.loads(adjustments[info['id']])
+            except Exception as e:
+                # An opaque raster in its place would hide every layer below
+                logger.warning(f"Skipping adjustment layer {info['name']!r}: {e}")
+                continue
+        image = TiledImage(info['width'], info['height'], cache=cache)
+        state = layers.get(info['id'], {'fill': 0, 'tiles': {}})
+        image.fill(state['fill'])
+        for (tx, ty), data in state['tiles'].items():
+            tile = np.frombuffer(zlib.decompress(data), np.uint8).reshape((TILE_SIZE, TILE_SIZE, 4))
+            image.tile_for_write(tx, ty)[:] = tile
+        properties = dict(
+            name=info['name'],
+            image=image,
+            visible=info['visible'],
+            opacity=info['opacity'],
+            blend_mode=info['blend_mode'],
+            locked=info['locked']
+        )
+        if adjustment is not None:
+            result.append(AdjustmentLayer(adjustment=adjustment, **properties))
+        else:
+            result.append(Layer(**properties))
+
+    canvas_layers = []
+    for info in document.get('canvas', []):
+        layer_items = []
+        for uid in info['items']:
+            try:
+                layer_items.append(decode_item(*items[uid]))
+            except Exception as e:
+                logger.warning(f"Skipping item {uid} of canvas layer {info['name']!r}: {e}")
+        canvas_layers.append(dict(
+            name=info['name'],
+            visible=info['visible'],
+            opacity=info['opacity'],
+            locked=info['locked'],
+            items=layer_items
+        ))
+    return RecoveredDocument(result, canvas_layers)
+
+
+class AutosaveManager(QObject):
+    """Periodically saves the layer stack and the canvas items to a recovery file.
+
+    The timer callback runs on the UI thread but only takes frozen views of
+    the tiles changed since the previous snapshot and, when the canvas
+    history moved on, the states of its items; paging in tiles that are not
+    resident, serialization, compression and disk I/O happen on a background
+    thread. Baked canvas items are saved as vectors and baked again on recovery.
+    """
+
+    # Signals
+    snapshot_saved = pyqtSignal(int)  # snapshot sequence number
+    snapshot_failed = pyqtSignal(str)
+
+    def __init__(self, layer_manager: LayerManager, config: Optional[Dict[str, Any]] = None,
+                 document_name: str = "untitled", parent: Optional[QObject] = None, canvas=None):
+        super().__init__(parent)
+        self.layer_manager = layer_manager
+        self.canvas = canvas
+        self.config = config or load_config()
+        app_config = self.config.get('app', {})
+        self.enabled = app_config.get('auto_save', True)
+        self.interval_ms = int(app_config.get('auto_save_interval', 5) * 60 * 1000)
+        self.path = get_recovery_dir() / f"{document_name}-{os.getpid()}{RECOVERY_SUFFIX}"
+
+        self.seq = 0
+        self.last_snapshot_ms = 0.0
+        self.last_write_ms = 0.0
+        self._writer: Optional[RecoveryWriter] = None
+        self._known_layers: set = set()
+        self._known_adjustments: Dict[int, Any] = {}
+        self._known_items: Dict[QGraphicsItem, Tuple[int, ItemState]] = {}
+        self._next_item_id = 0
+        self._canvas_document: List[Dict[str, Any]] = []
+        self._history_version: Optional[int] = None
+        self._force_full = False
+        self._worker: Optional[threading.Thread] = None
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.autosave)
+
+    def start(self):
+        """Start periodic autosaving if enabled in the configuration."""
+        if self.enabled and self.interval_ms > 0:
+            self.timer.start(self.interval_ms)
+
+    def stop(self):
+        """Stop periodic autosaving and wait for a pending write."""
+        self.timer.stop()
+        if self._worker is not None:
+            self._worker.join()
+
+    def is_busy(self) -> bool:
+        """Check whether a snapshot is still being written."""
+        return self._worker is not None and self._worker.is_alive()
+
+    def autosave(self) -> bool:
+        """Snapshot modified layers and write them in the background."""
+        if self.is_busy():
+            # Changes stay marked as modified and go into the next snapshot
+            return False
+
+        start = time.perf_counter()
+        full = self._writer is None or self._force_full or self._needs_compaction()
+        self._force_full = False
+        document, layers, adjustments, items = self._collect(full)
+        self.seq += 1
+        self.last_snapshot_ms = (time.perf_counter() - start) * 1000
+
+        self._worker = threading.Thread(
+            target=self._write_snapshot, args=(self.seq, full, document, layers, adjustments, items),
+            name="autosave", daemon=True
+        )
+        self._worker.start()
+        return True
+
+    def discard(self):
+        """Remove the recovery file, e.g. after the document was saved or closed."""
+        self.stop()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        self._known_layers.clear()
+        self._known_adjustments.clear()
+        self._known_items.clear()
+        self._canvas_document = []
+        self._history_version = None
+        if self.path.exists():
+            self.path.unlink()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get autosave timing statistics."""
+        return {
+            'seq': self.seq,
+            'snapshot_ms': self.last_snapshot_ms,
+            'write_ms': self.last_write_ms,
+            'path': str(self.path)
+        }
+
+    def _needs_compaction(self) -> bool:
+        """Check whether the recovery file has grown too large."""
+        live_tiles = sum(len(layer.image._written) for layer in self.layer_manager.layers)
+        return (self._writer.tile_records > COMPACTION_RATIO * max(live_tiles, 1) or
+                self._writer.item_records > COMPACTION_RATIO * max(len(self._known_items), 1))
+
+    def _collect(self, full: bool):
+        """Gather layer properties, frozen views of changed tiles and changed canvas items (runs on the UI thread)."""
+        document = []
+        layers = []
+        adjustments = []
+        known = set()
+        known_adjustments = {}
+        for layer in self.layer_manager.layers:
+            image = layer.image
+            known.add(image.uid)
+            is_adjustment = isinstance(layer, AdjustmentLayer)
+            document.append({
+                'id': image.uid,
+                'kind': 'adjustment' if is_adjustment else 'raster',
+                'name': layer.name,
+                'width': image.width(),
+                'height': image.height(),
+                'visible': layer.visible,
+                'opacity': layer.opacity,
+                'blend_mode': layer.blend_mode,
+                'locked': layer.locked
+            })
+            layer_full = full or image.uid not in self._known_layers
+            if layer_full or image.has_modifications():
+                reset, frozen = image.snapshot(full=layer_full)
+                layers.append((image.uid, reset, frozen, sorted(set(frozen.tiles) | frozen.pending)))
+            if is_adjustment:
+                # Adjustments are immutable, so a new object is the only kind of change
+                known_adjustments[image.uid] = layer.adjustment
+                if full or self._known_adjustments.get(image.uid) is not layer.adjustment:
+                    adjustments.append((image.uid, layer.adjustment))
+        self._known_layers = known
+        self._known_adjustments = known_adjustments
+        canvas_document, items = self._collect_canvas(full)
+        return {'layers': document, 'canvas': canvas_document}, layers, adjustments, items
+
+    def _collect_canvas(self, full: bool):
+        """Gather canvas layer properties and the states of new or changed items (runs on the UI thread)."""
+        if self.canvas is None:
+            return [], []
+        version = self.canvas.history.version
+        if not full and version == self._history_version:
+            # Every committed edit goes through the history, so no item changed
+            return self._canvas_document, []
+
+        document = []
+        items = []
+        known = {}
+        for layer in self.canvas.layers:
+            ids = []
+            for item in layer['items']:
+                kind = item_kind(item)
+                if kind is None or item is self.canvas.temp_path:
+                    # Skip unknown items and the stroke still being drawn
+                    continue
+                state = ItemState.capture(item)
+                previous = self._known_items.get(item)
+                if previous is None:
+                    self._next_item_id += 1
+                    uid = self._next_item_id
+                else:
+                    uid = previous[0]
+                known[item] = (uid, state)
+                if full or previous is None or previous[1] != state:
+                    items.append((uid, kind, state))
+                ids.append(uid)
+            document.append({
+                'name': layer['name'],
+                'visible': layer['visible'],
+                'opacity': layer['opacity'],
+                'locked': layer['locked'],
+                'items': ids
+            })
+        self._known_items = known
+        self._canvas_document = document
+        self._history_version = version
+        return document, items
+
+    def _write_snapshot(self, seq: int, full: bool, document: Dict[str, Any], layers: List[Tuple],
+                        adjustments: List[Tuple[int, Any]], items: List[Tuple[int, str, ItemState]]):
+        """Compress and write a snapshot (runs on the worker thread)."""
+        start = time.perf_counter()
+        try:
+            if full:
+                # Write a fresh file and atomically replace the old one
+                tmp_path = self.path.with_suffix(RECOVERY_SUFFIX + ".tmp")
+                writer = RecoveryWriter(tmp_path)
+            else:
+                writer = self._writer
+
+            writer.write_record(dict(document, type='document'))
+            for uid, reset, frozen, keys in layers:
+                if reset:
+                    fill = int(frozen.fill_pixel.view('<u4')[0])
+                    writer.write_record({'type': 'reset', 'layer': uid, 'fill': fill})
+                for tx, ty in keys:
+                    # Pending tiles are paged in from the scratch file here
+                    writer.write_record({'type': 'tile', 'layer': uid, 'tx': tx, 'ty': ty},
+                                        zlib.compress(frozen.tile(tx, ty).tobytes(), 1))
+                frozen.release()
+            for uid, adjustment in adjustments:
+                try:
+                    data = pickle.dumps(adjustment)
+                except Exception as e:
+                    # Recovery skips the layer rather than restoring it as a plain one
+                    logger.warning(f"Cannot autosave the adjustment of layer {uid}: {e}")
+                    data = b""
+                writer.write_record({'type': 'adjustment', 'layer': uid}, data)
+            for uid, kind, state in items:
+                writer.write_record({'type': 'item', 'item': uid, 'kind': kind}, encode_item(state))
+            writer.commit(seq)
+
+            if full:
+                if self._writer is not None:
+                    self._writer.close()
+                os.replace(tmp_path, self.path)
+                writer.path = self.path
+                self._writer = writer
+
+            self.last_write_ms = (time.perf_counter() - start) * 1000
+            self.snapshot_saved.emit(seq)
+        except Exception as e:
+            logger.error(f"Autosave failed: {e}")
+            # The snapshot consumed the modified tiles, so rewrite everything next time
+            self._force_full = True
+            self.snapshot_failed.emit(str(e))
+        finally:
+            for _, _, frozen, _ in layers:
+                frozen.release()
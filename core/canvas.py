@@ -2,20 +2,124 @@
 Canvas module for PixelCrafter X.
 Handles the main drawing area and user interactions.
 """
+import math
+
 from PyQt6.QtWidgets import (
-    QGraphicsView, QGraphicsScene, QGraphicsPixmapItem, QRubberBand,
+    QGraphicsView, QGraphicsScene, QRubberBand,
     QGraphicsItem, QGraphicsRectItem, QGraphicsEllipseItem,
-    QGraphicsPathItem, QGraphicsTextItem, QInputDialog
+    QGraphicsPathItem, QGraphicsTextItem, QInputDialog, QStyle, QStyleOptionGraphicsItem
 )
-from PyQt6.QtCore import Qt, QPoint, QRect, QSize, QPointF, QRectF, pyqtSignal
+from PyQt6.QtCore import Qt, QPoint, QRect, QSize, QPointF, QRectF, QTimer, pyqtSignal
 from PyQt6.QtGui import (
-    QPainter, QPixmap, QColor, QPen, QBrush, QPainterPath,
-    QImage, QKeyEvent, QMouseEvent, QWheelEvent,
+    QPainter, QPainterPathStroker, QColor, QPen, QBrush, QPainterPath,
+    QImage, QKeyEvent, QKeySequence, QMouseEvent, QWheelEvent,
     QTransform, QCursor, QFont, QFontMetrics
 )
 import numpy as np
 from typing import Optional, Union, Tuple, List, Dict, Any
 
+from core.history.history_manager import HistoryManager
+from core.history.scene_commands import (
+    AddItemsCommand, AddLayerCommand, ItemState, LayerPropertyCommand, ModifyItemsCommand,
+    RemoveItemsCommand, RemoveLayerCommand
+)
+from core.layers.layer_manager import Layer, LayerManager
+from core.layers.layer_raster import LayerRaster
+from core.layers.mip_pyramid import CompositeTileSource, ImageTileSource, MipPyramid, MipmapItem
+from core.layers.tile_store import TiledImage
+from core.selection.spatial_index import SpatialIndex
+from core.viewport_updates import DirtyRegion, RepaintOverlay, SceneChurn
+from utils.file_io.file_handler import FileHandler
+from utils.file_io.image_exporter import ExportOptions, ExportService
+from utils.image.image_buffer import qimage_to_array
+from utils.image.overlay_cache import RULER_SIZE, get_overlay_cache, ruler_step
+
+class StrokeItem(QGraphicsPathItem):
+    """
+    Freehand stroke that grows point by point.
+    
+    Appending a point does not invalidate the item; the caller repaints the
+    returned segment rectangle. The bounding rectangle grows in large steps
+    so the whole stroke is only repainted when it has to grow.
+    """
+    
+    def __init__(self, start: QPointF, pen: QPen, parent: Optional[QGraphicsItem] = None):
+        super().__init__(parent)
+        self.setPen(pen)
+        self._path = QPainterPath(start)
+        self._last = QPointF(start)
+        self._bounds = self._pad(QRectF(start, start))
+    
+    def _pad(self, rect: QRectF) -> QRectF:
+        """Grow a rectangle by half the pen width plus antialiasing."""
+        margin = self.pen().widthF() / 2 + 2
+        return rect.normalized().adjusted(-margin, -margin, margin, margin)
+    
+    def append(self, point: QPointF) -> QRectF:
+        """Extend the stroke to a point and get the scene rectangle that changed."""
+        segment = self._pad(QRectF(self._last, point))
+        self._path.lineTo(point)
+        self._last = QPointF(point)
+        if not self._bounds.contains(segment):
+            # Grow by at least half the current size so growth stays rare
+            step = max(64.0, self._bounds.width() / 2, self._bounds.height() / 2)
+            self.prepareGeometryChange()
+            self._bounds = self._bounds.united(segment).adjusted(-step, -step, step, step)
+        return self.mapRectToScene(segment)
+    
+    def finish(self):
+        """Shrink the bounding rectangle to the stroke once it is complete."""
+        bounds = self._pad(self._path.controlPointRect())
+        if bounds != self._bounds:
+            self.prepareGeometryChange()
+            self._bounds = bounds
+    
+    def path(self) -> QPainterPath:
+        return QPainterPath(self._path)
+    
+    def setPath(self, path: QPainterPath):
+        self.prepareGeometryChange()
+        self._path = QPainterPath(path)
+        self._bounds = self._pad(path.controlPointRect())
+        self.update()
+    
+    def boundingRect(self) -> QRectF:
+        return self._bounds
+    
+    def shape(self) -> QPainterPath:
+        stroker = QPainterPathStroker()
+        stroker.setWidth(max(self.pen().widthF(), 1.0))
+        stroker.setCapStyle(self.pen().capStyle())
+        stroker.setJoinStyle(self.pen().joinStyle())
+        return stroker.createStroke(self._path)
+    
+    def paint(self, painter: QPainter, option, widget=None):
+        painter.setPen(self.pen())
+        painter.setBrush(Qt.BrushStyle.NoBrush)
+        painter.drawPath(self._path)
+        if option.state & QStyle.StateFlag.State_Selected:
+            painter.setPen(QPen(Qt.GlobalColor.black, 0, Qt.PenStyle.DashLine))
+            painter.drawRect(self._pad(self._path.controlPointRect()))
+
+class CanvasScene(QGraphicsScene):
+    """Graphics scene that reports item insertions and removals to a SceneChurn."""
+    
+    def __init__(self, churn: SceneChurn, parent=None):
+        super().__init__(parent)
+        self.churn = churn
+    
+    def addItem(self, item: QGraphicsItem):
+        super().addItem(item)
+        self.churn.item_added()
+    
+    def removeItem(self, item: QGraphicsItem):
+        super().removeItem(item)
+        self.churn.item_removed()
+    
+    def clear(self):
+        self.churn.item_removed(len(self.items()))
+        super().clear()
+
 class Canvas(QGraphicsView):
     """
     Main canvas widget that handles drawing and image manipulation.
@@ -23,6 +127,8 @@ class Canvas(QGraphicsView):
     # Signals
     mouseMoved = pyqtSignal(QPointF)
     zoomChanged = pyqtSignal(float)
+    # Emitted from the color worker once an opened image is in the working space
+    imageConverted = pyqtSignal(int, object, object)  # load number, TiledImage, Future
     
     def __init__(self, config=None, parent=None):
         """
@@ -34,7 +140,8 @@ class Canvas(QGraphicsView):
         """
         super().__init__(parent)
         self.config = config or {}
-        self.scene = QGraphicsScene(self)
+        self.scene_churn = SceneChurn()
+        self.scene = CanvasScene(self.scene_churn, self)
         self.setScene(self.scene)
         
         # Canvas properties
@@ -47,6 +154,9 @@ class Canvas(QGraphicsView):
         self.grid_color = QColor(60, 60, 60, 100)
         self.show_grid = True
         self.show_rulers = True
+        self.ruler_background = QColor(40, 40, 40)
+        self.ruler_color = QColor(170, 170, 170)
+        self.overlay_cache = get_overlay_cache()
         
         # Drawing properties
         self.drawing = False
@@ -71,25 +181,49 @@ class Canvas(QGraphicsView):
         self.layers = []
         self.current_layer_index = 0
         
-        # History for undo/redo
-        self.history = []
-        self.history_index = -1
-        self.max_history = 50
+        # Shared decoder for opening images
+        self.file_handler = FileHandler()
+        self.export_service = ExportService(self)
+        self.load_count = 0
+        self.imageConverted.connect(self.show_converted_image)
+        
+        # Undo/redo as commands that replay only the items and layers they touched
+        self.history = HistoryManager(max_states=50)
         
         # Setup view
         self.setRenderHint(QPainter.RenderHint.Antialiasing)
         self.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform)
-        self.setViewportUpdateMode(QGraphicsView.ViewportUpdateMode.FullViewportUpdate)
+        # Repaint only changed regions; strokes report theirs through mark_dirty
+        self.setViewportUpdateMode(QGraphicsView.ViewportUpdateMode.SmartViewportUpdate)
         self.setTransformationAnchor(QGraphicsView.ViewportAnchor.AnchorUnderMouse)
         self.setResizeAnchor(QGraphicsView.ViewportAnchor.AnchorViewCenter)
         self.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAsNeeded)
         self.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAsNeeded)
         self.setMouseTracking(True)
         
+        # Dirty scene regions, flushed once per event loop pass
+        self.dirty_region = DirtyRegion()
+        self.repaint_overlay = RepaintOverlay(self.config.get('performance', {}).get('show_repaints', False))
+        self._flush_timer = QTimer(self)
+        self._flush_timer.setSingleShot(True)
+        self._flush_timer.timeout.connect(self.flush_updates)
+        self.auto_fit = True
+        
+        # Older items of a layer are baked into raster tiles past this many live items
+        performance = self.config.get('performance', {})
+        self.stroke_compaction = performance.get('stroke_compaction', True)
+        self.live_item_limit = performance.get('live_item_limit', 64)
+        self.canvas_image = None
+        # Raster layers of the document, the part autosave keeps
+        self.layer_manager = LayerManager()
+        
         # Create default layer
         self.add_layer("Layer 1")
+        self.history.clear()
         
         # Set default brush
+        self.update_brush()
+        self.update_eraser()
         # Initialize selection
         self.selection_end = QPointF()
         self.rubber_band = QRubberBand(QRubberBand.Shape.Rectangle, self)
@@ -174,26 +308,65 @@ class Canvas(QGraphicsView):
             'visible': True,
             'opacity': 1.0,
             'locked': False,
-            'items': []
+            'items': [],  # every item, oldest first, including baked ones
+            'raster': None,  # LayerRaster with the baked items, created on first compaction
+            'index': SpatialIndex()  # bounding boxes of the committed items in the scene
         }
         self.layers.append(layer)
         self.current_layer_index = len(self.layers) - 1
+        self.history.add_command(AddLayerCommand(self, layer))
         return layer
     
     def remove_layer(self, index: int):
         """Remove a layer from the canvas."""
         if 0 <= index < len(self.layers):
-            # Remove all items in the layer
-            for item in self.layers[index]['items']:
-                if item.scene() == self.scene():
-                    self.scene().removeItem(item)
-            
-            # Remove the layer
-            self.layers.pop(index)
-            
-            # Update current layer index if needed
-            if self.current_layer_index >= len(self.layers):
-                self.current_layer_index = max(0, len(self.layers) - 1)
+            layer = self.layers[index]
+            self.take_layer(layer)
+            self.history.add_command(RemoveLayerCommand(self, layer, index))
+    
+    def set_layer_property(self, index: int, key: str, value):
+        """Change a layer's 'name', 'visible', 'opacity' or 'locked' value."""
+        if 0 <= index < len(self.layers):
+            layer = self.layers[index]
+            old_value = layer.get(key)
+            if old_value != value:
+                self.apply_layer_property(layer, key, value)
+                self.history.add_command(LayerPropertyCommand(self, layer, key, old_value, value))
+    
+    def apply_layer_property(self, layer: dict, key: str, value):
+        layer[key] = value
+        if key == 'visible':
+            for item in layer['items']:
+                if item.scene() is self.scene:
+                    item.setVisible(value)
+            if layer.get('raster') is not None:
+                layer['raster'].item.setVisible(value)
+    
+    def take_layer(self, layer: dict) -> int:
+        """Take a layer and its items out of the canvas, keeping them in the layer, and get its position."""
+        position = self.layers.index(layer)
+        for item in layer['items']:
+            if item.scene() is self.scene:
+                self.scene.removeItem(item)
+        raster = layer.get('raster')
+        if raster is not None:
+            self.scene.removeItem(raster.item)
+        self.layers.pop(position)
+        if self.current_layer_index >= len(self.layers):
+            self.current_layer_index = max(0, len(self.layers) - 1)
+        return position
+    
+    def insert_layer(self, position: int, layer: dict):
+        """Put a layer taken out with take_layer back at a position."""
+        raster = layer.get('raster')
+        baked = set(raster.baked) if raster is not None else set()
+        for item in layer['items']:
+            if item not in baked:
+                self.scene.addItem(item)
+        if raster is not None:
+            self.scene.addItem(raster.item)
+        self.layers.insert(position, layer)
+        self.current_layer_index = position
     
     def get_current_layer(self) -> dict:
         """Get the current active layer."""
@@ -201,46 +374,60 @@ class Canvas(QGraphicsView):
             return self.add_layer("Layer 1")
         return self.layers[self.current_layer_index]
     
-    def save_state(self):
-        """Save the current canvas state to history."""
-        # Limit history size
-        if len(self.history) > self.max_history:
-            self.history.pop(0)
-        
-        # Save current state
-        state = {
-            'layers': [],
-            'current_layer': self.current_layer_index
-        }
-        
-        self.history.append(state)
-        self.history_index = len(self.history) - 1
-    
-    def undo(self):
+    def undo(self) -> bool:
         """Undo the last action."""
-        if self.history_index > 0:
-            self.history_index -= 1
-            self.restore_state(self.history[self.history_index])
+        return self.history.undo()
     
-    def redo(self):
+    def redo(self) -> bool:
         """Redo the last undone action."""
-        if self.history_index < len(self.history) - 1:
-            self.history_index += 1
-            self.restore_state(self.history[self.history_index])
+        return self.history.redo()
     
-    def restore_state(self, state: dict):
-        """Restore canvas state from history."""
-        # Clear current scene
-        self.scene().clear()
-        
-        # Restore layers
-        self.layers = state.get('layers', [])
-        self.current_layer_index = state.get('current_layer', 0)
+    def insert_item(self, layer: dict, item: QGraphicsItem, position: Optional[int] = None):
+        """
+        Put an item back into a layer at a position in its item list.
         
-        # Redraw all items
+        The item keeps its stacking order: it goes below the next live item,
+        or into the raster when the next item is baked.
+        """
+        items = layer['items']
+        if position is None or position > len(items):
+            position = len(items)
+        items.insert(position, item)
+        following = items[position + 1] if position + 1 < len(items) else None
+        raster = layer.get('raster')
+        if following is not None and following.scene() is None and raster is not None:
+            if raster.bake([item], before=following):
+                return
+        self.scene.addItem(item)
+        item.setVisible(layer['visible'])
+        if following is not None and following.scene() is self.scene:
+            item.stackBefore(following)
+        self.index_item(layer, item)
+    
+    def take_item(self, layer: dict, item: QGraphicsItem) -> int:
+        """Remove an item from a layer, the scene or the raster, and get its position in the layer."""
+        position = layer['items'].index(item)
+        del layer['items'][position]
+        if item.scene() is self.scene:
+            self.scene.removeItem(item)
+            layer['index'].remove(item)
+        elif layer.get('raster') is not None:
+            layer['raster'].remove([item])
+        return position
+    
+    def item_changed(self, layer: dict, item: QGraphicsItem, old_rect: QRectF):
+        """Refresh the index or raster tiles after an item's geometry changed from ``old_rect``."""
+        if item.scene() is self.scene:
+            layer['index'].update(item)
+        elif layer.get('raster') is not None:
+            layer['raster'].redraw([old_rect, item.sceneBoundingRect()])
+    
+    def layer_of(self, item: QGraphicsItem) -> Optional[dict]:
+        """Get the layer holding a live item."""
         for layer in self.layers:
-            for item in layer.get('items', []):
-                self.scene().addItem(item)
+            if item in layer['index']:
+                return layer
+        return None
     
     def mousePressEvent(self, event: QMouseEvent):
         """Handle mouse press events."""
@@ -251,7 +438,7 @@ class Canvas(QGraphicsView):
             
             if self.current_tool == 'select':
                 self.selection_start = pos
-                self.rubber_band.setGeometry(QRect(self.mapFromScene(pos).toPoint(), QSize()))
+                self.rubber_band.setGeometry(QRect(self.mapFromScene(pos), QSize()))
                 self.rubber_band.show()
             
             elif self.current_tool in ['rectangle', 'ellipse', 'line', 'arrow']:
@@ -298,9 +485,6 @@ class Canvas(QGraphicsView):
             
             elif self.current_tool in ['rectangle', 'ellipse', 'line', 'arrow']:
                 self.finalize_shape()
-            
-            # Save state after drawing
-            self.save_state()
         
         super().mouseReleaseEvent(event)
     
@@ -331,16 +515,14 @@ class Canvas(QGraphicsView):
             return
         
         if self.current_tool == 'brush':
-            path = QPainterPath()
-            path.moveTo(pos)
-            self.temp_path = self.scene().addPath(path, self.brush)
+            self.temp_path = StrokeItem(pos, self.brush)
+            self.scene.addItem(self.temp_path)
             layer['items'].append(self.temp_path)
         
         elif self.current_tool == 'eraser':
             # For eraser, we'll draw a line to simulate erasing
-            path = QPainterPath()
-            path.moveTo(pos)
-            self.temp_path = self.scene().addPath(path, self.eraser)
+            self.temp_path = StrokeItem(pos, self.eraser)
+            self.scene.addItem(self.temp_path)
             layer['items'].append(self.temp_path)
     
     def continue_drawing(self, pos: QPointF):
@@ -349,83 +531,109 @@ class Canvas(QGraphicsView):
             return
         
         if self.current_tool in ['brush', 'eraser']:
-            path = self.temp_path.path()
-            path.lineTo(pos)
-            self.temp_path.setPath(path)
+            self.mark_dirty(self.temp_path.append(pos))
             self.last_point = pos
     
     def update_rubber_band(self, pos: QPointF):
         """Update the rubber band selection rectangle."""
         rect = QRectF(self.selection_start, pos).normalized()
         self.rubber_band.setGeometry(QRect(
-            self.mapFromScene(rect.topLeft()).toPoint(),
-            self.mapFromScene(rect.bottomRight()).toPoint()
+            self.mapFromScene(rect.topLeft()),
+            self.mapFromScene(rect.bottomRight())
         ))
     
     def select_items_in_rect(self):
-        """Select items within the rubber band rectangle."""
-        rect = QRectF(self.selection_start, self.mapToScene(self.rubber_band.geometry().bottomRight()))
+        """Select items within the rubber band rectangle, or the item under a click."""
+        rect = QRectF(self.selection_start, self.selection_end).normalized()
         
         # Clear current selection
+        self.scene.blockSignals(True)
         for item in self.selected_items:
             item.setSelected(False)
         self.selected_items.clear()
         
-        # Select items in the rectangle
-        for item in self.scene().items(rect, Qt.ItemSelectionMode.ContainsItemShape):
-            if isinstance(item, QGraphicsItem):
-                item.setSelected(True)
-                self.selected_items.append(item)
+        if rect.width() * self.zoom_level < 2 and rect.height() * self.zoom_level < 2:
+            item = self.hit_test(self.selection_start)
+            found = [item] if item is not None else []
+        else:
+            # Only visible, unlocked layers; the index skips items far from the rectangle
+            found = []
+            for layer in self.layers:
+                if layer.get('visible', True) and not layer.get('locked', False):
+                    found.extend(layer['index'].query(rect, Qt.ItemSelectionMode.ContainsItemShape))
+        for item in found:
+            item.setSelected(True)
+            self.selected_items.append(item)
+        self.scene.blockSignals(False)
+    
+    def hit_test(self, pos: QPointF) -> Optional[QGraphicsItem]:
+        """Get the topmost item under a scene point in a visible, unlocked layer."""
+        for layer in reversed(self.layers):
+            if layer.get('visible', True) and not layer.get('locked', False):
+                items = layer['index'].items_at(pos)
+                if items:
+                    return items[0]
+        return None
     
     def update_shape(self, pos: QPointF):
-        """Update the current shape being drawn."""
+        """Update the shape being drawn, reshaping a single preview item for the whole drag."""
         self.shape_end = pos
+        if self.current_tool in ['line', 'arrow']:
+            kind = QGraphicsPathItem
+        elif self.current_tool == 'ellipse':
+            kind = QGraphicsEllipseItem
+        elif self.current_tool == 'rectangle':
+            kind = QGraphicsRectItem
+        else:
+            return
         
-        if self.current_item is not None:
-            self.scene().removeItem(self.current_item)
+        if type(self.current_item) is not kind:
+            if self.current_item is not None:
+                self.scene.removeItem(self.current_item)
+            self.current_item = kind()
+            self.current_item.setPen(self.brush)
+            if kind is not QGraphicsPathItem:
+                self.current_item.setBrush(QBrush(self.brush_color) if self.fill_shape else QBrush(Qt.BrushStyle.NoBrush))
+            self.scene.addItem(self.current_item)
         
-        if self.current_tool == 'rectangle':
-            rect = QRectF(self.shape_start, self.shape_end).normalized()
-            self.current_item = self.scene().addRect(rect, self.brush, 
-                                                   QBrush(self.brush_color) if self.fill_shape else Qt.BrushStyle.NoBrush)
+        if kind is QGraphicsPathItem:
+            self.current_item.setPath(self.shape_path(self.shape_start, self.shape_end))
+        else:
+            self.current_item.setRect(QRectF(self.shape_start, self.shape_end).normalized())
+    
+    def shape_path(self, start: QPointF, end: QPointF) -> QPainterPath:
+        """Build the path of a line, with an arrowhead for the arrow tool."""
+        path = QPainterPath()
+        path.moveTo(start)
+        path.lineTo(end)
         
-        elif self.current_tool == 'ellipse':
-            rect = QRectF(self.shape_start, self.shape_end).normalized()
-            self.current_item = self.scene().addEllipse(rect, self.brush,
-                                                      QBrush(self.brush_color) if self.fill_shape else Qt.BrushStyle.NoBrush)
-        
-        elif self.current_tool in ['line', 'arrow']:
-            path = QPainterPath()
-            path.moveTo(self.shape_start)
-            path.lineTo(self.shape_end)
+        if self.current_tool == 'arrow':
+            # Add arrowhead, two 10 unit barbs at 30 degrees to the shaft
+            angle = math.atan2(end.y() - start.y(), end.x() - start.x())
+            arrow_size = 10.0
             
-            if self.current_tool == 'arrow':
-                # Add arrowhead
-                angle = self.shape_start.angleTo(self.shape_end)
-                arrow_size = 10.0
-                
-                p1 = self.shape_end - QPointF(
-                    arrow_size * 0.5 * (1.0 + math.cos(angle + math.pi / 4)),
-                    arrow_size * 0.5 * (1.0 + math.sin(angle + math.pi / 4))
-                )
-                p2 = self.shape_end - QPointF(
-                    arrow_size * 0.5 * (1.0 + math.cos(angle - math.pi / 4)),
-                    arrow_size * 0.5 * (1.0 + math.sin(angle - math.pi / 4))
-                )
-                
-                path.moveTo(self.shape_end)
-                path.lineTo(p1)
-                path.moveTo(self.shape_end)
-                path.lineTo(p2)
+            p1 = end - QPointF(arrow_size * math.cos(angle + math.pi / 6), arrow_size * math.sin(angle + math.pi / 6))
+            p2 = end - QPointF(arrow_size * math.cos(angle - math.pi / 6), arrow_size * math.sin(angle - math.pi / 6))
             
-            self.current_item = self.scene().addPath(path, self.brush)
+            path.moveTo(end)
+            path.lineTo(p1)
+            path.moveTo(end)
+            path.lineTo(p2)
+        return path
     
     def finalize_shape(self):
         """Finalize the current shape and add it to the layer."""
         if self.current_item is not None:
             layer = self.get_current_layer()
             if not layer.get('locked', False):
+                # The preview item itself becomes the committed shape
                 layer['items'].append(self.current_item)
+                self.index_item(layer, self.current_item)
+                self.history.add_command(AddItemsCommand(self, layer, [self.current_item], "Draw Shape"))
+                self.current_item = None
+                self.compact_layer(layer)
+            else:
+                self.scene.removeItem(self.current_item)
                 self.current_item = None
     
     def add_text_item(self, pos: QPointF):
@@ -439,26 +647,69 @@ class Canvas(QGraphicsView):
             
             layer = self.get_current_layer()
             if not layer.get('locked', False):
-                self.scene().addItem(text_item)
+                self.scene.addItem(text_item)
                 layer['items'].append(text_item)
-                self.save_state()
+                self.index_item(layer, text_item)
+                self.history.add_command(AddItemsCommand(self, layer, [text_item], "Add Text"))
+                self.compact_layer(layer)
     
     def fill_area(self, pos: QPointF):
         """Fill an area with the current brush color."""
         # This is a simplified implementation
         # A full implementation would require flood fill algorithm
+        layer = self.get_current_layer()
+        if layer.get('locked', False):
+            return
         rect = QRectF(pos.x() - 5, pos.y() - 5, 10, 10)
-        item = self.scene().addRect(rect, QPen(Qt.PenStyle.NoPen), 
-                                   QBrush(self.brush_color, Qt.BrushStyle.SolidPattern))
+        item = QGraphicsRectItem(rect)
+        item.setPen(QPen(Qt.PenStyle.NoPen))
+        item.setBrush(QBrush(self.brush_color, Qt.BrushStyle.SolidPattern))
+        self.scene.addItem(item)
+        layer['items'].append(item)
+        self.index_item(layer, item)
+        self.history.add_command(AddItemsCommand(self, layer, [item], "Fill"))
+        self.compact_layer(layer)
+    
+    def index_item(self, layer: dict, item: QGraphicsItem):
+        """Make a committed item selectable and findable by area."""
+        item.setFlag(QGraphicsItem.GraphicsItemFlag.ItemIsSelectable)
+        layer['index'].insert(item)
+    
+    def compact_layer(self, layer: dict, force: bool = False):
+        """
+        Bake the older items of a layer into its raster tiles.
         
-        layer = self.get_current_layer()
-        if not layer.get('locked', False):
-            layer['items'].append(item)
-            self.save_state()
+        Runs once the layer has more than ``live_item_limit`` items in the
+        scene, or always with ``force``, and keeps the newest half of the
+        limit live. Baked items stay in the layer's item list.
+        """
+        if self.canvas_image is None or (not self.stroke_compaction and not force):
+            return
+        live = [item for item in layer['items'] if item.scene() is self.scene and item is not self.temp_path]
+        if not force and len(live) <= self.live_item_limit:
+            return
+        keep = 0 if force else self.live_item_limit // 2
+        raster = layer.get('raster')
+        if raster is None:
+            performance = self.config.get('performance', {})
+            raster = LayerRaster(self.canvas_image.width(), self.canvas_image.height(),
+                                 performance.get('display_cache_mb', 256))
+            self.scene.addItem(raster.item)
+            layer['raster'] = raster
+        for item in raster.bake(live[:len(live) - keep]):
+            layer['index'].remove(item)
+    
+    def expand_layer(self, layer: dict):
+        """Put a layer's baked items back into the scene as editable vectors."""
+        raster = layer.get('raster')
+        if raster is not None:
+            for item in raster.restore():
+                self.scene.addItem(item)
+                layer['index'].insert(item)
     
     def on_selection_changed(self):
         """Handle selection changes in the scene."""
-        self.selected_items = self.scene().selectedItems()
+        self.selected_items = self.scene.selectedItems()
     
     def clear_selection(self):
         """Clear the current selection."""
@@ -468,106 +719,124 @@ class Canvas(QGraphicsView):
     
     def delete_selected(self):
         """Delete selected items."""
-        for item in self.selected_items:
-            if item.scene() == self.scene():
-                self.scene().removeItem(item)
+        removed = [(self.layer_of(item), item) for item in self.selected_items]
+        removed = [(layer, item) for layer, item in removed if layer is not None]
+        if removed:
+            command = RemoveItemsCommand(self, removed)
+            command.execute()
+            self.history.add_command(command)
         self.selected_items.clear()
-        self.save_state()
     
-    def drawBackground(self, painter: QPainter, rect: QRectF):
-        """Draw the canvas background and grid."""
-        # Fill with background color
-        painter.fillRect(rect, self.background_color)
+    def move_selected(self, dx: float, dy: float):
+        """Move the selected items by an offset in scene units."""
+        moved = [(self.layer_of(item), item) for item in self.selected_items]
+        moved = [(layer, item) for layer, item in moved if layer is not None and not layer.get('locked', False)]
+        if not moved:
+            return
+        before = [ItemState.capture(item) for _, item in moved]
+        for layer, item in moved:
+            item.moveBy(dx, dy)
+            layer['index'].update(item)
+        self.history.add_command(ModifyItemsCommand(self, moved, before, "Move"))
+    
+    def save_image(self, file_path: str, options: Optional[ExportOptions] = None) -> bool:
+        """Save the canvas to an image file.
         
-        # Draw grid if enabled
-        if self.show_grid and self.zoom_level > 0.5:  # Only show grid when zoomed in enough
-            grid_pen = QPen(self.grid_color, 0.5 / self.zoom_level)
-            painter.setPen(grid_pen)
-            
-            # Calculate visible grid lines
-            left = int(rect.left()) - (int(rect.left()) % self.grid_size)
-            top = int(rect.top()) - (int(rect.top()) % self.grid_size)
-            
-            # Draw vertical lines
-            x = left
-            while x < rect.right():
-                painter.drawLine(QPointF(x, rect.top()), QPointF(x, rect.bottom()))
-                x += self.grid_size
-            
-            # Draw horizontal lines
-            y = top
-            while y < rect.bottom():
-                painter.drawLine(QPointF(rect.left(), y), QPointF(rect.right(), y))
-                y += self.grid_size
-    
-    def save_image(self, file_path: str) -> bool:
-        """Save the canvas to an image file."""
+        The scene is rendered here; encoding and writing happen on the export
+        service's worker thread, which reports completion via its signals.
+        """
         try:
-            # Create a QImage with the size of the scene
-            rect = self.scene().sceneRect()
-            image = QImage(rect.size().toSize(), QImage.Format.Format_ARGB32)
-            image.fill(Qt.GlobalColor.white)
-            
-            # Render the scene onto the image
-            painter = QPainter(image)
-            self.scene().render(painter)
-            painter.end()
-            
-            # Save the image
-            return image.save(file_path)
+            # Hand the pixels to the encoder thread
+            self.export_service.export_array(self.render_to_array(), file_path, options)
+            return True
         except Exception as e:
             print(f"Error saving image: {e}")
             return False
     
+    def export_presets(self, base_path: str, presets=None) -> Optional[int]:
+        """Render the scene once and export every export preset from it in the background.
+        
+        Returns:
+            The export job id, or None if the scene could not be rendered
+        """
+        try:
+            return self.export_service.export_presets(self.render_to_array(), base_path, presets)
+        except Exception as e:
+            print(f"Error exporting presets: {e}")
+            return None
+    
+    def render_to_array(self) -> np.ndarray:
+        """Render the scene over white into an ARGB32 array."""
+        # Create a QImage with the size of the scene
+        rect = self.scene.sceneRect()
+        image = QImage(rect.size().toSize(), QImage.Format.Format_ARGB32)
+        image.fill(Qt.GlobalColor.white)
+        
+        # Render the scene onto the image, leaving out selection outlines
+        selected = self.scene.selectedItems()
+        self.scene.blockSignals(True)
+        for item in selected:
+            item.setSelected(False)
+        painter = QPainter(image)
+        self.scene.render(painter)
+        painter.end()
+        for item in selected:
+            item.setSelected(True)
+        self.scene.blockSignals(False)
+        return qimage_to_array(image)
+    
+    def selection_mask(self) -> Optional[np.ndarray]:
+        """Get a boolean mask of the pixels under the selected items, matching render_to_array, or None."""
+        if not self.selected_items:
+            return None
+        rect = self.scene.sceneRect()
+        image = QImage(rect.size().toSize(), QImage.Format.Format_ARGB32)
+        image.fill(Qt.GlobalColor.transparent)
+        
+        painter = QPainter(image)
+        painter.translate(-rect.topLeft())
+        painter.setPen(Qt.PenStyle.NoPen)
+        painter.setBrush(Qt.GlobalColor.white)
+        for item in self.selected_items:
+            painter.drawPath(item.sceneTransform().map(item.shape()))
+        painter.end()
+        return qimage_to_array(image)[..., 3] > 0
+    
     def load_image(self, file_path: str) -> bool:
         """Load an image file onto the canvas."""
         try:
-            pixmap = QPixmap(file_path)
-            if not pixmap.isNull():
-                # Clear existing content
-                self.scene().clear()
-                
-                # Add the image to the scene
-                self.scene().addPixmap(pixmap)
-                self.scene().setSceneRect(pixmap.rect())
-                
-                # Reset view
-                self.fitInView(self.scene().sceneRect(), Qt.AspectRatioMode.KeepAspectRatio)
-                
-                # Reset zoom level
-                self.zoom_level = 1.0
-                self.zoomChanged.emit(self.zoom_level)
-                
-                return True
-            return False
+            # Decode straight into tiles; large TIFFs are streamed a band at a time
+            image, metadata = self.file_handler.load_layer_image(file_path, convert_async=True)
+            if image is None or image.isNull():
+                return False
+            self.load_count += 1
+            conversion = metadata.get('color_conversion')
+            if conversion is None:
+                self.show_image(image)
+            else:
+                # Color conversion runs in the background; the image appears when it is done
+                number = self.load_count
+                conversion.add_done_callback(lambda future: self.imageConverted.emit(number, image, future))
+            return True
         except Exception as e:
             print(f"Error loading image: {e}")
             return False
     
-    def resizeEvent(self, event):
-        """Handle window resize events."""
-        super().resizeEvent(event)
-        if self.scene() is not None:
-            self.fitInView(self.scene().sceneRect(), Qt.AspectRatioMode.KeepAspectRatio)
-        
-        # Setup view
-        self.setRenderHints(
-            QPainter.RenderHint.Antialiasing |
-            QPainter.RenderHint.SmoothPixmapTransform |
-            QPainter.RenderHint.TextAntialiasing
-        )
-        self.setViewportUpdateMode(QGraphicsView.ViewportUpdateMode.FullViewportUpdate)
-        self.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOn)
-        self.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOn)
-        self.setTransformationAnchor(QGraphicsView.ViewportAnchor.AnchorUnderMouse)
-        self.setResizeAnchor(QGraphicsView.ViewportAnchor.AnchorUnderMouse)
-        self.setDragMode(QGraphicsView.DragMode.NoDrag)
-        
-        # Create a default blank image
-        self.create_new_canvas(800, 600, QColor(255, 255, 255, 255))
-        
-        # Set up mouse tracking
-        self.setMouseTracking(True)
+    def show_converted_image(self, number: int, image: TiledImage, future):
+        """Show an opened image after its color conversion, unless the canvas was replaced since."""
+        if number != self.load_count:
+            return
+        try:
+            future.result()
+        except Exception as e:
+            print(f"Error converting image colors: {e}")
+            return
+        self.show_image(image)
+    
+    def show_image(self, image: TiledImage):
+        """Replace the scene content with the image, drawn through its zoom levels, and fit the view."""
+        self.set_canvas_image(image)
+        self.fit_to_window()
     
     def create_new_canvas(self, width, height, bg_color=Qt.GlobalColor.white):
         """
@@ -578,18 +847,74 @@ class Canvas(QGraphicsView):
             height: Height of the canvas
             bg_color: Background color
         """
-        self.scene.clear()
-        self.canvas_image = QImage(width, height, QImage.Format.Format_ARGB32)
-        self.canvas_image.fill(bg_color)
+        canvas_image = TiledImage(width, height)
+        canvas_image.fill(bg_color)
+        self.set_canvas_image(canvas_image)
+        self.fit_to_window()
+    
+    def set_canvas_image(self, image: TiledImage):
+        """Replace the scene content with a raster image shown through a mip pyramid."""
+        self.set_canvas_layers([Layer(name="Background", image=image)], ImageTileSource(image))
+    
+    def set_canvas_layers(self, layers: List[Layer], source=None):
+        """
+        Replace the scene content with a stack of raster layers, e.g. a recovered document.
         
-        # Create a pixmap item to hold the image
-        self.pixmap_item = QGraphicsPixmapItem()
-        self.pixmap_item.setPixmap(QPixmap.fromImage(self.canvas_image))
-        self.scene.addItem(self.pixmap_item)
+        Args:
+            layers: Raster layers, bottom to top
+            source: Pyramid source to show; defaults to the composite of the layers
+        """
+        self.scene.clear()
+        for layer in self.layers:
+            layer['items'].clear()
+            layer['raster'] = None
+            layer['index'].clear()
+        self.history.clear()
+        # An image still being converted must not replace this content
+        self.load_count += 1
+        self.layer_manager.layers = list(layers)
+        self.layer_manager.active_layer_index = len(layers) - 1
+        self.canvas_image = layers[0].image
+        if source is None:
+            source = CompositeTileSource(self.layer_manager)
+        performance = self.config.get('performance', {})
+        self.mip_pyramid = MipPyramid(source, performance.get('display_cache_mb', 256))
+        self.image_item = MipmapItem(self.mip_pyramid)
+        self.image_item.setZValue(-1)
+        self.scene.addItem(self.image_item)
         
         # Update scene rect to match image size
+        width, height = source.size
         self.scene.setSceneRect(0, 0, width, height)
-        self.fitInView(self.scene.sceneRect(), Qt.AspectRatioMode.KeepAspectRatio)
+    
+    def set_vector_layers(self, layers: List[Dict[str, Any]]):
+        """
+        Replace the canvas layers and their items, e.g. with recovered ones.
+        
+        Args:
+            layers: Dicts with 'name', 'visible', 'opacity', 'locked' and
+                'items', the items oldest first; layers are bottom to top
+        """
+        for layer in list(self.layers):
+            self.take_layer(layer)
+        for info in layers:
+            layer = {
+                'name': info['name'],
+                'visible': info['visible'],
+                'opacity': info['opacity'],
+                'locked': info['locked'],
+                'items': [],
+                'raster': None,
+                'index': SpatialIndex()
+            }
+            self.layers.append(layer)
+            for item in info['items']:
+                self.insert_item(layer, item)
+            self.compact_layer(layer)
+            if layer['raster'] is not None:
+                layer['raster'].item.setVisible(layer['visible'])
+        self.current_layer_index = max(0, len(self.layers) - 1)
+        self.history.clear()
     
     def wheelEvent(self, event: QWheelEvent):
         """Handle mouse wheel events for zooming."""
@@ -605,7 +930,7 @@ class Canvas(QGraphicsView):
             pos: Position to zoom towards (in view coordinates)
         """
         if pos is None:
-            pos = self.viewport().rect().center()
+            pos = QPointF(self.viewport().rect().center())
             
         # Calculate the scene position before zooming
         old_pos = self.mapToScene(pos.toPoint())
@@ -618,6 +943,7 @@ class Canvas(QGraphicsView):
             return
             
         self.zoom_level = new_zoom
+        self.auto_fit = False
         self.setTransformationAnchor(QGraphicsView.ViewportAnchor.NoAnchor)
         self.setResizeAnchor(QGraphicsView.ViewportAnchor.NoAnchor)
         
@@ -638,36 +964,55 @@ class Canvas(QGraphicsView):
         if event.button() == Qt.MouseButton.LeftButton:
             self.drawing = True
             self.last_point = self.mapToScene(event.pos())
+            self.scene_churn.begin_interaction(self.current_tool)
             
             if self.current_tool == 'select':
                 self.selection_start = self.last_point
                 self.rubber_band.setGeometry(QRect(
-                    self.mapFromScene(self.selection_start).toPoint(),
+                    self.mapFromScene(self.selection_start),
                     QSize()
                 ))
                 self.rubber_band.show()
             
-            # Add other tool handlers here
+            elif self.current_tool in ['rectangle', 'ellipse', 'line', 'arrow']:
+                self.shape_start = self.last_point
+                self.shape_end = self.last_point
+                self.current_item = None
+            
+            elif self.current_tool == 'text':
+                self.add_text_item(self.last_point)
+            
+            elif self.current_tool == 'fill':
+                self.fill_area(self.last_point)
+            
+            elif self.current_tool in ['brush', 'eraser']:
+                self.start_drawing(self.last_point)
             
-            self.viewport().update()
+            if self.current_tool != 'select':
+                # Drawing tools must not click-select the items under the cursor
+                return
         
         super().mousePressEvent(event)
     
     def mouseMoveEvent(self, event: QMouseEvent):
         """Handle mouse move events."""
+        current_point = self.mapToScene(event.pos())
         if self.drawing:
-            current_point = self.mapToScene(event.pos())
-            
+            self.scene_churn.pointer_moved()
             if self.current_tool == 'select':
                 self.selection_end = current_point
                 self.update_rubber_band()
-            # Add other tool handlers here
+            
+            elif self.current_tool in ['rectangle', 'ellipse', 'line', 'arrow']:
+                self.update_shape(current_point)
+            
+            elif self.current_tool in ['brush', 'eraser']:
+                self.continue_drawing(current_point)
             
             self.last_point = current_point
-            self.viewport().update()
         
-        # Update cursor position in status bar if needed
-        self.parent().statusBar().showMessage(f"X: {int(event.pos().x())}, Y: {int(event.pos().y())}")
+        # Update cursor position in status bar
+        self.mouseMoved.emit(current_point)
         
         super().mouseMoveEvent(event)
     
@@ -678,47 +1023,146 @@ class Canvas(QGraphicsView):
             
             if self.current_tool == 'select':
                 self.selection_end = self.mapToScene(event.pos())
-                self.update_rubber_band()
-            # Add other tool handlers here
+                self.rubber_band.hide()
+                self.select_items_in_rect()
+            
+            elif self.current_tool in ['rectangle', 'ellipse', 'line', 'arrow']:
+                self.finalize_shape()
+            
+            elif self.current_tool in ['brush', 'eraser'] and self.temp_path is not None:
+                layer = self.get_current_layer()
+                self.temp_path.finish()
+                self.index_item(layer, self.temp_path)
+                self.history.add_command(AddItemsCommand(
+                    self, layer, [self.temp_path], "Brush Stroke" if self.current_tool == 'brush' else "Erase"))
+                self.temp_path = None
+                self.compact_layer(layer)
             
-            self.viewport().update()
+            self.scene_churn.end_interaction()
         
         super().mouseReleaseEvent(event)
     
+    def keyPressEvent(self, event: QKeyEvent):
+        """Handle undo/redo, deleting and nudging the selection."""
+        if event.matches(QKeySequence.StandardKey.Undo):
+            self.undo()
+        elif event.matches(QKeySequence.StandardKey.Redo):
+            self.redo()
+        elif event.key() in (Qt.Key.Key_Delete, Qt.Key.Key_Backspace) and self.selected_items:
+            self.delete_selected()
+        elif event.key() in (Qt.Key.Key_Left, Qt.Key.Key_Right, Qt.Key.Key_Up, Qt.Key.Key_Down) and self.selected_items:
+            step = 10 if event.modifiers() & Qt.KeyboardModifier.ShiftModifier else 1
+            dx = {Qt.Key.Key_Left: -step, Qt.Key.Key_Right: step}.get(event.key(), 0)
+            dy = {Qt.Key.Key_Up: -step, Qt.Key.Key_Down: step}.get(event.key(), 0)
+            self.move_selected(dx, dy)
+        else:
+            super().keyPressEvent(event)
+    
     def update_rubber_band(self):
         """Update the rubber band selection rectangle."""
-        start = self.mapFromScene(self.selection_start).toPoint()
-        end = self.mapFromScene(self.selection_end).toPoint()
+        start = self.mapFromScene(self.selection_start)
+        end = self.mapFromScene(self.selection_end)
         
         rect = QRect(start, end).normalized()
         self.rubber_band.setGeometry(rect)
     
     def drawBackground(self, painter: QPainter, rect):
-        """Draw the canvas background and grid."""
-        # Fill with background color
-        painter.fillRect(rect, self.background_color)
-        
-        # Draw grid if enabled
+        """Draw the canvas background and grid as one textured fill."""
         if self.show_grid:
-            painter.setPen(QPen(self.grid_color, 1, Qt.PenStyle.DotLine))
-            
-            # Calculate visible grid lines
-            grid_size = self.grid_size
-            left = int(rect.left()) - (int(rect.left()) % grid_size)
-            top = int(rect.top()) - (int(rect.top()) % grid_size)
-            
-            # Draw vertical lines
-            for x in range(left, int(rect.right()), grid_size):
-                painter.drawLine(x, int(rect.top()), x, int(rect.bottom()))
-            
-            # Draw horizontal lines
-            for y in range(top, int(rect.bottom()), grid_size):
-                painter.drawLine(int(rect.left()), y, int(rect.right()), y)
+            zoom = QStyleOptionGraphicsItem.levelOfDetailFromTransform(painter.worldTransform())
+            brush = self.overlay_cache.grid_brush(self.grid_size, zoom, self.grid_color,
+                                                  self.background_color, self.devicePixelRatioF())
+        else:
+            brush = QBrush(self.background_color)
+        painter.fillRect(rect, brush)
+    
+    def drawForeground(self, painter: QPainter, rect):
+        """Draw the rulers along the top and left edges of the view."""
+        if not self.show_rulers:
+            return
+        painter.save()
+        painter.resetTransform()
+        zoom = self.transform().m11()
+        dpr = self.devicePixelRatioF()
+        origin = self.viewportTransform().map(QPointF(0, 0))
+        width, height = self.viewport().width(), self.viewport().height()
+        
+        painter.fillRect(QRectF(RULER_SIZE, 0, width - RULER_SIZE, RULER_SIZE), self.overlay_cache.ruler_brush(
+            zoom, origin.x(), False, self.ruler_background, self.ruler_color, dpr))
+        painter.fillRect(QRectF(0, RULER_SIZE, RULER_SIZE, height - RULER_SIZE), self.overlay_cache.ruler_brush(
+            zoom, origin.y(), True, self.ruler_background, self.ruler_color, dpr))
+        painter.fillRect(QRectF(0, 0, RULER_SIZE, RULER_SIZE), self.ruler_background)
+        
+        # Labels differ per tick, so only they are drawn one by one
+        step = ruler_step(zoom)
+        painter.setPen(self.ruler_color)
+        painter.setFont(QFont('Arial', 7))
+        value = math.ceil((RULER_SIZE - origin.x()) / zoom / step) * step
+        while origin.x() + value * zoom < width:
+            painter.drawText(QPointF(origin.x() + value * zoom + 2, 9), f"{value:g}")
+            value += step
+        value = math.ceil((RULER_SIZE - origin.y()) / zoom / step) * step
+        while origin.y() + value * zoom < height:
+            painter.save()
+            painter.translate(9, origin.y() + value * zoom + 2)
+            painter.rotate(90)
+            painter.drawText(QPointF(0, 0), f"{value:g}")
+            painter.restore()
+            value += step
+        painter.restore()
+    
+    def scrollContentsBy(self, dx: int, dy: int):
+        """Scroll the view; the rulers stay put, so repaint them."""
+        super().scrollContentsBy(dx, dy)
+        if self.show_rulers:
+            self.viewport().update(0, 0, self.viewport().width(), RULER_SIZE)
+            self.viewport().update(0, 0, RULER_SIZE, self.viewport().height())
     
     def resizeEvent(self, event):
         """Handle window resize events."""
         super().resizeEvent(event)
+        # Keep fitting the image until the user picks a zoom
+        if self.auto_fit:
+            self.fit_to_window()
+    
+    def fit_to_window(self):
+        """Scale the view so the whole image is visible."""
         self.fitInView(self.scene.sceneRect(), Qt.AspectRatioMode.KeepAspectRatio)
+        self.auto_fit = True
+        zoom_level = self.transform().m11()
+        if zoom_level != self.zoom_level:
+            self.zoom_level = zoom_level
+            self.zoomChanged.emit(self.zoom_level)
+    
+    def mark_dirty(self, rect: QRectF, margin: float = 0.0):
+        """Schedule a repaint of a scene rectangle, merged with others from the same frame."""
+        self.dirty_region.add(rect, margin)
+        if not self._flush_timer.isActive():
+            self._flush_timer.start(0)
+    
+    def flush_updates(self):
+        """Repaint the accumulated dirty regions."""
+        rects = self.dirty_region.take()
+        if rects:
+            self.updateScene(rects)
+            if self.repaint_overlay.enabled:
+                self.viewport().update(self.repaint_overlay.hud_rect())
+    
+    def set_repaint_overlay(self, enabled: bool):
+        """Show or hide the repainted-region and frame-time overlay."""
+        self.repaint_overlay.enabled = enabled
+        self.viewport().update()
+    
+    def paintEvent(self, event):
+        """Paint the view, recording the repainted region and frame time."""
+        overlay = self.repaint_overlay
+        overlay.begin_frame()
+        super().paintEvent(event)
+        overlay.end_frame(event.region())
+        if overlay.enabled:
+            painter = QPainter(self.viewport())
+            overlay.paint(painter, self.viewport().rect())
+            painter.end()
     
     def set_tool(self, tool_name):
         """
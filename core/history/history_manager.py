@@ -59,6 +59,8 @@ class HistoryManager:
         self.undo_stack: List[Command] = []
         self.redo_stack: List[Command] = []
         self.max_states = max_states
+        # Bumped on every change, so observers can tell whether the document changed
+        self.version = 0
         
     def add_command(self, command: Command) -> bool:
         """Add a new command to the history."""
@@ -67,6 +69,7 @@ class HistoryManager:
             
         self.undo_stack.append(command)
         self.redo_stack.clear()
+        self.version += 1
         return True
         
     def undo(self) -> bool:
@@ -77,6 +80,7 @@ class HistoryManager:
         command = self.undo_stack.pop()
         if command.undo():
             self.redo_stack.append(command)
+            self.version += 1
             return True
         return False
         
@@ -88,6 +92,7 @@ class HistoryManager:
         command = self.redo_stack.pop()
         if command.redo():
             self.undo_stack.append(command)
+            self.version += 1
             return True
         return False
         
@@ -115,6 +120,7 @@ class HistoryManager:
         """Clear the history."""
         self.undo_stack.clear()
         self.redo_stack.clear()
+        self.version += 1
         
     def get_state_count(self) -> int:
         """Get the number of states in the history."""
@@ -0,0 +1,212 @@
+"""
+Scene history commands for PixelCrafterX.
+Handles undo/redo of canvas items and layers as minimal scene changes.
+"""
+
+from dataclasses import dataclass
+from typing import Any, List, Optional, Tuple
+
+from PyQt6.QtCore import QPointF
+from PyQt6.QtGui import QBrush, QPen, QTransform
+from PyQt6.QtWidgets import (
+    QAbstractGraphicsShapeItem, QGraphicsEllipseItem, QGraphicsItem, QGraphicsLineItem,
+    QGraphicsPathItem, QGraphicsRectItem, QGraphicsTextItem
+)
+
+from core.history.history_manager import Command
+
+
+@dataclass(frozen=True)
+class ItemState:
+    """Editable properties of a canvas item.
+
+    Qt paths, pens and brushes are implicitly shared, so states taken
+    before and after a change share their data until one is modified.
+    """
+    pos: QPointF
+    transform: QTransform
+    z: float
+    opacity: float
+    pen: Optional[QPen] = None
+    brush: Optional[QBrush] = None
+    geometry: Any = None  # path, rect, line or text, depending on the item type
+
+    @classmethod
+    def capture(cls, item: QGraphicsItem) -> 'ItemState':
+        pen = brush = geometry = None
+        if isinstance(item, QAbstractGraphicsShapeItem):
+            pen, brush = item.pen(), item.brush()
+        elif isinstance(item, QGraphicsLineItem):
+            pen = item.pen()
+        if isinstance(item, QGraphicsPathItem):
+            geometry = item.path()
+        elif isinstance(item, (QGraphicsRectItem, QGraphicsEllipseItem)):
+            geometry = item.rect()
+        elif isinstance(item, QGraphicsLineItem):
+            geometry = item.line()
+        elif isinstance(item, QGraphicsTextItem):
+            geometry = (item.toHtml(), item.font(), item.defaultTextColor())
+        return cls(QPointF(item.pos()), item.transform(), item.zValue(), item.opacity(), pen, brush, geometry)
+
+    def apply(self, item: QGraphicsItem):
+        item.setPos(self.pos)
+        item.setTransform(self.transform)
+        item.setZValue(self.z)
+        item.setOpacity(self.opacity)
+        if self.pen is not None:
+            item.setPen(self.pen)
+        if self.brush is not None:
+            item.setBrush(self.brush)
+        if isinstance(item, QGraphicsPathItem):
+            item.setPath(self.geometry)
+        elif isinstance(item, (QGraphicsRectItem, QGraphicsEllipseItem)):
+            item.setRect(self.geometry)
+        elif isinstance(item, QGraphicsLineItem):
+            item.setLine(self.geometry)
+        elif isinstance(item, QGraphicsTextItem):
+            html, font, color = self.geometry
+            item.setHtml(html)
+            item.setFont(font)
+            item.setDefaultTextColor(color)
+
+
+class AddItemsCommand(Command):
+    """Items added to a layer. Recorded after the canvas has added them."""
+
+    def __init__(self, canvas, layer: dict, items: List[QGraphicsItem], description: str = "Add Items"):
+        self.canvas = canvas
+        self.layer = layer
+        self.items = list(items)
+        self.positions: List[int] = []
+        self.description = description
+
+    def execute(self) -> bool:
+        return self.redo()
+
+    def undo(self) -> bool:
+        # Newest first, so the saved positions are valid again on redo
+        self.positions = [self.canvas.take_item(self.layer, item) for item in reversed(self.items)]
+        self.positions.reverse()
+        return True
+
+    def redo(self) -> bool:
+        for item, position in zip(self.items, self.positions):
+            self.canvas.insert_item(self.layer, item, position)
+        return True
+
+
+class RemoveItemsCommand(Command):
+    """Items removed from their layers, kept alive here for undo."""
+
+    def __init__(self, canvas, items: List[Tuple[dict, QGraphicsItem]], description: str = "Delete Items"):
+        self.canvas = canvas
+        self.items = list(items)
+        self.positions: List[int] = []
+        self.description = description
+
+    def execute(self) -> bool:
+        return self.redo()
+
+    def undo(self) -> bool:
+        # Reinsert in the reverse order of removal so every position refers to the same list
+        for (layer, item), position in reversed(list(zip(self.items, self.positions))):
+            self.canvas.insert_item(layer, item, position)
+        return True
+
+    def redo(self) -> bool:
+        self.positions = [self.canvas.take_item(layer, item) for layer, item in self.items]
+        return True
+
+
+class ModifyItemsCommand(Command):
+    """Property changes of items, stored as before and after states."""
+
+    def __init__(self, canvas, layer_items: List[Tuple[dict, QGraphicsItem]], before: List[ItemState],
+                 description: str = "Modify Items"):
+        self.canvas = canvas
+        self.items = list(layer_items)
+        self.before = list(before)
+        self.after = [ItemState.capture(item) for _, item in self.items]
+        self.description = description
+
+    def _apply(self, states: List[ItemState]) -> bool:
+        for (layer, item), state in zip(self.items, states):
+            old_rect = item.sceneBoundingRect()
+            state.apply(item)
+            self.canvas.item_changed(layer, item, old_rect)
+        return True
+
+    def execute(self) -> bool:
+        return self.redo()
+
+    def undo(self) -> bool:
+        return self._apply(self.before)
+
+    def redo(self) -> bool:
+        return self._apply(self.after)
+
+
+class AddLayerCommand(Command):
+    """A layer added to the canvas."""
+
+    def __init__(self, canvas, layer: dict, description: str = "Add Layer"):
+        self.canvas = canvas
+        self.layer = layer
+        self.position = canvas.layers.index(layer)
+        self.description = description
+
+    def execute(self) -> bool:
+        return self.redo()
+
+    def undo(self) -> bool:
+        self.position = self.canvas.take_layer(self.layer)
+        return True
+
+    def redo(self) -> bool:
+        self.canvas.insert_layer(self.position, self.layer)
+        return True
+
+
+class RemoveLayerCommand(Command):
+    """A layer removed from the canvas, with its items kept for undo."""
+
+    def __init__(self, canvas, layer: dict, position: int, description: str = "Delete Layer"):
+        self.canvas = canvas
+        self.layer = layer
+        self.position = position
+        self.description = description
+
+    def execute(self) -> bool:
+        return self.redo()
+
+    def undo(self) -> bool:
+        self.canvas.insert_layer(self.position, self.layer)
+        return True
+
+    def redo(self) -> bool:
+        self.position = self.canvas.take_layer(self.layer)
+        return True
+
+
+class LayerPropertyCommand(Command):
+    """A change of a layer's name, visibility, opacity or lock."""
+
+    def __init__(self, canvas, layer: dict, key: str, old_value: Any, new_value: Any,
+                 description: Optional[str] = None):
+        self.canvas = canvas
+        self.layer = layer
+        self.key = key
+        self.old_value = old_value
+        self.new_value = new_value
+        self.description = description or f"Layer {key.capitalize()}"
+
+    def execute(self) -> bool:
+        return self.redo()
+
+    def undo(self) -> bool:
+        self.canvas.apply_layer_property(self.layer, self.key, self.old_value)
+        return True
+
+    def redo(self) -> bool:
+        self.canvas.apply_layer_property(self.layer, self.key, self.new_value)
+        return True
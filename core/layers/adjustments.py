@@ -0,0 +1,264 @@
+"""
+Adjustment layers for PixelCrafterX.
+Describes non-destructive adjustments and caches their results per tile.
+
+An adjustment layer changes the composite of the layers below it instead
+of holding pixels of its own. The compositor evaluates it one tile at a
+time and keeps two images per tile in a shared AdjustmentTileCache: the
+composite below the layer and the adjusted result. Tiles are dropped only
+when the layers below them change, so changing the adjustment itself just
+re-applies it to the cached composites of the tiles that are drawn.
+"""
+
+import itertools
+import math
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from core.layers.tile_store import TILE_BYTES, TILE_SIZE, TileKey, TiledImage
+from utils.color import lut
+from utils.config import load_config
+
+
+class LayerAdjustment:
+    """An adjustment applied to the composite below a layer.
+
+    Adjustments are immutable; change one by giving the layer a new one.
+    Two adjustments with the same ``key`` must give the same result.
+    """
+
+    # Pixels around a tile the adjustment reads from its neighbours
+    margin = 0
+
+    @property
+    def key(self) -> Hashable:
+        raise NotImplementedError
+
+    def apply(self, pixels: np.ndarray) -> np.ndarray:
+        """Adjust an H x W x 4 ARGB32 array and get the result as a new array of the same shape."""
+        raise NotImplementedError
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, LayerAdjustment) and self.key == other.key
+
+    def __hash__(self) -> int:
+        return hash(self.key)
+
+
+class ColorAdjustment(LayerAdjustment):
+    """Per-pixel adjustments, applied through their baked LUT."""
+
+    def __init__(self, adjustments: Sequence[lut.Adjustment], name: str = "Color Adjustment"):
+        self.adjustments = tuple(adjustments)
+        self.name = name
+
+    @property
+    def key(self) -> Hashable:
+        return self.adjustments
+
+    def apply(self, pixels: np.ndarray) -> np.ndarray:
+        engine = lut.get_lut_engine()
+        return lut.apply_lut(engine.bake(self.adjustments), pixels, engine.interpolation)
+
+
+class FilterAdjustment(LayerAdjustment):
+    """A neighbourhood filter such as a blur, reading ``margin`` pixels around each tile."""
+
+    def __init__(self, function: Callable[..., np.ndarray], margin: int = 0, name: str = "Filter",
+                 **params: Any):
+        """
+        Args:
+            function: Called as ``function(pixels, **params)`` on an ARGB32 array
+            margin: Distance in pixels the filter reads beyond a pixel, at most TILE_SIZE
+            name: Display name
+            params: Filter parameters; they must be hashable
+        """
+        if not 0 <= margin <= TILE_SIZE:
+            raise ValueError(f"Filter margin must be between 0 and {TILE_SIZE}, got {margin}")
+        self.function = function
+        self.margin = margin
+        self.name = name
+        self.params = params
+
+    @property
+    def key(self) -> Hashable:
+        return (self.function, tuple(sorted(self.params.items())))
+
+    def apply(self, pixels: np.ndarray) -> np.ndarray:
+        return self.function(pixels, **self.params)
+
+
+def levels(in_black: float = 0.0, in_white: float = 1.0, gamma: float = 1.0, out_black: float = 0.0,
+           out_white: float = 1.0, channels: str = 'rgb') -> ColorAdjustment:
+    return ColorAdjustment([lut.Levels(in_black, in_white, gamma, out_black, out_white, channels)], "Levels")
+
+
+def curves(points: Sequence[Tuple[float, float]], channels: str = 'rgb') -> ColorAdjustment:
+    return ColorAdjustment([lut.Curves(tuple(points), channels)], "Curves")
+
+
+def hue_saturation(hue: float = 0.0, saturation: float = 0.0, lightness: float = 0.0) -> ColorAdjustment:
+    return ColorAdjustment([lut.HueSaturation(hue, saturation, lightness)], "Hue/Saturation")
+
+
+def color_lookup(table: lut.Lut3D, interpolation: str = 'tetrahedral') -> ColorAdjustment:
+    return ColorAdjustment([lut.ApplyLut(table, interpolation)], table.title or "Color Lookup")
+
+
+def _gaussian_blur(pixels: np.ndarray, radius: float) -> np.ndarray:
+    from scipy.ndimage import gaussian_filter
+    return gaussian_filter(pixels, sigma=(radius, radius, 0))
+
+
+def gaussian_blur(radius: float) -> FilterAdjustment:
+    return FilterAdjustment(_gaussian_blur, min(TILE_SIZE, math.ceil(radius * 4)), "Gaussian Blur",
+                            radius=float(radius))
+
+
+class AdjustmentTileCache:
+    """Size-bounded LRU of the tiles of all adjustment layers."""
+
+    def __init__(self, budget_mb: int = 256):
+        self.budget_bytes = max(1, int(budget_mb)) * 1024 * 1024
+        self._tiles: "OrderedDict[Tuple[int, str, int, int], np.ndarray]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, owner: int, kind: str, tx: int, ty: int) -> Optional[np.ndarray]:
+        key = (owner, kind, tx, ty)
+        with self._lock:
+            tile = self._tiles.get(key)
+            if tile is None:
+                self.misses += 1
+                return None
+            self._tiles.move_to_end(key)
+            self.hits += 1
+            return tile
+
+    def put(self, owner: int, kind: str, tx: int, ty: int, tile: np.ndarray):
+        tile.flags.writeable = False
+        with self._lock:
+            self._tiles[(owner, kind, tx, ty)] = tile
+            self._tiles.move_to_end((owner, kind, tx, ty))
+            while len(self._tiles) * TILE_BYTES > self.budget_bytes:
+                self._tiles.popitem(last=False)
+
+    def discard(self, owner: int, kind: Optional[str] = None, keys: Optional[Set[TileKey]] = None):
+        """Drop an owner's tiles, optionally only of one kind or at some tile positions."""
+        with self._lock:
+            for key in [key for key in self._tiles if key[0] == owner
+                        and (kind is None or key[1] == kind)
+                        and (keys is None or key[2:] in keys)]:
+                del self._tiles[key]
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'tiles': len(self._tiles),
+                'memory_mb': len(self._tiles) * TILE_BYTES // (1024 * 1024),
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+_adjustment_cache: Optional[AdjustmentTileCache] = None
+
+
+def get_adjustment_cache() -> AdjustmentTileCache:
+    """Get the application-wide adjustment cache sized from ``performance.adjustment_cache_mb``."""
+    global _adjustment_cache
+    if _adjustment_cache is None:
+        performance = load_config().get('performance', {})
+        _adjustment_cache = AdjustmentTileCache(performance.get('adjustment_cache_mb', 256))
+    return _adjustment_cache
+
+
+def grow_tiles(keys: Set[TileKey], reach: int) -> Set[TileKey]:
+    """Add the tiles within ``reach`` tiles of the given ones."""
+    if reach <= 0:
+        return set(keys)
+    return {(tx + dx, ty + dy) for tx, ty in keys
+            for dx in range(-reach, reach + 1) for dy in range(-reach, reach + 1)
+            if tx + dx >= 0 and ty + dy >= 0}
+
+
+class AdjustmentState:
+    """Tracks which cached tiles of one adjustment layer are still valid.
+
+    The cached composite below the layer ('below') depends on the layers
+    underneath; the adjusted result ('adjusted') also depends on the
+    adjustment and the layer's mask and opacity. ``validate`` compares
+    them with what the cache was built from and drops what changed.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, cache: Optional[AdjustmentTileCache] = None):
+        self.id = next(self._ids)
+        self.cache = cache or get_adjustment_cache()
+        self._lock = threading.RLock()
+        self._stack = None
+        self._generations: Dict[int, int] = {}
+        self._adjusted_key = None
+        self._stamp = None
+
+    def validate(self, below: Sequence, source) -> bool:
+        """
+        Drop cached tiles made stale by edits since the last call.
+
+        Args:
+            below: CompositeSources under the adjustment layer, bottom to top
+            source: The adjustment layer's CompositeSource; its image is the mask
+
+        Returns:
+            False if the sources cannot be tracked, e.g. frozen views
+        """
+        images = [item.image for item in below] + [source.image]
+        if not all(isinstance(image, TiledImage) for image in images):
+            return False
+        stamp = tuple(image.generation for image in images)
+        stack = tuple((item.image.uid, item.opacity, item.blend_mode, item.adjustment) for item in below)
+        adjusted_key = (source.image.uid, source.opacity, source.blend_mode, source.adjustment)
+        with self._lock:
+            if stack == self._stack and adjusted_key == self._adjusted_key and stamp == self._stamp:
+                return True
+            if stack != self._stack:
+                self.cache.discard(self.id)
+            else:
+                # Adjustments below spread a change over their margins
+                reach_below = math.ceil(sum(item.adjustment.margin for item in below
+                                            if item.adjustment is not None) / TILE_SIZE)
+                reach = reach_below + math.ceil(source.adjustment.margin / TILE_SIZE)
+                changed_below: Optional[Set[TileKey]] = set()
+                for image in images[:-1]:
+                    changes = image.changes_since(self._generations.get(image.uid, 0))
+                    if changes is None:
+                        changed_below = None
+                        break
+                    changed_below.update(changes)
+                if changed_below is None:
+                    self.cache.discard(self.id)
+                elif changed_below:
+                    self.cache.discard(self.id, 'below', grow_tiles(changed_below, reach_below))
+                    self.cache.discard(self.id, 'adjusted', grow_tiles(changed_below, reach))
+                if adjusted_key != self._adjusted_key:
+                    self.cache.discard(self.id, 'adjusted')
+                else:
+                    mask = source.image
+                    changes = mask.changes_since(self._generations.get(mask.uid, 0))
+                    if changes is None or changes:
+                        self.cache.discard(self.id, 'adjusted', None if changes is None else set(changes))
+            self._stack = stack
+            self._adjusted_key = adjusted_key
+            self._stamp = stamp
+            self._generations = {image.uid: image.generation for image in images}
+        return True
+
+    def clear(self):
+        with self._lock:
+            self.cache.discard(self.id)
+            self._stack = self._adjusted_key = self._stamp = None
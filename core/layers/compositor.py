@@ -0,0 +1,245 @@
+"""
+Layer compositing for PixelCrafterX.
+Blends layer stacks tile by tile in the ARGB32 layout.
+
+Adjustment layers are evaluated here too: a tile above an adjustment layer
+starts from the layer's cached result for that tile, when there is one,
+instead of from the bottom of the stack.
+"""
+
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from core.layers.tile_store import TILE_SIZE
+
+# Separable blend functions B(backdrop, source) on unpremultiplied colors in [0, 1]
+BLEND_FUNCTIONS: Dict[str, Callable[[np.ndarray, np.ndarray], np.ndarray]] = {
+    'normal': lambda cb, cs: cs,
+    'multiply': lambda cb, cs: cb * cs,
+    'screen': lambda cb, cs: cb + cs - cb * cs,
+    'overlay': lambda cb, cs: np.where(cb <= 0.5, 2 * cb * cs, 1 - 2 * (1 - cb) * (1 - cs)),
+    'darken': np.minimum,
+    'lighten': np.maximum,
+    'difference': lambda cb, cs: np.abs(cb - cs),
+    'exclusion': lambda cb, cs: cb + cs - 2 * cb * cs,
+}
+
+
+@dataclass
+class CompositeSource:
+    """A layer image together with how it is blended.
+
+    For adjustment layers ``image`` is the mask, whose alpha scales the
+    adjustment, and ``state`` tracks the layer's cached tiles.
+    """
+    image: object  # TiledImage or FrozenImage
+    opacity: float = 1.0
+    blend_mode: str = "normal"
+    adjustment: Optional[object] = None  # LayerAdjustment
+    state: Optional[object] = None  # AdjustmentState
+
+
+def blend_tile(backdrop: np.ndarray, tile: np.ndarray, opacity: float, blend_mode: str = "normal"):
+    """Blend an ARGB32 tile onto a premultiplied float32 backdrop in place."""
+    src = tile.astype(np.float32) * (1.0 / 255.0)
+    alpha_s = src[..., 3:4] * opacity
+    alpha_b = backdrop[..., 3:4]
+
+    blend = BLEND_FUNCTIONS.get(blend_mode)
+    if blend is None or blend_mode == 'normal':
+        mixed = src[..., :3]
+    else:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            color_b = np.where(alpha_b > 0, backdrop[..., :3] / alpha_b, 0.0)
+        mixed = (1 - alpha_b) * src[..., :3] + alpha_b * blend(color_b, src[..., :3])
+
+    backdrop[..., :3] = mixed * alpha_s + backdrop[..., :3] * (1 - alpha_s)
+    backdrop[..., 3:4] = alpha_s + alpha_b * (1 - alpha_s)
+
+
+def premultiply(tile: np.ndarray) -> np.ndarray:
+    """Convert an ARGB32 tile to a premultiplied float32 backdrop."""
+    backdrop = tile.astype(np.float32) * (1.0 / 255.0)
+    backdrop[..., :3] *= backdrop[..., 3:4]
+    return backdrop
+
+
+def mix_adjusted(tile: np.ndarray, adjusted: np.ndarray, mask: np.ndarray, opacity: float,
+                 blend_mode: str = "normal") -> np.ndarray:
+    """Mix an adjusted ARGB32 tile into the original by the mask's alpha and the opacity.
+
+    The result keeps the original alpha; other blend modes combine the
+    original and adjusted colors first.
+    """
+    if opacity >= 1 and blend_mode == 'normal' and mask[..., 3].min() == 255:
+        out = adjusted.copy()
+        out[..., 3] = tile[..., 3]
+        return out
+    color = tile[..., :3].astype(np.float32) * (1.0 / 255.0)
+    changed = adjusted[..., :3].astype(np.float32) * (1.0 / 255.0)
+    blend = BLEND_FUNCTIONS.get(blend_mode)
+    if blend is not None and blend_mode != 'normal':
+        changed = blend(color, changed)
+    weight = mask[..., 3:4].astype(np.float32) * (opacity / 255.0)
+    out = np.empty_like(tile)
+    out[..., :3] = np.clip((color + (changed - color) * weight) * 255.0 + 0.5, 0, 255)
+    out[..., 3] = tile[..., 3]
+    return out
+
+
+def unpremultiply(backdrop: np.ndarray) -> np.ndarray:
+    """Convert a premultiplied float32 tile back to ARGB32 uint8."""
+    alpha = backdrop[..., 3:4]
+    out = np.empty(backdrop.shape, dtype=np.uint8)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        color = np.where(alpha > 0, backdrop[..., :3] / alpha, 0.0)
+    out[..., :3] = np.clip(color * 255.0 + 0.5, 0, 255)
+    out[..., 3:4] = np.clip(alpha * 255.0 + 0.5, 0, 255)
+    return out
+
+
+class Compositor:
+    """Flattens a stack of layer images, one tile at a time.
+
+    Sources are ordered bottom to top and must share the document's tile
+    grid; smaller sources are treated as transparent outside their bounds.
+    """
+
+    def __init__(self, sources: Sequence[CompositeSource], width: int, height: int):
+        self.sources: List[CompositeSource] = list(sources)
+        self.width = width
+        self.height = height
+        self.tiles_x = max(1, -(-width // TILE_SIZE))
+        self.tiles_y = max(1, -(-height // TILE_SIZE))
+
+    def composite_tile(self, tx: int, ty: int) -> np.ndarray:
+        """Composite one full TILE_SIZE x TILE_SIZE tile."""
+        return self._composite(len(self.sources), tx, ty)
+
+    def _composite(self, count: int, tx: int, ty: int) -> np.ndarray:
+        """Composite the bottom ``count`` sources of a tile."""
+        start = count
+        while start > 0 and self.sources[start - 1].adjustment is None:
+            start -= 1
+        if start > 0:
+            # Everything below the topmost adjustment layer is in its result
+            backdrop = premultiply(self._adjusted_tile(start - 1, tx, ty))
+        else:
+            backdrop = np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.float32)
+        for source in self.sources[start:count]:
+            image = source.image
+            if source.opacity <= 0 or tx >= image.tiles_x or ty >= image.tiles_y:
+                continue
+            blend_tile(backdrop, image.tile(tx, ty), source.opacity, source.blend_mode)
+        return unpremultiply(backdrop)
+
+    def _adjusted_tile(self, index: int, tx: int, ty: int) -> np.ndarray:
+        """Composite a tile up to and including the adjustment layer at ``index``."""
+        source = self.sources[index]
+        state = source.state
+        cached = state is not None and state.validate(self.sources[:index], source)
+        if cached:
+            tile = state.cache.get(state.id, 'adjusted', tx, ty)
+            if tile is not None:
+                return tile
+
+        below = self._below_tile(index, tx, ty, cached)
+        image = source.image
+        if source.opacity <= 0 or tx >= image.tiles_x or ty >= image.tiles_y:
+            return below
+        margin = source.adjustment.margin
+        if margin:
+            region = self._below_region(index, tx, ty, margin, cached)
+            adjusted = source.adjustment.apply(region)[margin:margin + TILE_SIZE, margin:margin + TILE_SIZE]
+        else:
+            adjusted = source.adjustment.apply(below)
+        tile = mix_adjusted(below, adjusted, image.tile(tx, ty), source.opacity, source.blend_mode)
+        if cached:
+            state.cache.put(state.id, 'adjusted', tx, ty, tile)
+        return tile
+
+    def _below_tile(self, index: int, tx: int, ty: int, cached: bool) -> np.ndarray:
+        """Composite of the sources under the adjustment layer at ``index``."""
+        state = self.sources[index].state
+        if cached:
+            tile = state.cache.get(state.id, 'below', tx, ty)
+            if tile is not None:
+                return tile
+        tile = self._composite(index, tx, ty)
+        if cached:
+            state.cache.put(state.id, 'below', tx, ty, tile)
+        return tile
+
+    def _below_region(self, index: int, tx: int, ty: int, margin: int, cached: bool) -> np.ndarray:
+        """Composite under an adjustment layer around a tile, extending the document's edges."""
+        size = TILE_SIZE + 2 * margin
+        region = np.zeros((size, size, 4), dtype=np.uint8)
+        left, top = tx * TILE_SIZE - margin, ty * TILE_SIZE - margin
+        x0, y0 = max(0, left), max(0, top)
+        x1, y1 = min(self.width, left + size), min(self.height, top + size)
+        for ny in range(y0 // TILE_SIZE, (y1 - 1) // TILE_SIZE + 1):
+            for nx in range(x0 // TILE_SIZE, (x1 - 1) // TILE_SIZE + 1):
+                tile = self._below_tile(index, nx, ny, cached)
+                ox, oy = nx * TILE_SIZE, ny * TILE_SIZE
+                sx0, sy0 = max(x0, ox), max(y0, oy)
+                sx1, sy1 = min(x1, ox + TILE_SIZE), min(y1, oy + TILE_SIZE)
+                region[sy0 - top:sy1 - top, sx0 - left:sx1 - left] = tile[sy0 - oy:sy1 - oy, sx0 - ox:sx1 - ox]
+        inner = region[y0 - top:y1 - top, x0 - left:x1 - left]
+        pad = ((y0 - top, top + size - y1), (x0 - left, left + size - x1), (0, 0))
+        return np.pad(inner, pad, mode='edge') if any(any(p) for p in pad) else region
+
+    def uniform_pixel(self, tx: int, ty: int) -> Optional[np.ndarray]:
+        """Get the composited pixel of a tile whose layers are all a single color, or None."""
+        backdrop = np.zeros((1, 1, 4), dtype=np.float32)
+        for source in self.sources:
+            image = source.image
+            if source.opacity <= 0 or tx >= image.tiles_x or ty >= image.tiles_y:
+                continue
+            pixel = image.uniform_pixel(tx, ty)
+            if pixel is None:
+                return None
+            if source.adjustment is not None:
+                # Filters read neighbouring tiles, which may not be uniform
+                if source.adjustment.margin:
+                    return None
+                below = unpremultiply(backdrop)
+                adjusted = source.adjustment.apply(below)
+                backdrop = premultiply(mix_adjusted(below, adjusted, pixel.reshape(1, 1, 4), source.opacity,
+                                                    source.blend_mode))
+                continue
+            blend_tile(backdrop, pixel.reshape(1, 1, 4), source.opacity, source.blend_mode)
+        return unpremultiply(backdrop)[0, 0]
+
+    def composite_region(self, x: int, y: int, w: int, h: int) -> np.ndarray:
+        """Composite an arbitrary rectangle into an h x w x 4 array."""
+        out = np.zeros((h, w, 4), dtype=np.uint8)
+        x0, y0 = max(0, x), max(0, y)
+        x1, y1 = min(self.width, x + w), min(self.height, y + h)
+        if x1 <= x0 or y1 <= y0:
+            return out
+        for ty in range(y0 // TILE_SIZE, (y1 - 1) // TILE_SIZE + 1):
+            for tx in range(x0 // TILE_SIZE, (x1 - 1) // TILE_SIZE + 1):
+                tile = self.composite_tile(tx, ty)
+                ox, oy = tx * TILE_SIZE, ty * TILE_SIZE
+                sx0, sy0 = max(x0, ox), max(y0, oy)
+                sx1, sy1 = min(x1, ox + TILE_SIZE), min(y1, oy + TILE_SIZE)
+                out[sy0 - y:sy1 - y, sx0 - x:sx1 - x] = tile[sy0 - oy:sy1 - oy, sx0 - ox:sx1 - ox]
+        return out
+
+    def flatten(self, progress: Optional[Callable[[int, int], None]] = None) -> np.ndarray:
+        """Composite the whole document, reporting (done, total) tiles."""
+        out = np.empty((self.height, self.width, 4), dtype=np.uint8)
+        total = self.tiles_x * self.tiles_y
+        done = 0
+        for ty in range(self.tiles_y):
+            for tx in range(self.tiles_x):
+                tile = self.composite_tile(tx, ty)
+                x, y = tx * TILE_SIZE, ty * TILE_SIZE
+                w, h = min(TILE_SIZE, self.width - x), min(TILE_SIZE, self.height - y)
+                out[y:y + h, x:x + w] = tile[:h, :w]
+                done += 1
+                if progress is not None:
+                    progress(done, total)
+        return out
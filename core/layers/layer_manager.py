@@ -3,34 +3,66 @@ Layer management system for PixelCrafterX.
 Handles layer operations and organization.
 """
 
-from dataclasses import dataclass
-from typing import List, Optional
+from dataclasses import dataclass, field, replace
+from typing import List, Optional, Union
 import numpy as np
 from PyQt6.QtGui import QImage
 
+from core.layers.adjustments import AdjustmentState, LayerAdjustment
+from core.layers.compositor import CompositeSource, Compositor
+from core.layers.tile_store import TileCache, TiledImage, default_tile_cache
+
 @dataclass
 class Layer:
     name: str
-    image: QImage
+    image: Union[TiledImage, QImage]
     visible: bool = True
     opacity: float = 1.0
     blend_mode: str = "normal"
     locked: bool = False
+    
+    def __post_init__(self):
+        # Layer pixels always live in the out-of-core tile store
+        if isinstance(self.image, QImage):
+            self.image = TiledImage.from_qimage(self.image)
+
+@dataclass
+class AdjustmentLayer(Layer):
+    """A layer that adjusts the layers below it instead of holding pixels.
+    
+    ``image`` is the layer's mask: its alpha sets how much of the
+    adjustment shows through. Assign a new ``adjustment`` to change it.
+    """
+    adjustment: Optional[LayerAdjustment] = None
+    state: AdjustmentState = field(default_factory=AdjustmentState, init=False, repr=False, compare=False)
 
 class LayerManager:
-    def __init__(self):
+    def __init__(self, tile_cache: Optional[TileCache] = None):
         self.layers: List[Layer] = []
         self.active_layer_index: Optional[int] = None
+        self.tile_cache = tile_cache or default_tile_cache()
         
     def add_layer(self, width: int, height: int, name: str = "New Layer") -> Layer:
         """Add a new layer to the stack."""
-        image = QImage(width, height, QImage.Format.Format_ARGB32)
-        image.fill(0)  # Transparent
+        image = TiledImage(width, height, cache=self.tile_cache)  # Transparent
         layer = Layer(name=name, image=image)
         self.layers.append(layer)
         self.active_layer_index = len(self.layers) - 1
         return layer
         
+    def add_adjustment_layer(self, adjustment: LayerAdjustment, name: Optional[str] = None) -> AdjustmentLayer:
+        """Add an adjustment layer with a fully opaque mask above the active layer."""
+        width = max((layer.image.width() for layer in self.layers), default=1)
+        height = max((layer.image.height() for layer in self.layers), default=1)
+        mask = TiledImage(width, height, cache=self.tile_cache)
+        mask.fill(0xFFFFFFFF)
+        layer = AdjustmentLayer(name=name or getattr(adjustment, 'name', "Adjustment"), image=mask,
+                                adjustment=adjustment)
+        index = self.active_layer_index + 1 if self.active_layer_index is not None else len(self.layers)
+        self.layers.insert(index, layer)
+        self.active_layer_index = index
+        return layer
+        
     def remove_layer(self, index: int) -> bool:
         """Remove a layer from the stack."""
         if 0 <= index < len(self.layers):
@@ -54,44 +86,42 @@ class LayerManager:
         """Create a copy of a layer."""
         if 0 <= index < len(self.layers):
             original = self.layers[index]
-            new_image = QImage(original.image)
-            new_layer = Layer(
-                name=f"{original.name} (copy)",
-                image=new_image,
-                visible=original.visible,
-                opacity=original.opacity,
-                blend_mode=original.blend_mode,
-                locked=original.locked
-            )
+            new_layer = replace(original, name=f"{original.name} (copy)", image=original.image.copy())
             self.layers.insert(index + 1, new_layer)
             self.active_layer_index = index + 1
             return new_layer
         return None
         
     def merge_layers(self, indices: List[int]) -> Optional[Layer]:
-        """Merge multiple layers into one."""
+        """Merge multiple layers into one. Adjustment layers are left in place.
+        
+        The visible layers are composited with their opacity and blend mode,
+        so the merged layer looks like the stack it replaces; it takes the
+        place of the topmost merged layer. Returns None without merging when
+        an adjustment layer lies between the merged layers, since it adjusts
+        the layers below it differently from those above.
+        """
         if not indices or not all(0 <= i < len(self.layers) for i in indices):
             return None
+        indices = sorted({i for i in indices if not isinstance(self.layers[i], AdjustmentLayer)})
+        if not indices:
+            return None
+        if any(isinstance(layer, AdjustmentLayer) for layer in self.layers[indices[0]:indices[-1]]):
+            return None
             
-        # Get the first layer as base
-        base = self.layers[indices[0]]
-        result = QImage(base.image)
-        
-        # Merge other layers
-        for i in indices[1:]:
-            layer = self.layers[i]
-            if layer.visible:
-                # Convert to numpy arrays for efficient blending
-                base_array = np.array(result.bits()).reshape(result.height(), result.width(), 4)
-                layer_array = np.array(layer.image.bits()).reshape(layer.image.height(), layer.image.width(), 4)
-                
-                # Apply blend mode and opacity
-                if layer.blend_mode == "normal":
-                    alpha = layer.opacity
-                    base_array = base_array * (1 - alpha) + layer_array * alpha
-                
-                # Convert back to QImage
-                result = QImage(base_array.tobytes(), result.width(), result.height(), QImage.Format.Format_ARGB32)
+        # Composite tile by tile so only a few tiles are resident at once
+        layers = [self.layers[i] for i in indices]
+        width = max(layer.image.width() for layer in layers)
+        height = max(layer.image.height() for layer in layers)
+        compositor = Compositor([CompositeSource(layer.image, layer.opacity, layer.blend_mode)
+                                 for layer in layers if layer.visible], width, height)
+        result = TiledImage(width, height, cache=self.tile_cache)  # Transparent
+        for ty in range(compositor.tiles_y):
+            for tx in range(compositor.tiles_x):
+                pixel = compositor.uniform_pixel(tx, ty)
+                if pixel is not None and not pixel.any():
+                    continue
+                result.tile_for_write(tx, ty)[:] = compositor.composite_tile(tx, ty)
         
         # Create new merged layer
         merged = Layer(
@@ -101,11 +131,12 @@ class LayerManager:
             opacity=1.0
         )
         
-        # Remove old layers and add merged layer
-        for i in sorted(indices, reverse=True):
+        # Replace the old layers with the merged one
+        for i in reversed(indices):
             self.layers.pop(i)
-        self.layers.append(merged)
-        self.active_layer_index = len(self.layers) - 1
+        position = indices[-1] - (len(indices) - 1)
+        self.layers.insert(position, merged)
+        self.active_layer_index = position
         
         return merged
         
@@ -114,4 +145,47 @@ class LayerManager:
         """Get the currently active layer."""
         if self.active_layer_index is not None and 0 <= self.active_layer_index < len(self.layers):
             return self.layers[self.active_layer_index]
-        return None 
\ No newline at end of file
+        return None
+        
+    def prefetch(self, x: int, y: int, width: int, height: int):
+        """Page in the tiles of visible layers around an image rectangle."""
+        for layer in self.layers:
+            if layer.visible:
+                layer.image.prefetch(x, y, width, height)
+                
+    def get_compositor(self, frozen: bool = False) -> Compositor:
+        """Get a compositor for the visible layers, bottom to top.
+        
+        With ``frozen`` the compositor reads point-in-time views that stay
+        consistent while the layers keep being edited; release them with
+        ``release_compositor`` when done.
+        """
+        sources = []
+        width = height = 0
+        for layer in self.layers:
+            width = max(width, layer.image.width())
+            height = max(height, layer.image.height())
+            if not layer.visible:
+                continue
+            image = layer.image.freeze() if frozen else layer.image
+            if isinstance(layer, AdjustmentLayer):
+                if layer.adjustment is not None:
+                    # Frozen views cannot be tracked, so they bypass the tile cache
+                    sources.append(CompositeSource(image, layer.opacity, layer.blend_mode, layer.adjustment,
+                                                   None if frozen else layer.state))
+                elif frozen:
+                    image.release()
+            else:
+                sources.append(CompositeSource(image, layer.opacity, layer.blend_mode))
+        return Compositor(sources, width, height)
+        
+    @staticmethod
+    def release_compositor(compositor: Compositor):
+        """Release the frozen views held by a compositor."""
+        for source in compositor.sources:
+            if hasattr(source.image, 'release'):
+                source.image.release()
+        
+    def flatten(self) -> np.ndarray:
+        """Composite all visible layers into a single ARGB32 array."""
+        return self.get_compositor().flatten()
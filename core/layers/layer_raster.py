@@ -0,0 +1,136 @@
+"""
+Layer raster cache for PixelCrafterX.
+Bakes finished canvas items into a tiled image so the scene stops re-rendering them.
+"""
+
+import logging
+from typing import Dict, Iterable, List, Optional, Set
+
+from PyQt6.QtCore import QRectF
+from PyQt6.QtGui import QPainter, QTransform
+from PyQt6.QtWidgets import QGraphicsItem, QStyleOptionGraphicsItem
+
+from core.layers.mip_pyramid import ImageTileSource, MipmapItem, MipPyramid
+from core.layers.tile_store import TILE_SIZE, TiledImage, TileKey
+from utils.image.image_buffer import qimage_view
+
+logger = logging.getLogger(__name__)
+
+# Baked layers sit above the document image and below every live item
+RASTER_Z = -0.5
+
+
+class LayerRaster:
+    """Raster tiles holding the baked items of one canvas layer.
+
+    Baked items leave the scene but stay listed in ``baked``, bottom to top,
+    as the vector source for history and editing; ``remove`` and ``restore``
+    re-render only the tiles the affected items covered.
+    """
+
+    def __init__(self, width: int, height: int, budget_mb: int = 256, z: float = RASTER_Z):
+        self.image = TiledImage(width, height)
+        self.pyramid = MipPyramid(ImageTileSource(self.image), budget_mb)
+        self.item = MipmapItem(self.pyramid)
+        self.item.setZValue(z)
+        self.baked: List[QGraphicsItem] = []
+
+    def bounds(self) -> QRectF:
+        return QRectF(0, 0, self.image.width(), self.image.height())
+
+    def can_bake(self, item: QGraphicsItem) -> bool:
+        """Check whether an item lies entirely on the raster, so baking loses nothing."""
+        return self.bounds().contains(item.sceneBoundingRect())
+
+    def bake(self, items: Iterable[QGraphicsItem],
+             before: Optional[QGraphicsItem] = None) -> List[QGraphicsItem]:
+        """Render items into the raster and take them out of the scene.
+
+        Items go on top, or below the baked item ``before``. Items that reach
+        outside the raster are left alone. Returns the items baked.
+        """
+        items = [item for item in items if self.can_bake(item)]
+        if not items:
+            return []
+        tiles = self._tiles_for(items)
+        if before is not None and before in self.baked:
+            position = self.baked.index(before)
+            self.baked[position:position] = items
+            self._clear(tiles)
+            self._render(tiles, self.baked)
+        else:
+            self._render(tiles, items)
+            self.baked.extend(items)
+        for item in items:
+            scene = item.scene()
+            if scene is not None:
+                scene.removeItem(item)
+        self.item.refresh()
+        return items
+
+    def remove(self, items: Iterable[QGraphicsItem]):
+        """Drop baked items, re-rendering the tiles they covered from the remaining ones."""
+        items = [item for item in items if item in self.baked]
+        if not items:
+            return
+        tiles = self._tiles_for(items)
+        for item in items:
+            self.baked.remove(item)
+        self._redraw(tiles)
+
+    def redraw(self, rects: Iterable[QRectF]):
+        """Re-render the tiles under scene rectangles, after baked items changed."""
+        tiles: Set[TileKey] = set()
+        for rect in rects:
+            rect = rect.toAlignedRect()
+            tiles.update(self.image.tiles_in_rect(rect.x(), rect.y(), rect.width(), rect.height()))
+        self._redraw(tiles)
+
+    def restore(self) -> List[QGraphicsItem]:
+        """Clear the raster and hand back every baked item, bottom to top, for editing as vectors."""
+        items, self.baked = self.baked, []
+        self.image.fill(0)
+        self.item.refresh()
+        return items
+
+    def _tiles_for(self, items: Iterable[QGraphicsItem]) -> Set[TileKey]:
+        tiles: Set[TileKey] = set()
+        for item in items:
+            rect = item.sceneBoundingRect().toAlignedRect()
+            tiles.update(self.image.tiles_in_rect(rect.x(), rect.y(), rect.width(), rect.height()))
+        return tiles
+
+    def _redraw(self, tiles: Set[TileKey]):
+        self._clear(tiles)
+        self._render(tiles, self.baked)
+        self.item.refresh()
+
+    def _clear(self, tiles: Iterable[TileKey]):
+        for tx, ty in tiles:
+            self.image.tile_for_write(tx, ty)[:] = 0
+
+    def _render(self, tiles: Iterable[TileKey], items: List[QGraphicsItem]):
+        """Paint the items overlapping each tile into it, in stacking order."""
+        option = QStyleOptionGraphicsItem()
+        rects: Dict[QGraphicsItem, QRectF] = {item: item.sceneBoundingRect() for item in items}
+        for tx, ty in tiles:
+            x, y = tx * TILE_SIZE, ty * TILE_SIZE
+            tile_rect = QRectF(x, y, TILE_SIZE, TILE_SIZE)
+            overlapping = [item for item in items if rects[item].intersects(tile_rect)]
+            if not overlapping:
+                continue
+            tile = self.image.tile_for_write(tx, ty)
+            target = qimage_view(tile)
+            painter = QPainter(target)
+            painter.setRenderHints(QPainter.RenderHint.Antialiasing | QPainter.RenderHint.TextAntialiasing |
+                                   QPainter.RenderHint.SmoothPixmapTransform)
+            try:
+                for item in overlapping:
+                    painter.setTransform(item.sceneTransform() * QTransform.fromTranslate(-x, -y))
+                    painter.setOpacity(item.effectiveOpacity())
+                    option.exposedRect = item.boundingRect()
+                    item.paint(painter, option, None)
+            except Exception as e:
+                logger.error(f"Error baking canvas items into tile {tx},{ty}: {e}")
+            finally:
+                painter.end()
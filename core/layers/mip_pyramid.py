@@ -0,0 +1,343 @@
+"""
+Mipmapped display rendering for PixelCrafterX.
+Draws zoomed-out views from cached, half-resolution tile levels.
+"""
+
+import math
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from PyQt6.QtCore import QRectF
+from PyQt6.QtGui import QColor, QImage, QPainter
+from PyQt6.QtWidgets import QGraphicsItem, QStyleOptionGraphicsItem
+
+from core.layers.adjustments import grow_tiles
+from core.layers.tile_store import TILE_SIZE, TileKey
+from utils.file_io.export_presets import premultiply
+
+MipKey = Tuple[int, int, int]  # (level, tx, ty)
+
+# Upper bound on pyramid depth (a 256 px tile at level 11 spans 512K px)
+MAX_LEVELS = 12
+
+
+class ImageTileSource:
+    """Feeds a pyramid from a single TiledImage."""
+
+    def __init__(self, image):
+        self.image = image
+        self._generation = image.generation
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return self.image.width(), self.image.height()
+
+    def tile(self, tx: int, ty: int) -> np.ndarray:
+        return self.image.tile(tx, ty)
+
+    def uniform_pixel(self, tx: int, ty: int) -> Optional[np.ndarray]:
+        return self.image.uniform_pixel(tx, ty)
+
+    def poll_changes(self) -> Optional[List[TileKey]]:
+        """Get tiles changed since the last poll, or None if everything changed."""
+        changed = self.image.changes_since(self._generation)
+        self._generation = self.image.generation
+        return changed
+
+
+class CompositeTileSource:
+    """Feeds a pyramid from the flattened visible layers of a LayerManager."""
+
+    def __init__(self, layer_manager):
+        self.layer_manager = layer_manager
+        self._signature = None
+        self._generations: Dict[int, int] = {}
+        self._compositor = layer_manager.get_compositor()
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return self._compositor.width, self._compositor.height
+
+    def tile(self, tx: int, ty: int) -> np.ndarray:
+        return self._compositor.composite_tile(tx, ty)
+
+    def uniform_pixel(self, tx: int, ty: int) -> Optional[np.ndarray]:
+        return self._compositor.uniform_pixel(tx, ty)
+
+    def poll_changes(self) -> Optional[List[TileKey]]:
+        """Get composite tiles changed since the last poll, or None if everything changed."""
+        layers = self.layer_manager.layers
+        signature = tuple((layer.image.uid, layer.visible, layer.opacity, layer.blend_mode,
+                           getattr(layer, 'adjustment', None)) for layer in layers)
+        if signature != self._signature:
+            # Stack order, visibility or blending changed: every tile is affected
+            self._signature = signature
+            self._generations = {layer.image.uid: layer.image.generation for layer in layers}
+            self._compositor = self.layer_manager.get_compositor()
+            return None
+        changed = set()
+        # Filters in adjustment layers spread changes below them over their margins
+        margin = 0
+        for layer in reversed(layers):
+            image = layer.image
+            keys = image.changes_since(self._generations[image.uid]) if layer.visible else []
+            self._generations[image.uid] = image.generation
+            if keys is None:
+                return None
+            changed.update(grow_tiles(set(keys), math.ceil(margin / TILE_SIZE)))
+            adjustment = getattr(layer, 'adjustment', None)
+            if layer.visible and adjustment is not None:
+                margin += adjustment.margin
+        return list(changed)
+
+
+class MipPyramid:
+    """Tile pyramid of a source image for drawing at any zoom.
+
+    Level 0 tiles are the source's TILE_SIZE tiles; each tile of level n is
+    the 2x2 box average of four level n-1 tiles, in premultiplied ARGB32.
+    Tiles are built lazily when first drawn and dropped along with their
+    ancestors when the source reports changes, so a stroke only rebuilds one
+    tile per level. Areas of a single color are tracked as that color and
+    never rendered into tiles. When over budget the finest levels are evicted
+    first, since they are the cheapest to rebuild.
+    """
+
+    def __init__(self, source, budget_mb: int = 256):
+        self.source = source
+        self.budget_bytes = max(1, int(budget_mb)) * 1024 * 1024
+        self._levels: List["OrderedDict[Tuple[int, int], Tuple[np.ndarray, QImage]]"] = [
+            OrderedDict() for _ in range(MAX_LEVELS)]
+        self._solid: Dict[MipKey, Optional[Tuple[int, int, int, int]]] = {}
+        self._solid_tiles: Dict[Tuple[int, int, int, int], Tuple[np.ndarray, QImage]] = {}
+        self._count = 0
+        self._lock = threading.RLock()
+        self.built = 0
+        self.drawn = 0
+
+    @property
+    def width(self) -> int:
+        return self.source.size[0]
+
+    @property
+    def height(self) -> int:
+        return self.source.size[1]
+
+    def level_count(self) -> int:
+        """Number of levels down to a single tile."""
+        longest = max(1, self.width, self.height)
+        return min(MAX_LEVELS, max(1, math.ceil(math.log2(max(1, longest / TILE_SIZE))) + 1))
+
+    def level_for_zoom(self, zoom: float) -> int:
+        """Get the coarsest level that still has at least one pixel per screen pixel."""
+        if zoom <= 0:
+            return self.level_count() - 1
+        level = int(math.floor(math.log2(1.0 / zoom) + 1e-6))
+        return max(0, min(self.level_count() - 1, level))
+
+    def tiles_at(self, level: int) -> Tuple[int, int]:
+        """Get the tile grid size of a level."""
+        span = TILE_SIZE << level
+        return max(1, -(-self.width // span)), max(1, -(-self.height // span))
+
+    def solid_color(self, level: int, tx: int, ty: int) -> Optional[Tuple[int, int, int, int]]:
+        """Get the ARGB32 pixel filling a whole tile, or None if the tile has detail."""
+        key = (level, tx, ty)
+        with self._lock:
+            if key in self._solid:
+                return self._solid[key]
+        if level == 0:
+            pixel = self.source.uniform_pixel(tx, ty)
+            value = tuple(int(c) for c in pixel) if pixel is not None else None
+        else:
+            # Children outside the image are never drawn, so they do not count
+            child_x, child_y = self.tiles_at(level - 1)
+            values = {self.solid_color(level - 1, cx, cy)
+                      for cy in (ty * 2, ty * 2 + 1) for cx in (tx * 2, tx * 2 + 1)
+                      if cx < child_x and cy < child_y}
+            value = values.pop() if len(values) == 1 else None
+        with self._lock:
+            self._solid[key] = value
+        return value
+
+    def tile(self, level: int, tx: int, ty: int) -> Tuple[np.ndarray, QImage]:
+        """Get a premultiplied tile and a QImage sharing its pixels, building it if needed."""
+        tiles = self._levels[level]
+        with self._lock:
+            entry = tiles.get((tx, ty))
+            if entry is not None:
+                tiles.move_to_end((tx, ty))
+                return entry
+        solid = self.solid_color(level, tx, ty)
+        if solid is not None:
+            return self._solid_tile(solid)
+        if level == 0:
+            pixels = premultiply(self.source.tile(tx, ty))
+        else:
+            pixels = self._downsample(level, tx, ty)
+        entry = (pixels, self._wrap(pixels))
+        with self._lock:
+            if (tx, ty) not in tiles:
+                self._count += 1
+            tiles[(tx, ty)] = entry
+            self.built += 1
+            self._evict()
+        return entry
+
+    @staticmethod
+    def _wrap(pixels: np.ndarray) -> QImage:
+        return QImage(pixels.data, TILE_SIZE, TILE_SIZE, TILE_SIZE * 4, QImage.Format.Format_ARGB32_Premultiplied)
+
+    def _solid_tile(self, value: Tuple[int, int, int, int]) -> Tuple[np.ndarray, QImage]:
+        """Get a shared premultiplied tile of one color."""
+        entry = self._solid_tiles.get(value)
+        if entry is None:
+            pixels = np.empty((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8)
+            pixels[:] = premultiply(np.array([[value]], dtype=np.uint8))[0, 0]
+            entry = self._solid_tiles.setdefault(value, (pixels, self._wrap(pixels)))
+        return entry
+
+    def _downsample(self, level: int, tx: int, ty: int) -> np.ndarray:
+        """Average the four children of a tile 2x2."""
+        out = np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8)
+        child_x, child_y = self.tiles_at(level - 1)
+        half = TILE_SIZE // 2
+        for dy in range(2):
+            for dx in range(2):
+                cx, cy = tx * 2 + dx, ty * 2 + dy
+                if cx >= child_x or cy >= child_y:
+                    continue
+                target = out[dy * half:(dy + 1) * half, dx * half:(dx + 1) * half]
+                child, _ = self.tile(level - 1, cx, cy)
+                if self.solid_color(level - 1, cx, cy) is not None:
+                    target[:] = child[0, 0]
+                    continue
+                child = child.astype(np.uint16)
+                box = child[0::2, 0::2] + child[1::2, 0::2] + child[0::2, 1::2] + child[1::2, 1::2]
+                target[:] = (box + 2) >> 2
+        return out
+
+    def invalidate(self, keys: Optional[Iterable[TileKey]] = None):
+        """Drop level 0 tiles and their ancestors; None drops everything."""
+        with self._lock:
+            if keys is None:
+                for tiles in self._levels:
+                    tiles.clear()
+                self._solid.clear()
+                self._count = 0
+                return
+            levels = self.level_count()
+            for tx, ty in keys:
+                for level in range(levels):
+                    key = (tx >> level, ty >> level)
+                    if self._levels[level].pop(key, None) is not None:
+                        self._count -= 1
+                    self._solid.pop((level,) + key, None)
+
+    def invalidate_rect(self, x: int, y: int, w: int, h: int):
+        """Drop the tiles covering an image rectangle."""
+        x0, y0 = max(0, x) // TILE_SIZE, max(0, y) // TILE_SIZE
+        x1, y1 = (x + max(w, 1) - 1) // TILE_SIZE, (y + max(h, 1) - 1) // TILE_SIZE
+        self.invalidate((tx, ty) for ty in range(y0, y1 + 1) for tx in range(x0, x1 + 1))
+
+    def sync(self):
+        """Pick up changes reported by the source."""
+        changed = self.source.poll_changes()
+        if changed is None:
+            self.invalidate()
+        elif changed:
+            self.invalidate(changed)
+
+    def draw(self, painter: QPainter, rect: QRectF, zoom: float) -> int:
+        """Draw the visible part of the image, in image coordinates, at the level for ``zoom``.
+
+        The painter is expected to map image coordinates to the screen with
+        scale ``zoom``; only tiles intersecting ``rect`` are drawn.
+        Returns the number of tiles drawn.
+        """
+        self.sync()
+        level = self.level_for_zoom(zoom)
+        span = TILE_SIZE << level
+        tiles_x, tiles_y = self.tiles_at(level)
+        left, top = max(0.0, rect.left()), max(0.0, rect.top())
+        right, bottom = min(float(self.width), rect.right()), min(float(self.height), rect.bottom())
+        if right <= left or bottom <= top:
+            return 0
+
+        count = 0
+        # Antialiased tile edges would let the background show through the seams
+        painter.save()
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing, False)
+        for ty in range(int(top) // span, min(tiles_y - 1, int(math.ceil(bottom)) // span) + 1):
+            for tx in range(int(left) // span, min(tiles_x - 1, int(math.ceil(right)) // span) + 1):
+                x, y = tx * span, ty * span
+                w, h = min(span, self.width - x), min(span, self.height - y)
+                solid = self.solid_color(level, tx, ty)
+                if solid is not None:
+                    blue, green, red, alpha = solid
+                    if alpha:
+                        painter.fillRect(QRectF(x, y, w, h), QColor(red, green, blue, alpha))
+                else:
+                    pixels, image = self.tile(level, tx, ty)  # keeps the pixels alive while drawn
+                    painter.drawImage(QRectF(x, y, w, h), image,
+                                      QRectF(0, 0, w / (1 << level), h / (1 << level)))
+                count += 1
+        painter.restore()
+        self.drawn += count
+        return count
+
+    def set_budget(self, budget_mb: int):
+        """Change the memory budget, evicting tiles if needed."""
+        with self._lock:
+            self.budget_bytes = max(1, int(budget_mb)) * 1024 * 1024
+            self._evict()
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get cache usage statistics."""
+        with self._lock:
+            return {
+                'tiles': self._count,
+                'solid_tiles': sum(1 for value in self._solid.values() if value is not None),
+                'used_bytes': self._count * TILE_SIZE * TILE_SIZE * 4,
+                'budget_bytes': self.budget_bytes,
+                'built': self.built,
+                'drawn': self.drawn
+            }
+
+    def _evict(self):
+        """Evict tiles until within budget, finest level and least recently used first."""
+        limit = max(1, self.budget_bytes // (TILE_SIZE * TILE_SIZE * 4))
+        for tiles in self._levels:
+            while self._count > limit and tiles:
+                tiles.popitem(last=False)
+                self._count -= 1
+            if self._count <= limit:
+                return
+
+
+class MipmapItem(QGraphicsItem):
+    """Scene item that draws a pyramid at the level matching the view's zoom."""
+
+    def __init__(self, pyramid: MipPyramid, parent: Optional[QGraphicsItem] = None):
+        super().__init__(parent)
+        self.pyramid = pyramid
+        self._size = (pyramid.width, pyramid.height)
+        # Needed for exposedRect, so only visible tiles are drawn
+        self.setFlag(QGraphicsItem.GraphicsItemFlag.ItemUsesExtendedStyleOption)
+
+    def boundingRect(self) -> QRectF:
+        return QRectF(0, 0, self._size[0], self._size[1])
+
+    def refresh(self):
+        """Pick up source changes and schedule a repaint."""
+        size = (self.pyramid.width, self.pyramid.height)
+        if size != self._size:
+            self.prepareGeometryChange()
+            self._size = size
+        self.update()
+
+    def paint(self, painter: QPainter, option: QStyleOptionGraphicsItem, widget=None):
+        zoom = QStyleOptionGraphicsItem.levelOfDetailFromTransform(painter.worldTransform())
+        self.pyramid.draw(painter, option.exposedRect, zoom)
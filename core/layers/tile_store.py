@@ -0,0 +1,472 @@
+"""
+Out-of-core tile storage for PixelCrafterX.
+Backs layer pixels with a memory-mapped scratch file and keeps
+recently used tiles resident in a shared, size-bounded LRU cache.
+"""
+
+import itertools
+import math
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+import numpy as np
+from PyQt6.QtCore import Qt
+from PyQt6.QtGui import QColor, QImage
+
+from utils.config import load_config
+from utils.image.image_buffer import array_to_qimage, qimage_to_array
+
+TILE_SIZE = 256
+TILE_BYTES = TILE_SIZE * TILE_SIZE * 4
+
+TileKey = Tuple[int, int]
+
+
+class TileCache:
+    """LRU cache of resident tiles shared by all tiled images.
+
+    When the cache grows past its budget the least recently used tiles are
+    evicted; dirty tiles are written back to their image's scratch file first.
+    """
+
+    def __init__(self, budget_mb: int = 1024):
+        self.budget_bytes = max(1, int(budget_mb)) * 1024 * 1024
+        self.used_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._tiles: "OrderedDict[Tuple[int, int, int], Tuple[weakref.ref, np.ndarray]]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    @property
+    def lock(self) -> threading.RLock:
+        """Lock guarding the cache and the resident state of its images."""
+        return self._lock
+
+    def get(self, image: 'TiledImage', tx: int, ty: int) -> Optional[np.ndarray]:
+        """Get a resident tile, marking it as most recently used."""
+        key = (image.uid, tx, ty)
+        with self._lock:
+            entry = self._tiles.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._tiles.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, image: 'TiledImage', tx: int, ty: int, tile: np.ndarray):
+        """Make a tile resident, evicting older tiles if over budget."""
+        key = (image.uid, tx, ty)
+        with self._lock:
+            old = self._tiles.pop(key, None)
+            if old is not None:
+                self.used_bytes -= old[1].nbytes
+            self._tiles[key] = (weakref.ref(image), tile)
+            self.used_bytes += tile.nbytes
+            self._evict()
+
+    def discard(self, image: 'TiledImage'):
+        """Drop all resident tiles of an image without writing them back."""
+        with self._lock:
+            for key in [k for k in self._tiles if k[0] == image.uid]:
+                self.used_bytes -= self._tiles.pop(key)[1].nbytes
+
+    def set_budget(self, budget_mb: int):
+        """Change the memory budget, evicting tiles if needed."""
+        with self._lock:
+            self.budget_bytes = max(1, int(budget_mb)) * 1024 * 1024
+            self._evict()
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get cache usage statistics."""
+        with self._lock:
+            return {
+                'tiles': len(self._tiles),
+                'used_bytes': self.used_bytes,
+                'budget_bytes': self.budget_bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+    def _evict(self):
+        """Evict least recently used tiles until within budget."""
+        while self.used_bytes > self.budget_bytes and len(self._tiles) > 1:
+            (_, tx, ty), (ref, tile) = self._tiles.popitem(last=False)
+            self.used_bytes -= tile.nbytes
+            image = ref()
+            if image is not None:
+                image._write_back(tx, ty, tile)
+
+
+_default_cache: Optional[TileCache] = None
+
+
+def default_tile_cache() -> TileCache:
+    """Get the application-wide tile cache sized from ``performance.cache_size_mb``."""
+    global _default_cache
+    if _default_cache is None:
+        performance = load_config().get('performance', {})
+        _default_cache = TileCache(performance.get('cache_size_mb', 1024))
+    return _default_cache
+
+
+def default_scratch_dir() -> Optional[str]:
+    """Get the configured scratch directory, or None for the system default."""
+    performance = load_config().get('performance', {})
+    return performance.get('scratch_dir') or None
+
+
+def _pixel_value(color: Union[int, QColor, Qt.GlobalColor]) -> np.ndarray:
+    """Convert a fill color to a single ARGB32 pixel."""
+    if isinstance(color, int):
+        value = color & 0xFFFFFFFF
+    else:
+        value = QColor(color).rgba()
+    return np.array([value], dtype='<u4').view(np.uint8)
+
+
+class _TileReader:
+    """Region reads shared by tiled images and their frozen views."""
+
+    _width: int
+    _height: int
+    tiles_x: int
+    tiles_y: int
+
+    def width(self) -> int:
+        return self._width
+
+    def height(self) -> int:
+        return self._height
+
+    def tile(self, tx: int, ty: int) -> np.ndarray:
+        raise NotImplementedError
+
+    def uniform_pixel(self, tx: int, ty: int) -> Optional[np.ndarray]:
+        """Get the pixel filling a whole tile, or None if the tile may have detail."""
+        return None
+
+    def tile_rect(self, tx: int, ty: int) -> Tuple[int, int, int, int]:
+        """Get the (x, y, w, h) image rectangle covered by a tile."""
+        x = tx * TILE_SIZE
+        y = ty * TILE_SIZE
+        return x, y, min(TILE_SIZE, self._width - x), min(TILE_SIZE, self._height - y)
+
+    def tiles_in_rect(self, x: int, y: int, w: int, h: int, margin: int = 0) -> Iterator[TileKey]:
+        """Iterate over tile keys intersecting a rectangle, plus a tile margin."""
+        x0 = max(0, x // TILE_SIZE - margin)
+        y0 = max(0, y // TILE_SIZE - margin)
+        x1 = min(self.tiles_x - 1, (x + max(w, 1) - 1) // TILE_SIZE + margin)
+        y1 = min(self.tiles_y - 1, (y + max(h, 1) - 1) // TILE_SIZE + margin)
+        for ty in range(y0, y1 + 1):
+            for tx in range(x0, x1 + 1):
+                yield tx, ty
+
+    def read_region(self, x: int, y: int, w: int, h: int) -> np.ndarray:
+        """Copy a rectangle of pixels into an h x w x 4 array."""
+        x0, y0 = max(0, x), max(0, y)
+        x1, y1 = min(self._width, x + w), min(self._height, y + h)
+        out = np.zeros((max(0, h), max(0, w), 4), dtype=np.uint8)
+        if x1 <= x0 or y1 <= y0:
+            return out
+        for tx, ty in self.tiles_in_rect(x0, y0, x1 - x0, y1 - y0):
+            tile = self.tile(tx, ty)
+            ox, oy = tx * TILE_SIZE, ty * TILE_SIZE
+            sx0, sy0 = max(x0, ox), max(y0, oy)
+            sx1, sy1 = min(x1, ox + TILE_SIZE), min(y1, oy + TILE_SIZE)
+            out[sy0 - y:sy1 - y, sx0 - x:sx1 - x] = tile[sy0 - oy:sy1 - oy, sx0 - ox:sx1 - ox]
+        return out
+
+    def to_array(self) -> np.ndarray:
+        """Copy the whole image into an H x W x 4 array."""
+        return self.read_region(0, 0, self._width, self._height)
+
+
+class FrozenImage(_TileReader):
+    """Read-only, point-in-time view of a TiledImage.
+
+    Lets a worker thread read a consistent image while the UI keeps
+    editing. Resident tiles are shared copy-on-write; tiles that only live
+    on disk are captured by the image just before they are first modified.
+    Call ``release`` when done.
+    """
+
+    def __init__(self, image: 'TiledImage', tiles: Dict[TileKey, np.ndarray], pending: Set[TileKey]):
+        self.image = image
+        self._width = image.width()
+        self._height = image.height()
+        self.tiles_x = image.tiles_x
+        self.tiles_y = image.tiles_y
+        self.fill_pixel = image._fill_pixel.copy()
+        self.tiles = tiles
+        self.pending = pending
+
+    def tile(self, tx: int, ty: int) -> np.ndarray:
+        """Get a tile as it was when the view was taken."""
+        key = (tx, ty)
+        tile = self.tiles.get(key)
+        if tile is not None:
+            return tile
+        with self.image.cache.lock:
+            if key in self.pending:
+                return np.array(self.image._store[ty, tx])
+            tile = self.tiles.get(key)
+            if tile is not None:
+                return tile
+        tile = np.empty((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8)
+        tile[:] = self.fill_pixel
+        return tile
+
+    def uniform_pixel(self, tx: int, ty: int) -> Optional[np.ndarray]:
+        key = (tx, ty)
+        if key in self.tiles or key in self.pending:
+            return None
+        return self.fill_pixel
+
+    def release(self):
+        """Stop tracking the source image."""
+        with self.image.cache.lock:
+            if self in self.image._freezes:
+                self.image._freezes.remove(self)
+            self.pending.clear()
+
+
+class TiledImage(_TileReader):
+    """Layer pixel buffer split into fixed-size tiles.
+
+    Tiles live in a memory-mapped scratch file and are paged in on demand
+    through a shared TileCache. Tiles that were never written read as the
+    fill color and take no space on disk. Pixels use the ARGB32 layout of
+    ``utils.image.image_buffer``.
+
+    Tiles handed out by ``snapshot`` and ``freeze`` are shared
+    copy-on-write: the next write to such a tile replaces it with a private
+    copy, so they stay valid while a background thread reads them.
+    """
+
+    _uids = itertools.count(1)
+
+    def __init__(self, width: int, height: int, cache: Optional[TileCache] = None,
+                 scratch_dir: Optional[str] = None):
+        self.uid = next(self._uids)
+        self._width = int(width)
+        self._height = int(height)
+        self.cache = cache or default_tile_cache()
+        self.tiles_x = max(1, math.ceil(self._width / TILE_SIZE))
+        self.tiles_y = max(1, math.ceil(self._height / TILE_SIZE))
+
+        self._fill_pixel = _pixel_value(0)
+        self._written: Set[TileKey] = set()
+        self._dirty: Set[TileKey] = set()
+        self._modified: Set[TileKey] = set()
+        self._shared: Set[TileKey] = set()
+        self._was_filled = False
+        self._freezes: List[FrozenImage] = []
+        # Bumped on every write so derived caches can find what changed
+        self.generation = 0
+        self._tile_generations: Dict[TileKey, int] = {}
+        self._fill_generation = 0
+
+        self._file = tempfile.TemporaryFile(prefix="pxc-", suffix=".tiles",
+                                            dir=scratch_dir or default_scratch_dir())
+        self._file.truncate(self.tiles_x * self.tiles_y * TILE_BYTES)
+        self._store = np.memmap(self._file, dtype=np.uint8, mode='r+',
+                                shape=(self.tiles_y, self.tiles_x, TILE_SIZE, TILE_SIZE, 4))
+
+    @classmethod
+    def from_array(cls, arr: np.ndarray, cache: Optional[TileCache] = None) -> 'TiledImage':
+        """Create a tiled image from an H x W x 4 ARGB32 array."""
+        image = cls(arr.shape[1], arr.shape[0], cache=cache)
+        image.write_region(0, 0, arr)
+        return image
+
+    @classmethod
+    def from_qimage(cls, qimage: QImage, cache: Optional[TileCache] = None) -> 'TiledImage':
+        """Create a tiled image from a QImage."""
+        return cls.from_array(qimage_to_array(qimage, copy=False), cache=cache)
+
+    def isNull(self) -> bool:
+        return self._width == 0 or self._height == 0
+
+    def tile(self, tx: int, ty: int) -> np.ndarray:
+        """Get a read-only view of a full TILE_SIZE x TILE_SIZE tile."""
+        view = self._resident(tx, ty).view()
+        view.flags.writeable = False
+        return view
+
+    def uniform_pixel(self, tx: int, ty: int) -> Optional[np.ndarray]:
+        """Get the fill pixel of a tile that was never written, or None."""
+        if (tx, ty) in self._written:
+            return None
+        return self._fill_pixel
+
+    def tile_for_write(self, tx: int, ty: int) -> np.ndarray:
+        """Get a writable tile and mark it as modified."""
+        with self.cache.lock:
+            for frozen in self._freezes:
+                if (tx, ty) in frozen.pending:
+                    # The disk copy is about to go stale; hand it to the frozen view
+                    frozen.tiles[(tx, ty)] = np.array(self._store[ty, tx])
+                    frozen.pending.discard((tx, ty))
+            tile = self._resident(tx, ty)
+            if (tx, ty) in self._shared:
+                tile = tile.copy()
+                self._shared.discard((tx, ty))
+                self.cache.put(self, tx, ty, tile)
+            self._dirty.add((tx, ty))
+            self._written.add((tx, ty))
+            self._modified.add((tx, ty))
+            self.generation += 1
+            self._tile_generations[(tx, ty)] = self.generation
+            return tile
+
+    def write_region(self, x: int, y: int, arr: np.ndarray):
+        """Write an h x w x 4 array of pixels at (x, y)."""
+        h, w = arr.shape[:2]
+        x0, y0 = max(0, x), max(0, y)
+        x1, y1 = min(self._width, x + w), min(self._height, y + h)
+        if x1 <= x0 or y1 <= y0:
+            return
+        for tx, ty in self.tiles_in_rect(x0, y0, x1 - x0, y1 - y0):
+            tile = self.tile_for_write(tx, ty)
+            ox, oy = tx * TILE_SIZE, ty * TILE_SIZE
+            sx0, sy0 = max(x0, ox), max(y0, oy)
+            sx1, sy1 = min(x1, ox + TILE_SIZE), min(y1, oy + TILE_SIZE)
+            tile[sy0 - oy:sy1 - oy, sx0 - ox:sx1 - ox] = arr[sy0 - y:sy1 - y, sx0 - x:sx1 - x]
+
+    def fill(self, color: Union[int, QColor, Qt.GlobalColor]):
+        """Fill the whole image with a color without touching the disk."""
+        with self.cache.lock:
+            self.cache.discard(self)
+            self._fill_pixel = _pixel_value(color)
+            self._written.clear()
+            self._dirty.clear()
+            self._modified.clear()
+            self._shared.clear()
+            self._was_filled = True
+            self.generation += 1
+            self._fill_generation = self.generation
+            self._tile_generations.clear()
+
+    def prefetch(self, x: int, y: int, w: int, h: int, margin: int = 1):
+        """Page in the tiles around a rectangle, e.g. the visible viewport."""
+        for tx, ty in self.tiles_in_rect(x, y, w, h, margin):
+            self._resident(tx, ty)
+
+    def changes_since(self, generation: int) -> Optional[List[TileKey]]:
+        """Get the tiles written after ``generation``, or None if the whole image changed."""
+        with self.cache.lock:
+            if self._fill_generation > generation:
+                return None
+            return [key for key, written in self._tile_generations.items() if written > generation]
+
+    def has_modifications(self) -> bool:
+        """Check whether any tile changed since the last snapshot."""
+        return bool(self._modified) or self._was_filled
+
+    def snapshot(self, full: bool = False) -> Tuple[bool, FrozenImage]:
+        """Take a frozen view of the tiles changed since the last snapshot.
+
+        Like ``freeze``, tiles that are not resident stay pending and are
+        read from disk by whoever reads the view. Release it when done.
+
+        Args:
+            full: Include every written tile, not just the modified ones.
+
+        Returns:
+            tuple: (reset, view). The view's ``tiles`` and ``pending`` hold
+            the changed tiles; when reset is True all other tiles hold its
+            ``fill_pixel``.
+        """
+        with self.cache.lock:
+            keys = set(self._written) if full else self._modified & self._written
+            reset = full or self._was_filled
+            self._modified.clear()
+            self._was_filled = False
+            return reset, self._freeze(keys)
+
+    def freeze(self) -> FrozenImage:
+        """Take a read-only view of the current pixels without copying them."""
+        with self.cache.lock:
+            return self._freeze(self._written)
+
+    def flush(self):
+        """Write all modified resident tiles back to the scratch file."""
+        with self.cache.lock:
+            for tx, ty in list(self._dirty):
+                tile = self.cache.get(self, tx, ty)
+                if tile is not None:
+                    self._write_back(tx, ty, tile)
+            self._store.flush()
+
+    def copy(self) -> 'TiledImage':
+        """Create an independent copy backed by its own scratch file."""
+        self.flush()
+        clone = TiledImage(self._width, self._height, cache=self.cache)
+        clone._fill_pixel = self._fill_pixel.copy()
+        clone._written = set(self._written)
+        for tx, ty in self._written:
+            clone._store[ty, tx] = self._store[ty, tx]
+        return clone
+
+    def to_qimage(self, x: int = 0, y: int = 0, w: Optional[int] = None, h: Optional[int] = None) -> QImage:
+        """Copy the whole image, or a rectangle of it, into a QImage."""
+        w = self._width - x if w is None else w
+        h = self._height - y if h is None else h
+        return array_to_qimage(self.read_region(x, y, w, h))
+
+    def resident_tile_count(self) -> int:
+        """Get the number of tiles of this image currently in memory."""
+        return sum(1 for key in self.cache._tiles if key[0] == self.uid)
+
+    def close(self):
+        """Release resident tiles and the scratch file."""
+        if self._store is None:
+            return
+        self.cache.discard(self)
+        self._store = None
+        self._file.close()
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def _freeze(self, keys: Iterable[TileKey]) -> FrozenImage:
+        """Share the resident tiles among ``keys`` and leave the others pending (holding the lock)."""
+        tiles = {}
+        pending = set()
+        for key in keys:
+            tile = self.cache.get(self, *key)
+            if tile is None:
+                pending.add(key)
+            else:
+                tiles[key] = tile
+                self._shared.add(key)
+        frozen = FrozenImage(self, tiles, pending)
+        self._freezes.append(frozen)
+        return frozen
+
+    def _resident(self, tx: int, ty: int) -> np.ndarray:
+        """Get a tile from the cache, paging it in from disk if needed."""
+        with self.cache.lock:
+            tile = self.cache.get(self, tx, ty)
+            if tile is None:
+                self._shared.discard((tx, ty))
+                if (tx, ty) in self._written:
+                    tile = np.array(self._store[ty, tx])
+                else:
+                    tile = np.empty((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8)
+                    tile[:] = self._fill_pixel
+                self.cache.put(self, tx, ty, tile)
+            return tile
+
+    def _write_back(self, tx: int, ty: int, tile: np.ndarray):
+        """Write a modified tile to the scratch file."""
+        if (tx, ty) in self._dirty and self._store is not None:
+            self._store[ty, tx] = tile
+            self._dirty.discard((tx, ty))
@@ -1,78 +1,388 @@
-from typing import Dict, List, Callable, Any
+"""
+Plugin event bus for PixelCrafterX.
+Delivers typed events to subscribers synchronously, through a queue, on a thread or on asyncio.
+"""
+
+from typing import Dict, List, Callable, Any, Optional, Tuple, Union
+import asyncio
 import logging
-from collections import defaultdict
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from enum import Enum
+
+from plugins.plugin_profiler import PluginProfiler, event_entry, get_profiler
 
 logger = logging.getLogger(__name__)
 
-class PluginEventSystem:
-    def __init__(self):
-        self._event_handlers: Dict[str, List[Callable]] = defaultdict(list)
-        self._event_history: List[Dict] = []
-        self._max_history = 100
-    
-    def register_handler(self, event_name: str, handler: Callable) -> bool:
+# Topics where only the latest pending event matters
+COALESCED_TOPICS = {'canvas.dirty', 'cursor.moved'}
+
+
+class Delivery(Enum):
+    SYNC = "sync"  # in the publisher's thread, before publish returns
+    QUEUED = "queued"  # when the owner calls process_queued, e.g. from a UI timer
+    THREAD = "thread"  # on the bus's worker threads
+    ASYNC = "async"  # on an asyncio event loop; coroutine handlers are awaited
+
+
+class Event:
+    """Base class for typed events; subclasses are dataclasses with a ``topic``."""
+    topic = "event"
+    coalesce = False
+
+    def merge(self, newer: "Event") -> "Event":
+        """Combine with a newer pending event of the same topic."""
+        return newer
+
+
+@dataclass
+class PluginEvent(Event):
+    """Untyped event carrying arbitrary data, as emitted through ``emit_event``."""
+    name: str
+    data: Any = None
+
+    @property
+    def topic(self) -> str:
+        return self.name
+
+
+@dataclass
+class CanvasDirtyEvent(Event):
+    """A scene rectangle needs repainting."""
+    topic = "canvas.dirty"
+    coalesce = True
+    x: float
+    y: float
+    width: float
+    height: float
+
+    def merge(self, newer: "CanvasDirtyEvent") -> "CanvasDirtyEvent":
+        left, top = min(self.x, newer.x), min(self.y, newer.y)
+        right = max(self.x + self.width, newer.x + newer.width)
+        bottom = max(self.y + self.height, newer.y + newer.height)
+        return CanvasDirtyEvent(left, top, right - left, bottom - top)
+
+
+@dataclass
+class CursorMovedEvent(Event):
+    """The cursor moved over the canvas, in scene coordinates."""
+    topic = "cursor.moved"
+    coalesce = True
+    x: float
+    y: float
+
+
+@dataclass
+class LayerChangedEvent(Event):
+    """A layer was added, removed or modified."""
+    topic = "layer.changed"
+    layer_index: int
+    change: str = "modified"
+
+
+@dataclass
+class HandlerStats:
+    """Latency and throughput of one subscriber."""
+    calls: int = 0
+    errors: int = 0
+    coalesced: int = 0  # events merged into a pending one instead of delivered
+    total_time: float = 0.0
+    max_time: float = 0.0
+    total_latency: float = 0.0  # publish to handler start
+    max_latency: float = 0.0
+    first_call: Optional[float] = None
+    last_call: Optional[float] = None
+
+    def record(self, latency: float, duration: float, failed: bool):
+        now = time.perf_counter()
+        if self.first_call is None:
+            self.first_call = now
+        self.last_call = now
+        self.calls += 1
+        self.errors += failed
+        self.total_time += duration
+        self.max_time = max(self.max_time, duration)
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+
+    def as_dict(self) -> Dict[str, float]:
+        calls = max(self.calls, 1)
+        span = (self.last_call - self.first_call) if self.calls > 1 else 0.0
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'coalesced': self.coalesced,
+            'mean_ms': self.total_time / calls * 1000,
+            'max_ms': self.max_time * 1000,
+            'total_ms': self.total_time * 1000,
+            'mean_latency_ms': self.total_latency / calls * 1000,
+            'max_latency_ms': self.max_latency * 1000,
+            'events_per_s': (self.calls - 1) / span if span > 0 else 0.0,
+        }
+
+
+@dataclass(eq=False)
+class Subscription:
+    """A handler subscribed to a topic."""
+    topic: str
+    handler: Callable
+    delivery: Delivery
+    name: str
+    loop: Optional[asyncio.AbstractEventLoop] = None
+    stats: HandlerStats = field(default_factory=HandlerStats)
+    active: bool = True
+
+
+class _Pending:
+    """An event waiting for a non-synchronous subscriber; may absorb newer events."""
+    __slots__ = ('subscription', 'event', 'published', 'key')
+
+    def __init__(self, subscription: Subscription, event: Event, published: float, key):
+        self.subscription = subscription
+        self.event = event
+        self.published = published
+        self.key = key
+
+
+class EventBus:
+    """Publish/subscribe hub for typed events."""
+
+    def __init__(self, history_size: int = 0, thread_workers: int = 2,
+                 coalesce_topics: Optional[set] = None, profiler: Optional[PluginProfiler] = None):
+        self._subscriptions: Dict[str, List[Subscription]] = defaultdict(list)
+        self._lock = threading.RLock()
+        self._queue: deque = deque()
+        self._pending: Dict[Tuple[int, str], _Pending] = {}
+        self._history: deque = deque(maxlen=history_size)
+        self._thread_workers = thread_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._in_flight: set = set()
+        self.coalesce_topics = set(COALESCED_TOPICS if coalesce_topics is None else coalesce_topics)
+        self.published = 0
+        self.profiler = profiler
+
+    def subscribe(self, topic: Union[str, type], handler: Callable, delivery: Delivery = Delivery.SYNC,
+                  name: Optional[str] = None, loop: Optional[asyncio.AbstractEventLoop] = None,
+                  plugin: Optional[str] = None) -> Subscription:
+        """Call ``handler(event)`` for events on a topic (a name or an Event subclass).
+
+        With a profiler, the handler is timed as ``event:<topic>:<name>`` of
+        ``plugin`` (default: the handler's module) and subject to the event's
+        budget, so a slow handler is reported and disabled on its own.
+        """
+        if isinstance(topic, type):
+            topic = topic.topic
+        name = name or getattr(handler, '__qualname__', repr(handler))
+        if self.profiler is not None:
+            handler = self.profiler.wrap(plugin or getattr(handler, '__module__', None) or 'unknown',
+                                         event_entry(topic, name), handler)
+        if delivery == Delivery.ASYNC and loop is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                raise ValueError("ASYNC delivery needs an event loop") from None
+        subscription = Subscription(topic, handler, delivery, name, loop)
+        with self._lock:
+            # Copy on write so publish can iterate without the lock
+            self._subscriptions[topic] = self._subscriptions[topic] + [subscription]
+        logger.debug(f"Subscribed {name} to {topic} ({delivery.value})")
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> bool:
+        """Stop delivering to a subscription; pending events for it are dropped."""
+        with self._lock:
+            handlers = self._subscriptions.get(subscription.topic, [])
+            if subscription not in handlers:
+                return False
+            self._subscriptions[subscription.topic] = [s for s in handlers if s is not subscription]
+            subscription.active = False
+        return True
+
+    def publish(self, event: Event):
+        """Deliver an event to every subscriber of its topic."""
+        topic = event.topic
+        published = time.perf_counter()
+        self.published += 1
+        if self._history.maxlen:
+            self._history.append(event)
+        coalesce = event.coalesce or topic in self.coalesce_topics
+        for subscription in self._subscriptions.get(topic, ()):
+            if subscription.delivery == Delivery.SYNC:
+                self._invoke(subscription, event, published)
+                continue
+            key = (id(subscription), topic) if coalesce else None
+            with self._lock:
+                pending = self._pending.get(key) if key else None
+                if pending is not None:
+                    pending.event = pending.event.merge(event)
+                    subscription.stats.coalesced += 1
+                    continue
+                pending = _Pending(subscription, event, published, key)
+                if key:
+                    self._pending[key] = pending
+            self._schedule(pending)
+
+    def _schedule(self, pending: _Pending):
+        delivery = pending.subscription.delivery
+        if delivery == Delivery.QUEUED:
+            self._queue.append(pending)
+        elif delivery == Delivery.THREAD:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self._thread_workers,
+                                                        thread_name_prefix="event-bus")
+            future = self._executor.submit(self._dispatch, pending)
+            self._in_flight.add(future)
+            future.add_done_callback(self._in_flight.discard)
+        else:
+            pending.subscription.loop.call_soon_threadsafe(self._dispatch_async, pending)
+
+    def _take(self, pending: _Pending) -> Optional[Event]:
+        """Claim a pending event for delivery; later events start a new pending entry."""
+        with self._lock:
+            if pending.key is not None and self._pending.get(pending.key) is pending:
+                del self._pending[pending.key]
+            return pending.event if pending.subscription.active else None
+
+    def _dispatch(self, pending: _Pending):
+        event = self._take(pending)
+        if event is not None:
+            self._invoke(pending.subscription, event, pending.published)
+
+    def _dispatch_async(self, pending: _Pending):
+        event = self._take(pending)
+        if event is None:
+            return
+        subscription = pending.subscription
+        if asyncio.iscoroutinefunction(subscription.handler):
+            subscription.loop.create_task(self._invoke_async(subscription, event, pending.published))
+        else:
+            self._invoke(subscription, event, pending.published)
+
+    def _invoke(self, subscription: Subscription, event: Event, published: float):
+        start = time.perf_counter()
+        failed = False
+        try:
+            subscription.handler(event)
+        except Exception as e:
+            failed = True
+            logger.error(f"Error in event handler {subscription.name} for {subscription.topic}: {e}")
+        subscription.stats.record(start - published, time.perf_counter() - start, failed)
+
+    async def _invoke_async(self, subscription: Subscription, event: Event, published: float):
+        start = time.perf_counter()
+        failed = False
+        try:
+            await subscription.handler(event)
+        except Exception as e:
+            failed = True
+            logger.error(f"Error in event handler {subscription.name} for {subscription.topic}: {e}")
+        subscription.stats.record(start - published, time.perf_counter() - start, failed)
+
+    def process_queued(self, max_events: Optional[int] = None) -> int:
+        """Deliver events queued for QUEUED subscribers; returns how many ran."""
+        count = 0
+        while self._queue and (max_events is None or count < max_events):
+            self._dispatch(self._queue.popleft())
+            count += 1
+        return count
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait for events handed to worker threads; returns False on timeout."""
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while self._in_flight:
+            for future in list(self._in_flight):
+                remaining = None if deadline is None else deadline - time.perf_counter()
+                if remaining is not None and remaining <= 0:
+                    return False
+                try:
+                    future.result(remaining)
+                except Exception:
+                    return False
+        return True
+
+    def get_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Per-handler statistics keyed by ``topic:handler name``."""
+        with self._lock:
+            subscriptions = [s for handlers in self._subscriptions.values() for s in handlers]
+        return {f"{s.topic}:{s.name}": dict(s.stats.as_dict(), delivery=s.delivery.value)
+                for s in subscriptions}
+
+    def slowest_handlers(self, count: int = 10) -> List[Tuple[str, Dict[str, Any]]]:
+        """Handlers with the highest total time, slowest first."""
+        return sorted(self.get_metrics().items(), key=lambda item: item[1]['total_ms'], reverse=True)[:count]
+
+    def get_history(self, topic: Optional[str] = None) -> List[Event]:
+        """Recent events, when history is enabled."""
+        if topic:
+            return [event for event in self._history if event.topic == topic]
+        return list(self._history)
+
+    def shutdown(self):
+        """Stop the worker threads after delivering what they already hold."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self._queue.clear()
+
+
+class PluginEventSystem(EventBus):
+    """String-named events with ``handler(event_name, data)`` callbacks, on top of the event bus."""
+
+    def __init__(self, max_history: int = 100, **kwargs):
+        kwargs.setdefault('profiler', get_profiler())
+        super().__init__(history_size=max_history, **kwargs)
+        self._legacy: Dict[str, Dict[Callable, Subscription]] = defaultdict(dict)
+
+    def register_handler(self, event_name: str, handler: Callable,
+                         delivery: Delivery = Delivery.SYNC, plugin: Optional[str] = None) -> bool:
         """Register a handler for a specific event."""
         try:
-            if handler not in self._event_handlers[event_name]:
-                self._event_handlers[event_name].append(handler)
-                logger.info(f"Registered handler for event: {event_name}")
+            if handler not in self._legacy[event_name]:
+                self._legacy[event_name][handler] = self.subscribe(
+                    event_name, lambda event: handler(event_name, getattr(event, 'data', event)),
+                    delivery, name=getattr(handler, '__qualname__', repr(handler)),
+                    plugin=plugin or getattr(handler, '__module__', None))
+                logger.debug(f"Registered handler for event: {event_name}")
                 return True
         except Exception as e:
             logger.error(f"Error registering handler for {event_name}: {e}")
         return False
-    
+
     def unregister_handler(self, event_name: str, handler: Callable) -> bool:
         """Unregister a handler for a specific event."""
-        try:
-            if handler in self._event_handlers[event_name]:
-                self._event_handlers[event_name].remove(handler)
-                logger.info(f"Unregistered handler for event: {event_name}")
-                return True
-        except Exception as e:
-            logger.error(f"Error unregistering handler for {event_name}: {e}")
+        subscription = self._legacy[event_name].pop(handler, None)
+        if subscription is not None:
+            self.unsubscribe(subscription)
+            logger.debug(f"Unregistered handler for event: {event_name}")
+            return True
         return False
-    
+
     def emit_event(self, event_name: str, data: Any = None) -> bool:
         """Emit an event to all registered handlers."""
         try:
-            event_data = {
-                'name': event_name,
-                'data': data
-            }
-            
-            # Add to history
-            self._event_history.append(event_data)
-            if len(self._event_history) > self._max_history:
-                self._event_history.pop(0)
-            
-            # Call handlers
-            for handler in self._event_handlers[event_name]:
-                try:
-                    handler(event_name, data)
-                except Exception as e:
-                    logger.error(f"Error in event handler for {event_name}: {e}")
-            
-            logger.info(f"Emitted event: {event_name}")
+            self.publish(PluginEvent(event_name, data))
             return True
         except Exception as e:
             logger.error(f"Error emitting event {event_name}: {e}")
             return False
-    
+
     def get_event_history(self, event_name: str = None) -> List[Dict]:
         """Get event history, optionally filtered by event name."""
-        if event_name:
-            return [event for event in self._event_history if event['name'] == event_name]
-        return self._event_history
-    
+        return [{'name': event.topic, 'data': getattr(event, 'data', event)}
+                for event in self.get_history(event_name)]
+
     def clear_event_history(self):
         """Clear the event history."""
-        self._event_history.clear()
-        logger.info("Event history cleared")
-    
+        self._history.clear()
+
     def get_registered_events(self) -> List[str]:
         """Get list of all registered event names."""
-        return list(self._event_handlers.keys())
-    
+        return [name for name, handlers in self._legacy.items() if handlers]
+
     def get_handlers_for_event(self, event_name: str) -> List[Callable]:
         """Get all handlers registered for a specific event."""
-        return self._event_handlers.get(event_name, []) 
\ No newline at end of file
+        return list(self._legacy.get(event_name, {}))
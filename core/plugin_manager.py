@@ -1,6 +1,11 @@
 from typing import Dict, Any, List, Optional
 import logging
-from plugins.plugin_loader import load_plugins, cleanup_plugins
+
+import numpy as np
+from plugins.plugin_loader import load_plugins, cleanup_plugins, activate_plugin, deactivate_plugin
+from plugins.plugin_profiler import get_profiler
+from plugins.plugin_sandbox import PluginSandbox, create_sandbox
+from utils.config import load_config
 
 logger = logging.getLogger(__name__)
 
@@ -9,11 +14,15 @@ class PluginManager:
         self.plugins: Dict[str, Any] = {}
         self.enabled_plugins: List[str] = []
         self.plugin_configs: Dict[str, Dict] = {}
+        self.sandbox: Optional[PluginSandbox] = None
     
     def initialize(self) -> bool:
-        """Initialize the plugin manager and load all plugins."""
+        """Initialize the plugin manager and discover all plugins; they are imported when enabled."""
         try:
+            config = load_config()
+            get_profiler().configure(config)
             self.plugins = load_plugins()
+            self.sandbox = create_sandbox(config)
             logger.info(f"Loaded {len(self.plugins)} plugins")
             return True
         except Exception as e:
@@ -27,22 +36,18 @@ class PluginManager:
     def enable_plugin(self, plugin_name: str) -> bool:
         """Enable a specific plugin."""
         if plugin_name in self.plugins and plugin_name not in self.enabled_plugins:
-            try:
-                plugin = self.plugins[plugin_name]['module']
-                plugin.initialize()
+            if activate_plugin(plugin_name, self.plugins):
                 self.enabled_plugins.append(plugin_name)
                 logger.info(f"Enabled plugin: {plugin_name}")
                 return True
-            except Exception as e:
-                logger.error(f"Failed to enable plugin {plugin_name}: {e}")
+            logger.error(f"Failed to enable plugin {plugin_name}")
         return False
     
     def disable_plugin(self, plugin_name: str) -> bool:
         """Disable a specific plugin."""
         if plugin_name in self.enabled_plugins:
             try:
-                plugin = self.plugins[plugin_name]['module']
-                plugin.cleanup()
+                deactivate_plugin(plugin_name, self.plugins)
                 self.enabled_plugins.remove(plugin_name)
                 logger.info(f"Disabled plugin: {plugin_name}")
                 return True
@@ -60,8 +65,23 @@ class PluginManager:
             return self.plugins[plugin_name].get('metadata')
         return None
     
+    def run_filter(self, plugin_name: str, function_name: str, image: np.ndarray, **params) -> np.ndarray:
+        """Run a plugin's array filter function, out of process when the sandbox is enabled."""
+        plugin_data = self.plugins[plugin_name]
+        entry = f"apply:{function_name}"
+        if self.sandbox is not None:
+            target = f"{plugin_data['manifest'].path}:{function_name}"
+            return get_profiler().call(plugin_name, entry, self.sandbox.run, target, image, **params)
+        if not activate_plugin(plugin_name, self.plugins):
+            raise RuntimeError(f"Plugin {plugin_name} could not be activated")
+        return get_profiler().call(plugin_name, entry, getattr(plugin_data['module'], function_name),
+                                   image, **params)
+    
     def shutdown(self):
         """Cleanup and shutdown all plugins."""
+        if self.sandbox is not None:
+            self.sandbox.shutdown()
+            self.sandbox = None
         cleanup_plugins(self.plugins)
         self.plugins.clear()
         self.enabled_plugins.clear()
@@ -0,0 +1,154 @@
+"""
+Spatial index for PixelCrafterX.
+Finds canvas items by area without walking the whole scene.
+"""
+
+import itertools
+import math
+from typing import Dict, Iterable, List, Set, Tuple
+
+from PyQt6.QtCore import QPointF, QRectF, Qt
+from PyQt6.QtWidgets import QGraphicsItem
+
+Cell = Tuple[int, int]
+Box = Tuple[float, float, float, float]  # (left, top, right, bottom) in scene coordinates
+
+# Items covering more cells than this are kept in a separate list instead
+MAX_ITEM_CELLS = 64
+
+
+class SpatialIndex:
+    """Uniform grid of item bounding boxes in scene coordinates.
+
+    Queries run in two phases: the grid and the stored boxes narrow the
+    search to candidates, and only candidates that the box alone cannot
+    decide get the exact shape test. Boxes are captured on ``insert``; call
+    ``update`` after moving or reshaping an indexed item.
+    """
+
+    def __init__(self, cell_size: float = 256.0):
+        self.cell_size = cell_size
+        self._cells: Dict[Cell, Set[QGraphicsItem]] = {}
+        self._boxes: Dict[QGraphicsItem, Box] = {}
+        self._large: Set[QGraphicsItem] = set()
+        self._order: Dict[QGraphicsItem, int] = {}  # insertion order, for stacking among equal z
+        self._sequence = itertools.count()
+        self.exact_tests = 0
+
+    def __len__(self) -> int:
+        return len(self._boxes)
+
+    def __contains__(self, item: QGraphicsItem) -> bool:
+        return item in self._boxes
+
+    def _cell_range(self, box: Box) -> Tuple[int, int, int, int]:
+        size = self.cell_size
+        return (math.floor(box[0] / size), math.floor(box[1] / size),
+                math.floor(box[2] / size), math.floor(box[3] / size))
+
+    def insert(self, item: QGraphicsItem):
+        """Add an item, or refresh the box of an indexed one."""
+        if item in self._boxes:
+            self._unlink(item)
+        rect = item.sceneBoundingRect()
+        box = (rect.left(), rect.top(), rect.right(), rect.bottom())
+        self._boxes[item] = box
+        self._order.setdefault(item, next(self._sequence))
+        x0, y0, x1, y1 = self._cell_range(box)
+        if (x1 - x0 + 1) * (y1 - y0 + 1) > MAX_ITEM_CELLS:
+            self._large.add(item)
+            return
+        for cy in range(y0, y1 + 1):
+            for cx in range(x0, x1 + 1):
+                self._cells.setdefault((cx, cy), set()).add(item)
+
+    def remove(self, item: QGraphicsItem):
+        self._order.pop(item, None)
+        self._unlink(item)
+
+    def _unlink(self, item: QGraphicsItem):
+        """Drop an item's box and grid cells."""
+        box = self._boxes.pop(item, None)
+        if box is None:
+            return
+        if item in self._large:
+            self._large.discard(item)
+            return
+        x0, y0, x1, y1 = self._cell_range(box)
+        for cy in range(y0, y1 + 1):
+            for cx in range(x0, x1 + 1):
+                cell = self._cells.get((cx, cy))
+                if cell is not None:
+                    cell.discard(item)
+                    if not cell:
+                        del self._cells[(cx, cy)]
+
+    def update(self, item: QGraphicsItem):
+        """Re-read an item's bounding box after it moved or changed shape."""
+        self.insert(item)
+
+    def insert_many(self, items: Iterable[QGraphicsItem]):
+        for item in items:
+            self.insert(item)
+
+    def clear(self):
+        self._cells.clear()
+        self._boxes.clear()
+        self._large.clear()
+        self._order.clear()
+
+    def candidates(self, rect: QRectF) -> List[QGraphicsItem]:
+        """Get the items whose bounding box intersects a scene rectangle."""
+        left, top, right, bottom = rect.left(), rect.top(), rect.right(), rect.bottom()
+        x0, y0, x1, y1 = self._cell_range((left, top, right, bottom))
+        found: Set[QGraphicsItem] = set(self._large)
+        if (x1 - x0 + 1) * (y1 - y0 + 1) > len(self._cells):
+            # Large query: walking the occupied cells is cheaper than the range
+            for (cx, cy), items in self._cells.items():
+                if x0 <= cx <= x1 and y0 <= cy <= y1:
+                    found.update(items)
+        else:
+            for cy in range(y0, y1 + 1):
+                for cx in range(x0, x1 + 1):
+                    items = self._cells.get((cx, cy))
+                    if items:
+                        found.update(items)
+        boxes = self._boxes
+        return [item for item in found
+                if boxes[item][0] <= right and boxes[item][2] >= left
+                and boxes[item][1] <= bottom and boxes[item][3] >= top]
+
+    def query(self, rect: QRectF,
+              mode: Qt.ItemSelectionMode = Qt.ItemSelectionMode.IntersectsItemShape) -> List[QGraphicsItem]:
+        """Get the items whose shape is inside (Contains*) or touches (Intersects*) a scene rectangle."""
+        left, top, right, bottom = rect.left(), rect.top(), rect.right(), rect.bottom()
+        contains = mode in (Qt.ItemSelectionMode.ContainsItemShape, Qt.ItemSelectionMode.ContainsItemBoundingRect)
+        exact = mode in (Qt.ItemSelectionMode.ContainsItemShape, Qt.ItemSelectionMode.IntersectsItemShape)
+        result = []
+        for item in self.candidates(rect):
+            box = self._boxes[item]
+            if left <= box[0] and box[2] <= right and top <= box[1] and box[3] <= bottom:
+                # The whole box is inside, so the shape is too
+                result.append(item)
+            elif not exact:
+                if not contains:
+                    result.append(item)
+            else:
+                self.exact_tests += 1
+                shape = item.mapToScene(item.shape())
+                if contains:
+                    if rect.contains(shape.boundingRect()):
+                        result.append(item)
+                elif shape.intersects(rect):
+                    result.append(item)
+        return result
+
+    def items_at(self, point: QPointF) -> List[QGraphicsItem]:
+        """Get the items whose shape contains a scene point, topmost first."""
+        result = []
+        for item in self.candidates(QRectF(point, point)):
+            self.exact_tests += 1
+            if item.contains(item.mapFromScene(point)):
+                result.append(item)
+        result.sort(key=lambda item: (item.zValue(), self._order[item]), reverse=True)
+        return result
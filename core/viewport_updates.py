@@ -0,0 +1,174 @@
+"""
+Viewport update tracking for PixelCrafterX.
+Accumulates dirty scene regions between frames and instruments what each repaint covered.
+"""
+
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from PyQt6.QtCore import QRect, QRectF, Qt
+from PyQt6.QtGui import QColor, QFont, QPainter, QPainterPath, QPen, QRegion
+
+# Colors cycled per frame so consecutive repaints can be told apart
+OVERLAY_COLORS = (QColor(255, 64, 64), QColor(64, 200, 64), QColor(64, 128, 255), QColor(255, 200, 0))
+
+
+def region_rects(region: QRegion) -> List[QRect]:
+    """Split a region into its rectangles (PyQt6 does not expose them directly)."""
+    path = QPainterPath()
+    path.addRegion(region)
+    return [polygon.boundingRect().toRect() for polygon in path.toSubpathPolygons()]
+
+
+class DirtyRegion:
+    """Scene rectangles changed since the last frame.
+
+    Overlapping rectangles are merged as they arrive; past
+    ``max_rects`` the region collapses to its bounding rectangle, which is
+    what the view would repaint anyway.
+    """
+
+    def __init__(self, max_rects: int = 16):
+        self.max_rects = max_rects
+        self._rects: List[QRectF] = []
+
+    def add(self, rect: QRectF, margin: float = 0.0):
+        """Mark a scene rectangle dirty, grown by ``margin`` on every side."""
+        if margin:
+            rect = rect.adjusted(-margin, -margin, margin, margin)
+        if rect.isEmpty():
+            return
+        # Absorb every rectangle the new one overlaps; the union may overlap more
+        merged = True
+        while merged:
+            merged = False
+            for i, other in enumerate(self._rects):
+                if other.intersects(rect):
+                    rect = rect.united(self._rects.pop(i))
+                    merged = True
+                    break
+        self._rects.append(rect)
+        if len(self._rects) > self.max_rects:
+            self._rects = [self.bounding_rect()]
+
+    def bounding_rect(self) -> QRectF:
+        bounds = QRectF()
+        for rect in self._rects:
+            bounds = bounds.united(rect)
+        return bounds
+
+    def is_empty(self) -> bool:
+        return not self._rects
+
+    def take(self) -> List[QRectF]:
+        """Get the accumulated rectangles and start a new frame."""
+        rects, self._rects = self._rects, []
+        return rects
+
+
+class RepaintOverlay:
+    """Records repainted viewport regions and frame times, and draws them on top of the view."""
+
+    def __init__(self, enabled: bool = False, history: int = 120):
+        self.enabled = enabled
+        self.frames: Deque[Tuple[float, int, int]] = deque(maxlen=history)  # (ms, pixels, rects)
+        self.frame_count = 0
+        self._start = 0.0
+        self._last_rects: List[QRect] = []
+
+    def hud_rect(self) -> QRect:
+        """Viewport rectangle holding the statistics text."""
+        return QRect(4, 4, 300, 40)
+
+    def begin_frame(self):
+        self._start = time.perf_counter()
+
+    def end_frame(self, region: QRegion):
+        """Record a finished repaint of ``region`` (viewport coordinates)."""
+        elapsed = (time.perf_counter() - self._start) * 1000
+        self._last_rects = region_rects(region)
+        pixels = sum(rect.width() * rect.height() for rect in self._last_rects)
+        self.frames.append((elapsed, pixels, len(self._last_rects)))
+        self.frame_count += 1
+
+    def get_stats(self, viewport_pixels: Optional[int] = None) -> Dict[str, Any]:
+        """Get frame time and repainted area statistics over the recent frames."""
+        if not self.frames:
+            return {'frames': self.frame_count, 'last_ms': 0.0, 'avg_ms': 0.0, 'max_ms': 0.0,
+                    'last_pixels': 0, 'last_rects': 0, 'last_fraction': 0.0}
+        times = [frame[0] for frame in self.frames]
+        last_ms, last_pixels, last_rects = self.frames[-1]
+        return {
+            'frames': self.frame_count,
+            'last_ms': last_ms,
+            'avg_ms': sum(times) / len(times),
+            'max_ms': max(times),
+            'last_pixels': last_pixels,
+            'last_rects': last_rects,
+            'last_fraction': last_pixels / viewport_pixels if viewport_pixels else 0.0
+        }
+
+    def paint(self, painter: QPainter, viewport_rect: QRect):
+        """Outline the rectangles of the last repaint and show the statistics."""
+        color = OVERLAY_COLORS[self.frame_count % len(OVERLAY_COLORS)]
+        painter.setPen(QPen(color, 1))
+        fill = QColor(color)
+        fill.setAlpha(40)
+        for rect in self._last_rects:
+            painter.fillRect(rect, fill)
+            painter.drawRect(rect.adjusted(0, 0, -1, -1))
+
+        stats = self.get_stats(viewport_rect.width() * viewport_rect.height())
+        hud = self.hud_rect()
+        painter.fillRect(hud, QColor(0, 0, 0, 160))
+        painter.setPen(QColor(Qt.GlobalColor.white))
+        painter.setFont(QFont('Monospace', 8))
+        painter.drawText(hud.adjusted(6, 2, -6, -2), Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter,
+                         f"frame {stats['last_ms']:.1f} ms  avg {stats['avg_ms']:.1f}  max {stats['max_ms']:.1f}\n"
+                         f"repainted {stats['last_fraction'] * 100:.1f}% in {stats['last_rects']} rects")
+
+
+class SceneChurn:
+    """Counts scene item insertions and removals, per pointer interaction.
+
+    A drag that adds or removes items on every move shows up here as
+    counts growing with the number of moves.
+    """
+
+    def __init__(self, history: int = 50):
+        self.inserts = 0
+        self.removes = 0
+        self.interactions: Deque[Dict[str, Any]] = deque(maxlen=history)
+        self._current: Optional[Dict[str, Any]] = None
+
+    def item_added(self, count: int = 1):
+        self.inserts += count
+
+    def item_removed(self, count: int = 1):
+        self.removes += count
+
+    def begin_interaction(self, tool: str):
+        self._current = {'tool': tool, 'inserts': self.inserts, 'removes': self.removes, 'moves': 0}
+
+    def pointer_moved(self):
+        if self._current is not None:
+            self._current['moves'] += 1
+
+    def end_interaction(self) -> Optional[Dict[str, Any]]:
+        """Finish the current interaction and get its counts."""
+        current, self._current = self._current, None
+        if current is None:
+            return None
+        current['inserts'] = self.inserts - current['inserts']
+        current['removes'] = self.removes - current['removes']
+        self.interactions.append(current)
+        return current
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get the totals and the counts of the last interaction."""
+        return {
+            'inserts': self.inserts,
+            'removes': self.removes,
+            'last_interaction': self.interactions[-1] if self.interactions else None
+        }
@@ -8,6 +8,10 @@ from typing import Dict, List, Optional, Type
 import numpy as np
 from PyQt6.QtGui import QImage
 
+from plugins.plugin_profiler import get_profiler
+from utils.color.lut import Brightness, Contrast, Lut3D, Saturation, get_lut_engine
+from utils.image.image_buffer import array_to_qimage, qimage_to_array
+
 class Filter(ABC):
     def __init__(self):
         self.name = "Base Filter"
@@ -60,6 +64,63 @@ class GaussianBlurFilter(Filter):
         if 'radius' in kwargs:
             self.radius = float(kwargs['radius'])
 
+class ColorLookupFilter(Filter):
+    def __init__(self):
+        super().__init__()
+        self.name = "Color Lookup"
+        self.category = "Color"
+        self.description = "Grade an image through a .cube or .3dl LUT"
+        self.lut_path = ""
+        self.interpolation = "tetrahedral"
+        self._lut: Optional[Lut3D] = None
+        
+    def apply(self, image: QImage, **kwargs) -> QImage:
+        """Apply the LUT to the image."""
+        self.set_parameters(**kwargs)
+        if not self.lut_path:
+            return image
+        if self._lut is None:
+            self._lut = Lut3D.from_file(self.lut_path)
+        arr = qimage_to_array(image)
+        get_lut_engine().apply_array(self._lut, arr, self.interpolation, out=arr)
+        return array_to_qimage(arr)
+        
+    def get_parameters(self) -> Dict:
+        return {'lut_path': self.lut_path, 'interpolation': self.interpolation}
+        
+    def set_parameters(self, **kwargs):
+        if 'lut_path' in kwargs and kwargs['lut_path'] != self.lut_path:
+            self.lut_path = str(kwargs['lut_path'])
+            self._lut = None
+        if 'interpolation' in kwargs:
+            self.interpolation = str(kwargs['interpolation'])
+
+class ColorAdjustFilter(Filter):
+    def __init__(self):
+        super().__init__()
+        self.name = "Color Adjust"
+        self.category = "Color"
+        self.description = "Adjust brightness, contrast and saturation in one pass"
+        self.brightness = 1.0
+        self.contrast = 1.0
+        self.saturation = 1.0
+        
+    def apply(self, image: QImage, **kwargs) -> QImage:
+        """Apply the adjustments through their baked LUT."""
+        self.set_parameters(**kwargs)
+        adjustments = [Brightness(self.brightness), Contrast(self.contrast), Saturation(self.saturation)]
+        arr = qimage_to_array(image)
+        get_lut_engine().apply_adjustments(adjustments, arr, out=arr)
+        return array_to_qimage(arr)
+        
+    def get_parameters(self) -> Dict:
+        return {'brightness': self.brightness, 'contrast': self.contrast, 'saturation': self.saturation}
+        
+    def set_parameters(self, **kwargs):
+        for key in ('brightness', 'contrast', 'saturation'):
+            if key in kwargs:
+                setattr(self, key, float(kwargs[key]))
+
 class FilterManager:
     def __init__(self):
         self.filters: Dict[str, Filter] = {}
@@ -97,7 +158,7 @@ class FilterManager:
         """Apply a filter to an image."""
         filter_instance = self.get_filter(name)
         if filter_instance:
-            return filter_instance.apply(image, **kwargs)
+            return get_profiler().call(name, 'apply', filter_instance.apply, image, **kwargs)
         return None
         
     def get_filter_parameters(self, name: str) -> Dict:
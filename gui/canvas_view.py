@@ -4,13 +4,15 @@ Handles canvas display and user interaction.
 """
 
 from PyQt6.QtWidgets import QWidget, QVBoxLayout
-from PyQt6.QtCore import Qt, QPoint, QRect, pyqtSignal
+from PyQt6.QtCore import Qt, QPoint, QPointF, QRect, QRectF, pyqtSignal
 from PyQt6.QtGui import QPainter, QColor, QPen, QBrush, QImage
 
 from core.canvas.canvas import Canvas
 from core.tools.tool_manager import ToolManager
 from core.layers.layer_manager import LayerManager
+from core.layers.mip_pyramid import CompositeTileSource, MipPyramid
 from core.history.history_manager import HistoryManager
+from utils.config import load_config
 
 class CanvasView(QWidget):
     # Signals
@@ -29,6 +31,11 @@ class CanvasView(QWidget):
         self.layer_manager = LayerManager()
         self.history_manager = HistoryManager()
         
+        # Zoom levels of the flattened layers, built as tiles come into view
+        performance = load_config().get('performance', {})
+        self.mip_pyramid = MipPyramid(CompositeTileSource(self.layer_manager),
+                                      performance.get('display_cache_mb', 256))
+        
         # Initialize state
         self.zoom = 1.0
         self.offset = QPoint(0, 0)
@@ -47,12 +54,23 @@ class CanvasView(QWidget):
         # Draw background
         painter.fillRect(self.rect(), QColor(50, 50, 50))
         
+        top_left = self.canvas_to_image(QPoint(0, 0))
+        bottom_right = self.canvas_to_image(QPoint(self.width(), self.height()))
+        if self.mip_pyramid.level_for_zoom(self.zoom) == 0:
+            # Page in only the layer tiles around the viewport; coarser
+            # levels are served from the pyramid without touching layers
+            self.layer_manager.prefetch(top_left.x(), top_left.y(),
+                                        bottom_right.x() - top_left.x(),
+                                        bottom_right.y() - top_left.y())
+        
         # Apply zoom and offset
         painter.translate(self.offset)
         painter.scale(self.zoom, self.zoom)
+        painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform)
         
-        # Draw canvas
-        self.canvas.draw(painter)
+        # Draw the visible tiles from the level closest to the zoom
+        visible = QRectF(QPointF(top_left), QPointF(bottom_right)).adjusted(-1, -1, 1, 1)
+        self.mip_pyramid.draw(painter, visible, self.zoom)
         
         # Draw tool preview
         if self.tool_manager.active_tool:
@@ -5,9 +5,14 @@ Main application entry point
 """
 
 import sys
+import time
+import argparse
 import logging
 from pathlib import Path
 
+# Reference point for the startup probe
+_START_TIME = time.perf_counter()
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -35,16 +40,38 @@ def setup_environment():
     ]:
         Path(dir_path).mkdir(parents=True, exist_ok=True)
 
-def main():
+def parse_args(argv=None):
+    """Parse command line options; unknown options are left for Qt."""
+    parser = argparse.ArgumentParser(prog="pixelcrafterx")
+    parser.add_argument('--profile-startup', action='store_true',
+                        help="report import times and time to first window, then exit")
+    parser.add_argument('--startup-probe', action='store_true', help=argparse.SUPPRESS)
+    return parser.parse_known_args(argv)
+
+def report_first_window():
+    """Print startup markers for the profiler (used with --startup-probe)."""
+    from utils.lazy_import import loaded_heavy_modules
+    from utils.startup_profiler import FIRST_WINDOW_MARKER, HEAVY_MODULES_MARKER
+    print(f"{FIRST_WINDOW_MARKER}{(time.perf_counter() - _START_TIME) * 1000:.1f}")
+    print(f"{HEAVY_MODULES_MARKER}{','.join(loaded_heavy_modules())}", flush=True)
+
+def main(argv=None):
     """Main application entry point."""
+    args, qt_args = parse_args(argv)
+    if args.profile_startup:
+        from utils.startup_profiler import profile_startup
+        return profile_startup(Path(__file__).resolve())
+        
     try:
         # Setup environment
         setup_environment()
         logger.info("Environment setup complete")
         
         # Import core components
+        from PyQt6.QtCore import QTimer
+        from PyQt6.QtWidgets import QApplication
         from core.plugin_manager import PluginManager
-        from ui.main_window.window import MainWindow
+        from ui.main_window import MainWindow
         
         # Initialize plugin system
         plugin_manager = PluginManager()
@@ -53,10 +80,18 @@ def main():
             return 1
         
         # Create and show main window
-        app = MainWindow(plugin_manager)
-        app.run()
+        app = QApplication([sys.argv[0]] + qt_args)
+        window = MainWindow()
+        window.plugin_manager = plugin_manager
+        window.show()
+        
+        if args.startup_probe:
+            # Exit as soon as the first frame has been processed
+            QTimer.singleShot(0, lambda: (report_first_window(), app.quit()))
         
-        return 0
+        result = app.exec()
+        plugin_manager.shutdown()
+        return result
         
     except Exception as e:
         logger.error(f"Application error: {e}", exc_info=True)
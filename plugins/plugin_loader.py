@@ -1,19 +1,33 @@
 import os
+import ast
+import heapq
 import importlib.util
 import sys
 import logging
-from typing import Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
 import json
 
+from plugins.plugin_profiler import get_profiler
+from utils.config import get_config_dir
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 PLUGIN_DIR = "plugins"
 PLUGIN_METADATA_FILE = "plugin_metadata.json"
+MANIFEST_CACHE_FILE = "plugin_manifest.json"
+MANIFEST_CACHE_VERSION = 1
+
+# Module-level names read from plugin source without executing it
+MANIFEST_ATTRS = {'PLUGIN_NAME': 'plugin_name', 'PLUGIN_VERSION': 'version',
+                  'PLUGIN_DEPENDENCIES': 'dependencies'}
 
 class PluginMetadata:
-    def __init__(self, name: str, version: str, description: str = "", 
+    def __init__(self, name: str, version: str, description: str = "",
                  dependencies: list = None, author: str = ""):
         self.name = name
         self.version = version
@@ -21,26 +35,234 @@ class PluginMetadata:
         self.dependencies = dependencies or []
         self.author = author
 
+@dataclass
+class PluginManifest:
+    """What discovery knows about a plugin file without importing it."""
+    module_name: str
+    path: str
+    mtime_ns: int
+    size: int
+    plugin_name: Optional[str] = None
+    version: Optional[str] = None
+    dependencies: List[str] = field(default_factory=list)
+    functions: List[str] = field(default_factory=list)
+    dynamic: bool = False  # some attributes are computed; checked again on import
+    error: Optional[str] = None
+
+    def is_current(self, stat: os.stat_result) -> bool:
+        """Check whether the file is unchanged since it was inspected."""
+        return self.mtime_ns == stat.st_mtime_ns and self.size == stat.st_size
+
+    def problem(self) -> Optional[str]:
+        """Describe why this file cannot be loaded as a plugin, if it cannot."""
+        if self.error:
+            return self.error
+        if self.plugin_name is None and not self.dynamic:
+            return "missing required attribute: PLUGIN_NAME"
+        if self.version is None and not self.dynamic:
+            return "missing required attribute: PLUGIN_VERSION"
+        for method in ('initialize', 'cleanup'):
+            if method not in self.functions and not self.dynamic:
+                return f"missing required method: {method}"
+        return None
+
+def inspect_plugin_file(path: str, stat: os.stat_result) -> PluginManifest:
+    """Read plugin attributes from the source with ``ast`` instead of running it."""
+    manifest = PluginManifest(Path(path).stem, path, stat.st_mtime_ns, stat.st_size)
+    try:
+        with open(path, 'rb') as f:
+            tree = ast.parse(f.read(), filename=path)
+    except (OSError, SyntaxError, ValueError) as e:
+        manifest.error = f"cannot parse: {e}"
+        return manifest
+
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            manifest.functions.append(node.name)
+        elif isinstance(node, (ast.Assign, ast.AnnAssign)) and node.value is not None:
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            for target in targets:
+                if isinstance(target, ast.Name) and target.id in MANIFEST_ATTRS:
+                    try:
+                        value = ast.literal_eval(node.value)
+                    except ValueError:
+                        manifest.dynamic = True
+                        continue
+                    if target.id == 'PLUGIN_DEPENDENCIES':
+                        value = [str(dep) for dep in value]
+                    setattr(manifest, MANIFEST_ATTRS[target.id], value)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)) and any(
+                alias.name == '*' or alias.asname in ('initialize', 'cleanup') or alias.name in MANIFEST_ATTRS
+                for alias in node.names):
+            # Attributes may come from another module
+            manifest.dynamic = True
+    return manifest
+
+class PluginManifestCache:
+    """Plugin manifests keyed by path, re-inspected only when mtime or size change."""
+
+    def __init__(self, cache_path: Optional[Path] = None):
+        self.cache_path = Path(cache_path) if cache_path else get_config_dir() / MANIFEST_CACHE_FILE
+        self.manifests: Dict[str, PluginManifest] = {}
+        self.listings: Dict[str, Tuple[int, List[str], List[str]]] = {}  # dir -> (mtime_ns, files, subdirs)
+        self.hits = 0
+        self.misses = 0
+        self._dirty = False
+        self._load()
+
+    def _load(self):
+        if not self.cache_path.exists():
+            return
+        try:
+            with open(self.cache_path, 'r') as f:
+                data = json.load(f)
+            if data.get('version') != MANIFEST_CACHE_VERSION:
+                return
+            self.manifests = {path: PluginManifest(**entry) for path, entry in data['manifests'].items()}
+            self.listings = {path: tuple(entry) for path, entry in data['listings'].items()}
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable plugin manifest cache {self.cache_path}: {e}")
+            self.manifests, self.listings = {}, {}
+
+    def save(self):
+        """Write the cache back if anything changed."""
+        if not self._dirty:
+            return
+        data = {
+            'version': MANIFEST_CACHE_VERSION,
+            'manifests': {path: asdict(manifest) for path, manifest in self.manifests.items()},
+            'listings': self.listings
+        }
+        try:
+            tmp_path = self.cache_path.with_suffix('.tmp')
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.cache_path)
+            self._dirty = False
+        except Exception as e:
+            logger.error(f"Error saving plugin manifest cache: {e}")
+
+    def _list_dir(self, directory: str) -> Tuple[List[str], List[str]]:
+        """List plugin files and subdirectories, reusing the listing while the dir mtime holds."""
+        mtime_ns = os.stat(directory).st_mtime_ns
+        cached = self.listings.get(directory)
+        if cached and cached[0] == mtime_ns:
+            return cached[1], cached[2]
+        files, subdirs = [], []
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir() and not entry.name.startswith(('__', '.')):
+                    subdirs.append(entry.path)
+                elif entry.name.endswith('.py') and not entry.name.startswith('__') and entry.is_file():
+                    files.append(entry.path)
+        files.sort()
+        subdirs.sort()
+        self.listings[directory] = (mtime_ns, files, subdirs)
+        self._dirty = True
+        return files, subdirs
+
+    def scan(self, plugin_dir: str = PLUGIN_DIR, recursive: bool = False,
+             max_workers: Optional[int] = None) -> List[PluginManifest]:
+        """Get manifests for the plugin files under ``plugin_dir``, inspecting changed files in parallel."""
+        paths = []
+        pending = [os.path.abspath(plugin_dir)]
+        while pending:
+            files, subdirs = self._list_dir(pending.pop())
+            paths.extend(files)
+            if recursive:
+                pending.extend(subdirs)
+
+        manifests: Dict[str, PluginManifest] = {}
+        stale = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            manifest = self.manifests.get(path)
+            if manifest is not None and manifest.is_current(stat):
+                manifests[path] = manifest
+                self.hits += 1
+            else:
+                stale.append((path, stat))
+        if stale:
+            self.misses += len(stale)
+            workers = max_workers or min(8, len(stale))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="plugin-scan") as pool:
+                for manifest in pool.map(lambda item: inspect_plugin_file(*item), stale):
+                    manifests[manifest.path] = manifest
+                    self.manifests[manifest.path] = manifest
+            self._dirty = True
+
+        root = os.path.join(os.path.abspath(plugin_dir), '')
+        for path in [path for path in self.manifests if path.startswith(root) and path not in manifests]:
+            if recursive or os.path.dirname(path) == root[:-1]:
+                del self.manifests[path]
+                self._dirty = True
+        return [manifests[path] for path in paths if path in manifests]
+
+def resolve_load_order(manifests: Dict[str, PluginManifest]) -> Tuple[List[str], Dict[str, str]]:
+    """Sort plugins so dependencies come first.
+
+    Returns the load order and a mapping of rejected plugins to the reason.
+    Plugins with missing dependencies or in a dependency cycle are rejected,
+    along with everything that depends on them.
+    """
+    failed = {name: manifest.problem() for name, manifest in manifests.items() if manifest.problem()}
+    candidates = {name for name in manifests if name not in failed}
+
+    # Drop plugins whose dependencies are unavailable until nothing changes
+    changed = True
+    while changed:
+        changed = False
+        for name in sorted(candidates):
+            missing = [dep for dep in manifests[name].dependencies if dep not in candidates]
+            if missing:
+                reason = failed.get(missing[0])
+                failed[name] = f"missing dependency {missing[0]}" + (f" ({reason})" if reason else "")
+                candidates.discard(name)
+                changed = True
+
+    # Kahn's algorithm; the heap keeps the order stable by name
+    remaining = {name: set(manifests[name].dependencies) for name in candidates}
+    dependents: Dict[str, List[str]] = {name: [] for name in candidates}
+    for name, deps in remaining.items():
+        for dep in deps:
+            dependents[dep].append(name)
+    ready = [name for name, deps in remaining.items() if not deps]
+    heapq.heapify(ready)
+    order = []
+    while ready:
+        name = heapq.heappop(ready)
+        order.append(name)
+        for dependent in dependents[name]:
+            remaining[dependent].discard(name)
+            if not remaining[dependent]:
+                heapq.heappush(ready, dependent)
+    for name in sorted(candidates.difference(order)):
+        failed[name] = "dependency cycle: " + ", ".join(sorted(remaining[name]))
+    return order, failed
+
 def validate_plugin(module: Any) -> bool:
     """Validate if a plugin has the required attributes and methods."""
     required_attrs = ['PLUGIN_NAME', 'PLUGIN_VERSION']
     required_methods = ['initialize', 'cleanup']
-    
+
     for attr in required_attrs:
         if not hasattr(module, attr):
             logger.error(f"Plugin missing required attribute: {attr}")
             return False
-    
+
     for method in required_methods:
         if not hasattr(module, method) or not callable(getattr(module, method)):
             logger.error(f"Plugin missing required method: {method}")
             return False
-    
+
     return True
 
-def load_plugin_metadata(plugin_name: str) -> Optional[PluginMetadata]:
+def load_plugin_metadata(plugin_name: str, plugin_dir: str = PLUGIN_DIR) -> Optional[PluginMetadata]:
     """Load plugin metadata from JSON file if it exists."""
-    metadata_path = os.path.join(PLUGIN_DIR, plugin_name, PLUGIN_METADATA_FILE)
+    metadata_path = os.path.join(plugin_dir, plugin_name, PLUGIN_METADATA_FILE)
     if os.path.exists(metadata_path):
         try:
             with open(metadata_path, 'r') as f:
@@ -54,67 +276,113 @@ def check_dependencies(plugin: Any, loaded_plugins: Dict[str, Any]) -> bool:
     """Check if all plugin dependencies are satisfied."""
     if not hasattr(plugin, 'PLUGIN_DEPENDENCIES'):
         return True
-    
+
     for dep in plugin.PLUGIN_DEPENDENCIES:
         if dep not in loaded_plugins:
             logger.error(f"Missing dependency {dep} for plugin {plugin.PLUGIN_NAME}")
             return False
     return True
 
-def load_plugins() -> Dict[str, Any]:
-    """Load and initialize all valid plugins."""
+def import_plugin(manifest: PluginManifest) -> Any:
+    """Execute a plugin module from its file."""
+    spec = importlib.util.spec_from_file_location(manifest.module_name, manifest.path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[manifest.module_name] = module
+    try:
+        spec.loader.exec_module(module)
+        if not validate_plugin(module):
+            raise ImportError(f"Failed to validate plugin: {manifest.module_name}")
+    except BaseException:
+        sys.modules.pop(manifest.module_name, None)
+        raise
+    return module
+
+def load_plugins(plugin_dir: str = PLUGIN_DIR,
+                 cache: Optional[PluginManifestCache] = None) -> Dict[str, Any]:
+    """Discover plugins in dependency order without importing them.
+
+    Each entry holds the plugin's manifest and metadata; ``module`` stays
+    None until :func:`activate_plugin` imports and initializes it.
+    """
     plugins = {}
-    if not os.path.exists(PLUGIN_DIR):
-        logger.warning(f"Plugin directory {PLUGIN_DIR} does not exist")
+    if not os.path.exists(plugin_dir):
+        logger.warning(f"Plugin directory {plugin_dir} does not exist")
         return plugins
-    
-    # First pass: Load all plugins
-    for filename in os.listdir(PLUGIN_DIR):
-        if filename.endswith(".py") and not filename.startswith("__"):
-            try:
-                module_name = filename[:-3]
-                file_path = os.path.join(PLUGIN_DIR, filename)
-                
-                # Load metadata
-                metadata = load_plugin_metadata(module_name)
-                
-                # Load module
-                spec = importlib.util.spec_from_file_location(module_name, file_path)
-                module = importlib.util.module_from_spec(spec)
-                sys.modules[module_name] = module
-                spec.loader.exec_module(module)
-                
-                # Validate plugin
-                if validate_plugin(module):
-                    plugins[module_name] = {
-                        'module': module,
-                        'metadata': metadata
-                    }
-                    logger.info(f"Successfully loaded plugin: {module_name}")
-                else:
-                    logger.error(f"Failed to validate plugin: {module_name}")
-                    
-            except Exception as e:
-                logger.error(f"Error loading plugin {filename}: {e}")
-    
-    # Second pass: Initialize plugins and check dependencies
-    initialized_plugins = {}
-    for name, plugin_data in plugins.items():
-        try:
-            if check_dependencies(plugin_data['module'], initialized_plugins):
-                plugin_data['module'].initialize()
-                initialized_plugins[name] = plugin_data
-                logger.info(f"Successfully initialized plugin: {name}")
-        except Exception as e:
-            logger.error(f"Error initializing plugin {name}: {e}")
-    
-    return initialized_plugins
+
+    cache = cache or PluginManifestCache()
+    manifests = {manifest.module_name: manifest for manifest in cache.scan(plugin_dir)}
+    cache.save()
+
+    order, failed = resolve_load_order(manifests)
+    for name, reason in failed.items():
+        if manifests[name].plugin_name is None and not manifests[name].dynamic and not manifests[name].error:
+            logger.debug(f"Skipping {name}: not a plugin")
+        else:
+            logger.error(f"Cannot load plugin {name}: {reason}")
+    for name in order:
+        plugins[name] = {
+            'module': None,
+            'metadata': load_plugin_metadata(name, plugin_dir),
+            'manifest': manifests[name],
+            'active': False,
+            'activating': False
+        }
+    logger.info(f"Discovered {len(plugins)} plugins ({cache.hits} cached, {cache.misses} inspected)")
+    return plugins
+
+def activate_plugin(name: str, plugins: Dict[str, Any]) -> bool:
+    """Import and initialize a plugin on first use, activating its dependencies first."""
+    plugin_data = plugins.get(name)
+    if plugin_data is None:
+        logger.error(f"Unknown plugin: {name}")
+        return False
+    if plugin_data['active']:
+        return True
+    if plugin_data['activating']:
+        logger.error(f"Dependency cycle while activating plugin {name}")
+        return False
+
+    plugin_data['activating'] = True
+    try:
+        for dep in plugin_data['manifest'].dependencies:
+            if not activate_plugin(dep, plugins):
+                logger.error(f"Cannot activate plugin {name}: dependency {dep} failed")
+                return False
+        if plugin_data['module'] is None:
+            plugin_data['module'] = import_plugin(plugin_data['manifest'])
+            logger.info(f"Successfully loaded plugin: {name}")
+        module = plugin_data['module']
+        # Computed dependencies are only known once the module has run
+        for dep in getattr(module, 'PLUGIN_DEPENDENCIES', []):
+            if dep in plugins:
+                activate_plugin(dep, plugins)
+        active = {other: data for other, data in plugins.items() if data['active']}
+        if not check_dependencies(module, active):
+            return False
+        get_profiler().call(name, 'initialize', module.initialize)
+        plugin_data['active'] = True
+        logger.info(f"Successfully initialized plugin: {name}")
+        return True
+    except Exception as e:
+        logger.error(f"Error activating plugin {name}: {e}")
+        return False
+    finally:
+        plugin_data['activating'] = False
+
+def deactivate_plugin(name: str, plugins: Dict[str, Any]) -> bool:
+    """Clean up an active plugin; the module stays imported for reactivation."""
+    plugin_data = plugins.get(name)
+    if plugin_data is None or not plugin_data['active']:
+        return False
+    plugin_data['active'] = False
+    get_profiler().call(name, 'cleanup', plugin_data['module'].cleanup)
+    logger.info(f"Successfully cleaned up plugin: {name}")
+    return True
 
 def cleanup_plugins(plugins: Dict[str, Any]) -> None:
-    """Cleanup all loaded plugins."""
-    for name, plugin_data in plugins.items():
+    """Cleanup all active plugins, dependents before their dependencies."""
+    for name in reversed(list(plugins)):
         try:
-            plugin_data['module'].cleanup()
-            logger.info(f"Successfully cleaned up plugin: {name}")
+            deactivate_plugin(name, plugins)
         except Exception as e:
-            logger.error(f"Error cleaning up plugin {name}: {e}") 
\ No newline at end of file
+            logger.error(f"Error cleaning up plugin {name}: {e}")
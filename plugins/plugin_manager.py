@@ -4,13 +4,20 @@ Handles plugin loading, unloading, and lifecycle management.
 """
 
 import importlib
+import importlib.util
 import inspect
 import json
 import os
 from pathlib import Path
+from types import ModuleType
 from typing import Dict, List, Optional, Type, Any
 from abc import ABC, abstractmethod
 
+from plugins.plugin_loader import PluginManifestCache
+from plugins.plugin_profiler import get_profiler
+from plugins.plugin_sandbox import PluginSandbox, create_sandbox
+from utils.config import load_config
+
 class Plugin(ABC):
     def __init__(self):
         self.name = "Base Plugin"
@@ -39,14 +46,18 @@ class Plugin(ABC):
         }
 
 class PluginManager:
-    def __init__(self):
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
         self.plugins_dir = Path("plugins")
         self.plugin_config_file = self.plugins_dir / "plugin_config.json"
         self.plugins: Dict[str, Plugin] = {}
         self.plugin_configs: Dict[str, Dict[str, Any]] = {}
+        self.manifest_cache = PluginManifestCache()
+        self.modules: Dict[str, ModuleType] = {}
         
         self._ensure_plugin_dirs()
         self._load_plugin_configs()
+        # Filters run in worker processes when performance.plugin_sandbox is enabled
+        self.sandbox: Optional[PluginSandbox] = create_sandbox(config or load_config())
         
     def _ensure_plugin_dirs(self):
         """Ensure plugin directories exist."""
@@ -73,23 +84,29 @@ class PluginManager:
             print(f"Error saving plugin configs: {e}")
             
     def discover_plugins(self) -> List[str]:
-        """Discover available plugins."""
-        plugin_files = []
-        for root, _, files in os.walk(self.plugins_dir):
-            for file in files:
-                if file.endswith('.py') and not file.startswith('__'):
-                    plugin_files.append(os.path.join(root, file))
-        return plugin_files
+        """Discover available plugins, re-listing only directories that changed."""
+        manifests = self.manifest_cache.scan(str(self.plugins_dir), recursive=True)
+        self.manifest_cache.save()
+        return [os.path.relpath(manifest.path) for manifest in manifests]
+        
+    def _load_module(self, plugin_path: str) -> ModuleType:
+        """Import a plugin file by location, once per file."""
+        location = os.path.abspath(plugin_path)
+        module = self.modules.get(location)
+        if module is None:
+            module_name = f"pixelcrafterx_plugin_{Path(location).stem}"
+            spec = importlib.util.spec_from_file_location(module_name, location)
+            if spec is None:
+                raise ImportError(f"Not a Python file: {plugin_path}")
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            self.modules[location] = module
+        return module
         
     def load_plugin(self, plugin_path: str) -> Optional[Plugin]:
         """Load a plugin from a file."""
         try:
-            # Convert path to module path
-            rel_path = os.path.relpath(plugin_path, str(self.plugins_dir))
-            module_path = rel_path.replace(os.sep, '.').replace('.py', '')
-            
-            # Import the module
-            module = importlib.import_module(module_path)
+            module = self._load_module(plugin_path)
             
             # Find plugin class
             for name, obj in inspect.getmembers(module):
@@ -97,13 +114,33 @@ class PluginManager:
                     issubclass(obj, Plugin) and 
                     obj != Plugin):
                     plugin = obj()
-                    if plugin.initialize():
+                    if get_profiler().call(plugin.name, 'initialize', plugin.initialize):
                         self.plugins[plugin.name] = plugin
                         return plugin
         except Exception as e:
             print(f"Error loading plugin {plugin_path}: {e}")
         return None
         
+    def enable_sandbox(self, workers: int = 2, timeout: float = 30.0):
+        """Run plugin filters in worker processes from now on."""
+        if self.sandbox is None:
+            self.sandbox = PluginSandbox(workers, timeout)
+            self.sandbox.start()
+            
+    def disable_sandbox(self):
+        """Stop the sandbox workers and run filters in-process again."""
+        if self.sandbox is not None:
+            self.sandbox.shutdown()
+            self.sandbox = None
+            
+    def apply_filter(self, plugin_path: str, filter_name: str, image, **kwargs):
+        """Apply a Filter class defined in a plugin file to a QImage."""
+        if self.sandbox is not None:
+            target = f"{os.path.abspath(plugin_path)}:{filter_name}"
+            return get_profiler().call(filter_name, 'apply', self.sandbox.apply_filter, target, image, **kwargs)
+        module = self._load_module(plugin_path)
+        return get_profiler().call(filter_name, 'apply', getattr(module, filter_name)().apply, image, **kwargs)
+        
     def unload_plugin(self, plugin_name: str) -> bool:
         """Unload a plugin."""
         if plugin_name in self.plugins:
@@ -0,0 +1,281 @@
+"""
+Plugin profiler for PixelCrafterX.
+Measures plugin entry points and enforces per-event latency budgets.
+"""
+
+import asyncio
+import bisect
+import functools
+import logging
+import threading
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the latency histogram buckets in ms; the last bucket is open
+HISTOGRAM_BOUNDS_MS = (0.1, 0.5, 1, 2, 5, 10, 16, 33, 50, 100, 250, 500, 1000)
+
+BUDGET_ACTIONS = ('warn', 'disable')
+
+
+@dataclass
+class EntryStats:
+    """Timings of one plugin entry point, e.g. ``initialize`` or ``event:canvas.dirty:Tool.on_dirty``."""
+    calls: int = 0
+    errors: int = 0
+    wall_total: float = 0.0
+    wall_max: float = 0.0
+    cpu_total: float = 0.0
+    cpu_max: float = 0.0
+    wall_histogram: List[int] = field(default_factory=lambda: [0] * (len(HISTOGRAM_BOUNDS_MS) + 1))
+    cpu_histogram: List[int] = field(default_factory=lambda: [0] * (len(HISTOGRAM_BOUNDS_MS) + 1))
+    memory_total: int = 0  # bytes allocated and still held after the call, when tracked
+    memory_max: int = 0
+    over_budget: int = 0
+    disabled: bool = False
+
+    def record(self, wall: float, cpu: float, memory: int, failed: bool):
+        self.calls += 1
+        self.errors += failed
+        self.wall_total += wall
+        self.wall_max = max(self.wall_max, wall)
+        self.cpu_total += cpu
+        self.cpu_max = max(self.cpu_max, cpu)
+        self.wall_histogram[bisect.bisect_left(HISTOGRAM_BOUNDS_MS, wall * 1000)] += 1
+        self.cpu_histogram[bisect.bisect_left(HISTOGRAM_BOUNDS_MS, cpu * 1000)] += 1
+        self.memory_total += memory
+        self.memory_max = max(self.memory_max, memory)
+
+    def percentile_ms(self, fraction: float) -> float:
+        """Approximate a wall time percentile from the histogram (bucket upper bound)."""
+        if not self.calls:
+            return 0.0
+        target = fraction * self.calls
+        seen = 0
+        for bound, count in zip(HISTOGRAM_BOUNDS_MS, self.wall_histogram):
+            seen += count
+            if seen >= target:
+                return min(float(bound), self.wall_max * 1000)
+        return self.wall_max * 1000
+
+    def as_dict(self) -> Dict[str, Any]:
+        calls = max(self.calls, 1)
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'wall_mean_ms': self.wall_total / calls * 1000,
+            'wall_max_ms': self.wall_max * 1000,
+            'wall_total_ms': self.wall_total * 1000,
+            'wall_p95_ms': self.percentile_ms(0.95),
+            'cpu_mean_ms': self.cpu_total / calls * 1000,
+            'cpu_total_ms': self.cpu_total * 1000,
+            'memory_mean_kb': self.memory_total / calls / 1024,
+            'memory_max_kb': self.memory_max / 1024,
+            'over_budget': self.over_budget,
+            'disabled': self.disabled,
+            'wall_histogram': dict(zip([f"<={b}ms" for b in HISTOGRAM_BOUNDS_MS] + ['more'], self.wall_histogram)),
+            'cpu_histogram': dict(zip([f"<={b}ms" for b in HISTOGRAM_BOUNDS_MS] + ['more'], self.cpu_histogram)),
+        }
+
+
+def event_entry(topic: str, handler: str) -> str:
+    """Entry point name of one event handler, ``event:<topic>:<handler>``."""
+    return f"event:{topic}:{handler}"
+
+
+class PluginProfiler:
+    """Records call counts, wall/CPU histograms and memory deltas per plugin entry point.
+
+    Event handlers are recorded one per handler (see ``event_entry``) and
+    can be given a latency budget per event; a handler over budget is
+    logged, and with the ``disable`` action it alone stops being called
+    after ``max_violations`` slow calls.
+    """
+
+    def __init__(self, enabled: bool = True, event_budget_ms: Optional[float] = None,
+                 budget_action: str = 'warn', max_violations: int = 3, track_memory: bool = False):
+        self.enabled = enabled
+        self.event_budget_ms = event_budget_ms
+        self.event_budgets: Dict[str, float] = {}
+        self.max_violations = max_violations
+        self.budget_action = budget_action
+        self.stats: Dict[Tuple[str, str], EntryStats] = {}
+        self._lock = threading.Lock()
+        self.track_memory = track_memory
+
+    @property
+    def budget_action(self) -> str:
+        return self._budget_action
+
+    @budget_action.setter
+    def budget_action(self, action: str):
+        if action not in BUDGET_ACTIONS:
+            raise ValueError(f"Budget action must be one of {BUDGET_ACTIONS}, got {action!r}")
+        self._budget_action = action
+
+    @property
+    def track_memory(self) -> bool:
+        return self._track_memory
+
+    @track_memory.setter
+    def track_memory(self, track: bool):
+        # tracemalloc slows every allocation, so it only runs on request
+        self._track_memory = track
+        if track and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def configure(self, config: Dict[str, Any]):
+        """Apply the ``performance.plugin_*`` settings."""
+        performance = config.get('performance', {})
+        self.enabled = performance.get('plugin_profiling', self.enabled)
+        self.event_budget_ms = performance.get('plugin_event_budget_ms', self.event_budget_ms)
+        self.budget_action = performance.get('plugin_budget_action', self.budget_action)
+        self.track_memory = performance.get('plugin_track_memory', self.track_memory)
+
+    def set_budget(self, event_name: str, budget_ms: Optional[float]):
+        """Set the latency budget for handlers of one event; None uses the default."""
+        if budget_ms is None:
+            self.event_budgets.pop(event_name, None)
+        else:
+            self.event_budgets[event_name] = budget_ms
+
+    def _entry(self, plugin: str, entry: str) -> EntryStats:
+        key = (plugin, entry)
+        stats = self.stats.get(key)
+        if stats is None:
+            with self._lock:
+                stats = self.stats.setdefault(key, EntryStats())
+        return stats
+
+    def _budget_for(self, entry: str) -> Optional[float]:
+        if not entry.startswith('event:'):
+            return None
+        topic = entry[len('event:'):].rsplit(':', 1)[0]
+        return self.event_budgets.get(topic, self.event_budget_ms)
+
+    def _finish(self, plugin: str, entry: str, stats: EntryStats, wall: float, cpu: float,
+                memory: int, failed: bool):
+        stats.record(wall, cpu, memory, failed)
+        budget = self._budget_for(entry)
+        if budget is None or wall * 1000 <= budget:
+            return
+        stats.over_budget += 1
+        if self._budget_action == 'disable' and stats.over_budget >= self.max_violations:
+            stats.disabled = True
+            logger.warning(f"Disabled {plugin} {entry}: {stats.over_budget} calls over the "
+                           f"{budget:.1f} ms budget (last {wall * 1000:.1f} ms)")
+        elif stats.over_budget == 1 or stats.over_budget % 100 == 0:
+            logger.warning(f"{plugin} {entry} took {wall * 1000:.1f} ms, over the {budget:.1f} ms budget "
+                           f"({stats.over_budget} times so far)")
+
+    def call(self, plugin: str, entry: str, func: Callable, *args, **kwargs) -> Any:
+        """Call ``func`` and record it under (plugin, entry); disabled entries return None."""
+        if not self.enabled:
+            return func(*args, **kwargs)
+        stats = self._entry(plugin, entry)
+        if stats.disabled:
+            return None
+        memory_before = tracemalloc.get_traced_memory()[0] if self._track_memory else 0
+        cpu_start = time.thread_time()
+        start = time.perf_counter()
+        failed = False
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            wall = time.perf_counter() - start
+            cpu = time.thread_time() - cpu_start
+            memory = tracemalloc.get_traced_memory()[0] - memory_before if self._track_memory else 0
+            self._finish(plugin, entry, stats, wall, cpu, memory, failed)
+
+    async def call_async(self, plugin: str, entry: str, func: Callable, *args, **kwargs) -> Any:
+        """Await a coroutine function and record its wall time; CPU time is not attributed."""
+        if not self.enabled:
+            return await func(*args, **kwargs)
+        stats = self._entry(plugin, entry)
+        if stats.disabled:
+            return None
+        start = time.perf_counter()
+        failed = False
+        try:
+            return await func(*args, **kwargs)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self._finish(plugin, entry, stats, time.perf_counter() - start, 0.0, 0, failed)
+
+    def wrap(self, plugin: str, entry: str, func: Callable) -> Callable:
+        """Get a profiled version of ``func``."""
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def profiled_async(*args, **kwargs):
+                return await self.call_async(plugin, entry, func, *args, **kwargs)
+            return profiled_async
+
+        @functools.wraps(func)
+        def profiled(*args, **kwargs):
+            return self.call(plugin, entry, func, *args, **kwargs)
+        return profiled
+
+    def is_disabled(self, plugin: str, entry: str) -> bool:
+        stats = self.stats.get((plugin, entry))
+        return bool(stats and stats.disabled)
+
+    def enable(self, plugin: str, entry: str):
+        """Re-enable an entry point disabled for exceeding its budget."""
+        stats = self.stats.get((plugin, entry))
+        if stats is not None:
+            stats.disabled = False
+            stats.over_budget = 0
+
+    def get_stats(self, plugin: Optional[str] = None) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """Statistics as {plugin: {entry: stats}}, optionally for one plugin."""
+        result: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for (name, entry), stats in sorted(self.stats.items()):
+            if plugin is None or name == plugin:
+                result.setdefault(name, {})[entry] = stats.as_dict()
+        return result
+
+    def plugin_costs(self) -> List[Tuple[str, float]]:
+        """Total wall time in ms per plugin, most expensive first."""
+        totals: Dict[str, float] = {}
+        for (name, _), stats in self.stats.items():
+            totals[name] = totals.get(name, 0.0) + stats.wall_total * 1000
+        return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+    def format_markdown(self, plugin: Optional[str] = None) -> str:
+        """Render the statistics as markdown tables."""
+        md = ""
+        for name, entries in self.get_stats(plugin).items():
+            md += f"### {name}\n\n"
+            md += "| Entry point | Calls | Errors | Mean ms | p95 ms | Max ms | CPU mean ms | Mem max KB | Over budget |\n"
+            md += "|---|---|---|---|---|---|---|---|---|\n"
+            for entry, stats in entries.items():
+                flag = " (disabled)" if stats['disabled'] else ""
+                md += (f"| {entry}{flag} | {stats['calls']} | {stats['errors']} | {stats['wall_mean_ms']:.2f} | "
+                       f"{stats['wall_p95_ms']:.2f} | {stats['wall_max_ms']:.2f} | {stats['cpu_mean_ms']:.2f} | "
+                       f"{stats['memory_max_kb']:.1f} | {stats['over_budget']} |\n")
+            md += "\n"
+        return md
+
+    def reset(self):
+        """Forget all statistics and re-enable disabled entry points."""
+        with self._lock:
+            self.stats.clear()
+
+
+_profiler: Optional[PluginProfiler] = None
+
+
+def get_profiler() -> PluginProfiler:
+    """Get the application-wide plugin profiler."""
+    global _profiler
+    if _profiler is None:
+        _profiler = PluginProfiler()
+    return _profiler
@@ -0,0 +1,311 @@
+"""
+Plugin sandbox for PixelCrafterX.
+Runs plugin filters in warm worker processes, passing pixels through shared memory.
+"""
+
+import importlib
+import importlib.util
+import inspect
+import logging
+import multiprocessing
+import os
+import pickle
+import queue
+import threading
+import time
+import traceback
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Seconds a new worker may take to import its modules before it counts as crashed
+WORKER_START_TIMEOUT = 60.0
+
+
+class SandboxError(Exception):
+    """A sandboxed filter failed."""
+
+
+class SandboxTimeout(SandboxError):
+    """A sandboxed filter ran past its timeout; its worker was killed."""
+
+
+class SandboxCrashed(SandboxError):
+    """A sandbox worker process died while running a filter."""
+
+
+@dataclass
+class SandboxStats:
+    """Counters for a plugin sandbox."""
+    calls: int = 0
+    failures: int = 0
+    timeouts: int = 0
+    crashes: int = 0
+    workers_started: int = 0
+    busy_seconds: float = 0.0
+
+
+def _load_target(target: str) -> Any:
+    """Resolve ``path/to/plugin.py:Name`` or ``package.module:Name`` in a worker."""
+    location, _, attr = target.rpartition(':')
+    if not location or not attr:
+        raise ValueError(f"Filter target must look like 'module:name', got {target!r}")
+    if location.endswith('.py'):
+        module_name = f"pixelcrafterx_sandbox_{Path(location).stem}"
+        spec = importlib.util.spec_from_file_location(module_name, location)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    else:
+        module = importlib.import_module(location)
+    obj = getattr(module, attr)
+    # Filter classes are instantiated once and reused while the worker lives
+    return obj() if inspect.isclass(obj) else obj
+
+
+def _apply_target(target: Any, pixels: np.ndarray, output: np.ndarray, params: Dict[str, Any]):
+    """Run a filter function on an array, or a Filter instance on a QImage view of it."""
+    if hasattr(target, 'apply'):
+        from PyQt6.QtGui import QImage
+        from utils.image.image_buffer import CANONICAL_FORMAT, qimage_to_array
+        height, width = pixels.shape[:2]
+        image = QImage(pixels.data, width, height, width * 4, CANONICAL_FORMAT)
+        result_image = target.apply(image, **params)
+        result = qimage_to_array(result_image, copy=False)
+    else:
+        result = np.asarray(target(pixels, **params))
+    if result.shape != output.shape or result.dtype != np.uint8:
+        raise ValueError(f"Filter returned {result.dtype} {result.shape}, expected uint8 {output.shape}")
+    np.copyto(output, result)
+
+
+def _handle_request(request: Dict[str, Any], blocks: Dict[str, shared_memory.SharedMemory],
+                    targets: Dict[str, Any]) -> float:
+    """Run one request inside a worker; array views die with this frame."""
+    # Buffers are replaced when they grow; drop attachments to old ones
+    for name in [name for name in blocks if name not in (request['input'], request['output'])]:
+        blocks.pop(name).close()
+    for name in (request['input'], request['output']):
+        if name not in blocks:
+            blocks[name] = shared_memory.SharedMemory(name=name)
+    shape = tuple(request['shape'])
+    size = int(np.prod(shape))
+    pixels = np.ndarray(shape, np.uint8, blocks[request['input']].buf[:size])
+    output = np.ndarray(shape, np.uint8, blocks[request['output']].buf[:size])
+
+    if request['target'] not in targets:
+        targets[request['target']] = _load_target(request['target'])
+    start = time.perf_counter()
+    _apply_target(targets[request['target']], pixels, output, request['params'])
+    return time.perf_counter() - start
+
+
+def _worker_main(conn) -> None:
+    """Worker loop: attach to the shared buffers named in each request and run the filter."""
+    targets: Dict[str, Any] = {}
+    blocks: Dict[str, shared_memory.SharedMemory] = {}
+    conn.send(('ready', os.getpid()))
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if request is None:
+            break
+        try:
+            conn.send(('ok', _handle_request(request, blocks, targets)))
+        except Exception:
+            conn.send(('error', traceback.format_exc()))
+    for block in blocks.values():
+        block.close()
+
+
+class _Worker:
+    """One sandbox process with its input and output buffers."""
+
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn,),
+                                       name="pixelcrafterx-plugin-worker", daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.input: Optional[shared_memory.SharedMemory] = None
+        self.output: Optional[shared_memory.SharedMemory] = None
+        self.ready = False
+
+    def wait_ready(self, timeout: float):
+        if self.ready:
+            return
+        if not self.conn.poll(timeout):
+            raise SandboxCrashed("Plugin worker did not start")
+        self.conn.recv()
+        self.ready = True
+
+    def ensure_capacity(self, nbytes: int):
+        """Make sure both buffers hold ``nbytes``; they only ever grow."""
+        if self.input is not None and self.input.size >= nbytes:
+            return
+        self.release_buffers()
+        self.input = shared_memory.SharedMemory(create=True, size=nbytes)
+        self.output = shared_memory.SharedMemory(create=True, size=nbytes)
+
+    def release_buffers(self):
+        for block in (self.input, self.output):
+            if block is not None:
+                block.close()
+                block.unlink()
+        self.input = self.output = None
+
+    def stop(self, kill: bool = False):
+        if self.process.is_alive():
+            if kill:
+                self.process.kill()
+            else:
+                try:
+                    self.conn.send(None)
+                except (BrokenPipeError, OSError):
+                    pass
+            self.process.join(2.0)
+            if self.process.is_alive():
+                self.process.kill()
+                self.process.join()
+        self.conn.close()
+        self.release_buffers()
+
+
+class PluginSandbox:
+    """Pool of warm worker processes that run plugin filters out of process.
+
+    Pixels travel through ``multiprocessing.shared_memory`` buffers owned by
+    each worker; only the request (target, shape, parameters) is pickled.
+    A filter that hangs past its timeout or crashes its process only costs
+    that worker, which is replaced.
+    """
+
+    def __init__(self, workers: int = 2, timeout: float = 30.0, start_method: str = "spawn"):
+        self.max_workers = max(1, workers)
+        self.timeout = timeout
+        self.stats = SandboxStats()
+        # Spawn: forking a process that runs Qt threads is unsafe
+        self._context = multiprocessing.get_context(start_method)
+        self._idle: "queue.LifoQueue[_Worker]" = queue.LifoQueue()
+        self._workers = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def start(self):
+        """Start all workers now instead of on first use."""
+        with self._lock:
+            while len(self._workers) < self.max_workers:
+                self._idle.put(self._spawn())
+
+    def _spawn(self) -> _Worker:
+        worker = _Worker(self._context)
+        self._workers.append(worker)
+        self.stats.workers_started += 1
+        return worker
+
+    def _acquire(self) -> _Worker:
+        with self._lock:
+            if self._closed:
+                raise SandboxError("Plugin sandbox is shut down")
+            if self._idle.empty() and len(self._workers) < self.max_workers:
+                return self._spawn()
+        return self._idle.get()
+
+    def _discard(self, worker: _Worker):
+        """Kill a worker and start a replacement so the pool stays warm."""
+        worker.stop(kill=True)
+        with self._lock:
+            self._workers.remove(worker)
+            if not self._closed:
+                self._idle.put(self._spawn())
+
+    def run(self, target: str, image: np.ndarray, timeout: Optional[float] = None, **params) -> np.ndarray:
+        """Run a filter on an H×W×4 uint8 array in a worker and return the result.
+
+        ``target`` is ``path/to/plugin.py:name`` or ``package.module:name``,
+        naming a function taking and returning an array or a Filter class.
+        """
+        image = np.ascontiguousarray(image, dtype=np.uint8)
+        if image.ndim != 3 or image.shape[2] != 4:
+            raise ValueError(f"Expected an HxWx4 image, got shape {image.shape}")
+        if image.size == 0:
+            raise ValueError(f"Cannot run a filter on an empty image of shape {image.shape}")
+        try:
+            pickle.dumps(params)
+        except Exception as e:
+            raise TypeError(f"Parameters of filter {target} cannot be sent to a worker: {e}") from e
+        timeout = self.timeout if timeout is None else timeout
+
+        worker = self._acquire()
+        start = time.perf_counter()
+        self.stats.calls += 1
+        try:
+            worker.wait_ready(WORKER_START_TIMEOUT)
+            worker.ensure_capacity(image.nbytes)
+            np.ndarray(image.shape, np.uint8, worker.input.buf[:image.nbytes])[:] = image
+            worker.conn.send({'target': target, 'input': worker.input.name, 'output': worker.output.name,
+                              'shape': image.shape, 'params': params})
+            if not worker.conn.poll(timeout):
+                self.stats.timeouts += 1
+                raise SandboxTimeout(f"Filter {target} did not finish within {timeout:.1f}s")
+            status, detail = worker.conn.recv()
+        except SandboxTimeout:
+            self._discard(worker)
+            raise
+        except (EOFError, OSError, SandboxCrashed) as e:
+            self.stats.crashes += 1
+            worker.process.join(1.0)
+            exitcode = worker.process.exitcode
+            self._discard(worker)
+            raise SandboxCrashed(f"Plugin worker running {target} died (exit code {exitcode})") from e
+        except BaseException:
+            # The worker may hold half a request; replace it rather than reuse it
+            self._discard(worker)
+            raise
+        finally:
+            self.stats.busy_seconds += time.perf_counter() - start
+
+        if status != 'ok':
+            self._idle.put(worker)
+            self.stats.failures += 1
+            raise SandboxError(f"Filter {target} failed:\n{detail}")
+        # The buffer is reused by the next call, so hand back a copy
+        result = np.ndarray(image.shape, np.uint8, worker.output.buf[:image.nbytes]).copy()
+        self._idle.put(worker)
+        return result
+
+    def apply_filter(self, target: str, image, timeout: Optional[float] = None, **params):
+        """Run a filter on a QImage in a worker and return a new QImage."""
+        from utils.image.image_buffer import array_to_qimage, qimage_to_array
+        return array_to_qimage(self.run(target, qimage_to_array(image, copy=False), timeout, **params))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get pool counters."""
+        stats = vars(self.stats).copy()
+        stats['workers'] = len(self._workers)
+        stats['idle_workers'] = self._idle.qsize()
+        return stats
+
+    def shutdown(self):
+        """Stop all workers and free their shared memory."""
+        with self._lock:
+            self._closed = True
+            workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.stop()
+        logger.info(f"Plugin sandbox shut down after {self.stats.calls} calls")
+
+
+def create_sandbox(config: Dict[str, Any]) -> Optional[PluginSandbox]:
+    """Create a sandbox when ``performance.plugin_sandbox`` is enabled."""
+    performance = config.get('performance', {})
+    if not performance.get('plugin_sandbox', False):
+        return None
+    return PluginSandbox(workers=performance.get('plugin_workers', 2),
+                         timeout=performance.get('plugin_timeout', 30.0))
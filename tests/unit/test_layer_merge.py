@@ -0,0 +1,45 @@
+"""
+Tests for merging layers with LayerManager.merge_layers.
+"""
+
+import numpy as np
+
+from core.layers import adjustments
+from core.layers.layer_manager import AdjustmentLayer, LayerManager
+
+
+def make_stack(blend_modes):
+    """Build a stack of half-covered random layers, bottom to top."""
+    rng = np.random.default_rng(1)
+    layer_manager = LayerManager()
+    for i, (blend_mode, opacity) in enumerate(blend_modes):
+        layer = layer_manager.add_layer(300, 200, f"Layer {i}")
+        layer.image.write_region(0, 0, rng.integers(0, 256, (150, 250, 4), dtype=np.uint8))
+        layer.blend_mode = blend_mode
+        layer.opacity = opacity
+    return layer_manager
+
+
+def test_merge_across_adjustment_is_refused():
+    layer_manager = make_stack([('normal', 1.0), ('multiply', 0.5), ('screen', 0.8)])
+    layer_manager.active_layer_index = 1
+    layer_manager.add_adjustment_layer(adjustments.levels(0.1, 0.9))  # Between layers 1 and 2
+    layers = list(layer_manager.layers)
+    before = layer_manager.flatten()
+
+    assert layer_manager.merge_layers([0, 1, 3]) is None
+    assert layer_manager.layers == layers
+    assert np.array_equal(layer_manager.flatten(), before)
+
+
+def test_merge_below_adjustment_keeps_composite():
+    layer_manager = make_stack([('normal', 1.0), ('multiply', 0.5), ('overlay', 0.7)])
+    layer_manager.add_adjustment_layer(adjustments.levels(0.1, 0.9))
+    before = layer_manager.flatten()
+
+    # The selected adjustment layer lies above the merged ones and stays in place
+    merged = layer_manager.merge_layers([0, 1, 2, 3])
+
+    assert merged is not None
+    assert [type(layer) for layer in layer_manager.layers] == [type(merged), AdjustmentLayer]
+    assert np.abs(layer_manager.flatten().astype(int) - before).max() <= 1
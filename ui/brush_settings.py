@@ -4,6 +4,8 @@ from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel,
 from PyQt6.QtCore import Qt, pyqtSignal
 from PyQt6.QtGui import QColor, QPixmap, QPainter, QPen, QBrush
 
+from utils.image.overlay_cache import get_overlay_cache
+
 class BrushSettings(QGroupBox):
     """Brush settings widget with size, opacity, and style controls."""
     
@@ -127,11 +129,8 @@ class BrushSettings(QGroupBox):
         painter.setRenderHint(QPainter.RenderHint.Antialiasing)
         
         # Draw checkerboard background
-        cell_size = 10
-        for y in range(0, size, cell_size):
-            for x in range(0, size, cell_size):
-                if (x // cell_size + y // cell_size) % 2 == 0:
-                    painter.fillRect(x, y, cell_size, cell_size, QColor(220, 220, 220))
+        painter.fillRect(0, 0, size, size, get_overlay_cache().checkerboard_brush(
+            10, QColor(220, 220, 220), QColor(255, 255, 255)))
         
         # Draw brush preview
         brush_size = min(self.brush_size, 100)  # Cap size for preview
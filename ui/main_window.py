@@ -2,8 +2,9 @@
 Main window for PixelCrafter X - Core UI components.
 """
 import os
+import time
 from PyQt6.QtWidgets import (
-    QMainWindow, QDockWidget, QFileDialog, QMessageBox, QStatusBar, QToolBar,
+    QMainWindow, QDockWidget, QFileDialog, QInputDialog, QMessageBox, QStatusBar, QToolBar,
     QVBoxLayout, QWidget, QLabel, QMenuBar, QMenu, QSizePolicy, QToolButton,
     QColorDialog, QSlider, QComboBox, QHBoxLayout, QSplitter, QTabWidget,
     QPushButton, QGraphicsView, QGraphicsScene
@@ -11,7 +12,11 @@ from PyQt6.QtWidgets import (
 from PyQt6.QtCore import Qt, QSize, QSettings, QTimer, QPoint, QRectF
 from PyQt6.QtGui import QAction, QIcon, QKeySequence, QPixmap, QColor, QFont, QPainter, QPen, QBrush
 
+from core.autosave.autosave_manager import (
+    AutosaveManager, RecoveredDocument, find_recovery_files, load_recovery_file
+)
 from core.canvas import Canvas
+from ui.palette_widget import ColorPalette
 from utils.config import load_config, save_config
 
 class MainWindow(QMainWindow):
@@ -22,6 +27,8 @@ class MainWindow(QMainWindow):
         self.config = config or load_config()
         self.current_file = None
         self.unsaved_changes = False
+        self.preset_jobs = set()
+        self.recovered_file = None
         self.setup_ui()
         self.setup_menus()
         self.setup_toolbars()
@@ -34,6 +41,10 @@ class MainWindow(QMainWindow):
         self.setWindowTitle("PixelCrafter X")
         self.resize(1280, 800)
         self.setMinimumSize(800, 600)
+        
+        # Offer crash recovery once the window is up, then start autosaving
+        self.autosave_manager = AutosaveManager(self.canvas.layer_manager, self.config, parent=self, canvas=self.canvas)
+        QTimer.singleShot(0, self.start_autosave)
     
     def setup_ui(self):
         """Set up the main UI components."""
@@ -122,6 +133,12 @@ class MainWindow(QMainWindow):
         save_as_action.triggered.connect(self.save_file_as)
         file_menu.addAction(save_as_action)
         
+        # Export All Presets
+        export_presets_action = QAction("Export All &Presets...", self)
+        export_presets_action.setShortcut("Ctrl+Shift+E")
+        export_presets_action.triggered.connect(self.export_all_presets)
+        file_menu.addAction(export_presets_action)
+        
         file_menu.addSeparator()
         
         # Exit
@@ -226,6 +243,14 @@ class MainWindow(QMainWindow):
         self.tool_options_layout = QVBoxLayout(self.tool_options_widget)
         self.tool_options_dock.setWidget(self.tool_options_widget)
         self.addDockWidget(Qt.DockWidgetArea.LeftDockWidgetArea, self.tool_options_dock)
+        
+        # Palette Panel
+        self.palette_dock = QDockWidget("Palette", self)
+        self.palette_widget = ColorPalette()
+        self.palette_widget.image_provider = self.get_palette_source
+        self.palette_widget.colorSelected.connect(lambda color, name: self.set_color(color))
+        self.palette_dock.setWidget(self.palette_widget)
+        self.addDockWidget(Qt.DockWidgetArea.RightDockWidgetArea, self.palette_dock)
     
     def setup_central_widget(self):
         """Set up the central widget with canvas."""
@@ -236,6 +261,9 @@ class MainWindow(QMainWindow):
         # Connect canvas signals
         self.canvas.mouseMoved.connect(self.update_position_indicator)
         self.canvas.zoomChanged.connect(self.update_zoom_indicator)
+        self.canvas.export_service.progress.connect(self.update_export_progress)
+        self.canvas.export_service.export_finished.connect(self.on_export_finished)
+        self.canvas.export_service.export_failed.connect(self.on_export_failed)
     
     def load_settings(self):
         """Load window state and settings."""
@@ -243,9 +271,116 @@ class MainWindow(QMainWindow):
         self.restoreGeometry(settings.value("geometry", self.saveGeometry()))
         self.restoreState(settings.value("windowState", self.saveState()))
     
+    def update_export_progress(self, job_id, stage, done, total):
+        """Show export progress in the status bar."""
+        if stage == 'encode':
+            self.status_bar.showMessage(f"Saving... {done / 1024:.0f} KB written")
+        else:
+            self.status_bar.showMessage(f"Saving... {stage} {done}/{total}")
+    
+    def on_export_finished(self, job_id, result):
+        """Report a completed save or preset export."""
+        if job_id in self.preset_jobs:
+            self.preset_jobs.discard(job_id)
+            self.status_bar.showMessage(
+                f"Exported {len(result)} file(s) ({sum(item.bytes_written for item in result) / 1024:.0f} KB)", 5000)
+            return
+        self.status_bar.showMessage(
+            f"Saved {os.path.basename(result.path)} ({result.bytes_written / 1024:.0f} KB)", 5000)
+    
+    def on_export_failed(self, job_id, error):
+        """Report a failed save and keep the document marked as modified."""
+        if job_id in self.preset_jobs:
+            self.preset_jobs.discard(job_id)
+            self.status_bar.showMessage("Export failed", 5000)
+            QMessageBox.critical(self, "Export Failed", f"Could not export the presets:\n{error}")
+            return
+        self.unsaved_changes = True
+        self.update_window_title()
+        self.status_bar.showMessage("Save failed", 5000)
+        QMessageBox.critical(self, "Save Failed", f"Could not save the image:\n{error}")
+    
+    def start_autosave(self):
+        """Restore a crashed session's document if the user wants it and start autosaving."""
+        self.recover_documents()
+        self.autosave_manager.start()
+    
+    def recover_documents(self):
+        """Offer to restore one of the documents left behind by crashed sessions.
+        
+        Files that cannot be read are dropped and the next one is offered.
+        Declining discards every recovery file; when one document is restored,
+        the others stay on disk and are offered again at the next start. The
+        restored file is kept until the first autosave of the document succeeds.
+        """
+        files = find_recovery_files()
+        while files:
+            if len(files) == 1:
+                ret = QMessageBox.question(
+                    self, "Recover Document",
+                    "PixelCrafter X did not shut down cleanly.\n"
+                    "Do you want to recover the unsaved document?"
+                )
+                path = files[0] if ret == QMessageBox.StandardButton.Yes else None
+            else:
+                labels = [f"{path.stem} ({time.strftime('%Y-%m-%d %H:%M', time.localtime(path.stat().st_mtime))})"
+                          for path in files]
+                label, ok = QInputDialog.getItem(
+                    self, "Recover Document",
+                    "PixelCrafter X did not shut down cleanly.\n"
+                    "Choose an unsaved document to recover, or cancel to discard them all:",
+                    labels, 0, False
+                )
+                path = files[labels.index(label)] if ok else None
+            
+            if path is None:
+                for path in files:
+                    path.unlink(missing_ok=True)
+                return
+            
+            files.remove(path)
+            try:
+                document = load_recovery_file(path, self.canvas.layer_manager)
+            except Exception as e:
+                print(f"Error loading recovery file {path}: {e}")
+                document = RecoveredDocument()
+            if document.is_empty():
+                path.unlink(missing_ok=True)
+                continue
+            
+            if document.layers:
+                self.canvas.set_canvas_layers(document.layers)
+            self.canvas.set_vector_layers(document.canvas_layers)
+            self.canvas.fit_to_window()
+            self.current_file = None
+            self.unsaved_changes = True
+            self.update_window_title()
+            # Another crash before the restored document is autosaved must not lose it
+            self.recovered_file = path
+            self.autosave_manager.snapshot_saved.connect(self.on_recovery_autosaved)
+            self.autosave_manager.autosave()
+            return
+    
+    def on_recovery_autosaved(self, seq):
+        """Drop the restored recovery file once the document is in the new one."""
+        self.autosave_manager.snapshot_saved.disconnect(self.on_recovery_autosaved)
+        self.discard_recovered_file()
+    
+    def discard_recovered_file(self):
+        """Remove the recovery file the current document was restored from."""
+        # With a reused process id the autosave already replaced it under the same name
+        if self.recovered_file is not None and self.recovered_file != self.autosave_manager.path:
+            self.recovered_file.unlink(missing_ok=True)
+        self.recovered_file = None
+    
     def closeEvent(self, event):
         """Handle window close event."""
         if self.maybe_save():
+            # A clean exit leaves no recovery file behind
+            self.autosave_manager.discard()
+            self.discard_recovered_file()
+            # Let queued saves finish before the window goes away
+            self.canvas.export_service.shutdown()
             settings = QSettings("PixelCrafter", "PixelCrafterX")
             settings.setValue("geometry", self.saveGeometry())
             settings.setValue("windowState", self.saveState())
@@ -264,7 +399,11 @@ class MainWindow(QMainWindow):
         """Open color dialog and set the selected color."""
         color = QColorDialog.getColor()
         if color.isValid():
-            self.color_btn.setStyleSheet(f"""
+            self.set_color(color)
+    
+    def set_color(self, color):
+        """Make a color the current drawing color."""
+        self.color_btn.setStyleSheet(f"""
                 QToolButton {{
                     background-color: {color.name()};
                     border: 2px solid #3F3F46;
@@ -274,8 +413,14 @@ class MainWindow(QMainWindow):
                     border: 2px solid #007ACC;
                 }}
             """)
-            if hasattr(self, 'canvas') and self.canvas:
-                self.canvas.set_brush_color(color)
+        if hasattr(self, 'canvas') and self.canvas:
+            self.canvas.set_brush_color(color)
+    
+    def get_palette_source(self):
+        """Get the canvas pixels and the selection mask for palette extraction, or None when empty."""
+        if self.canvas.scene.sceneRect().toAlignedRect().isEmpty():
+            return None
+        return self.canvas.render_to_array(), self.canvas.selection_mask()
     
     # File operations
     def new_file(self):
@@ -325,6 +470,15 @@ class MainWindow(QMainWindow):
                 return True
         return False
     
+    def export_all_presets(self):
+        """Render every configured export preset from the current document."""
+        base_path, _ = QFileDialog.getSaveFileName(self, "Export All Presets")
+        if base_path:
+            job_id = self.canvas.export_presets(base_path)
+            if job_id is not None:
+                self.preset_jobs.add(job_id)
+                self.status_bar.showMessage("Exporting presets...")
+    
     def maybe_save(self):
         """Prompt to save if there are unsaved changes."""
         if not self.unsaved_changes:
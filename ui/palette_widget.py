@@ -1,12 +1,15 @@
 """Custom color palette widget for managing color swatches."""
 from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QToolButton, 
                            QLabel, QColorDialog, QMenu, QSizePolicy, QFrame,
-                           QGridLayout, QSpacerItem, QInputDialog, QMessageBox)
+                           QGridLayout, QSpacerItem, QInputDialog, QMessageBox, QScrollArea)
 from PyQt6.QtCore import Qt, QSize, pyqtSignal, QPoint, QSettings, QFile, QIODevice
 from PyQt6.QtGui import QColor, QPainter, QPen, QBrush, QPixmap, QIcon, QAction
 import json
 import os
 
+from utils.color.quantize import extract_palette
+from utils.image.overlay_cache import get_overlay_cache
+
 class ColorSwatch(QWidget):
     """A single color swatch in the palette."""
     
@@ -47,18 +50,11 @@ class ColorSwatch(QWidget):
     
     def draw_checkerboard(self, painter, rect):
         """Draw a checkerboard pattern for transparent colors."""
-        size = 4
-        color1 = QColor(200, 200, 200)
-        color2 = QColor(255, 255, 255)
-        
+        brush = get_overlay_cache().checkerboard_brush(4, QColor(200, 200, 200), QColor(255, 255, 255),
+                                                       self.devicePixelRatioF())
         painter.save()
-        painter.setPen(Qt.PenStyle.NoPen)
-        
-        for y in range(rect.top(), rect.bottom() + size, size):
-            for x in range(rect.left(), rect.right() + size, size):
-                color = color1 if ((x + y) // size) % 2 == 0 else color2
-                painter.fillRect(x, y, size, size, color)
-        
+        painter.setBrushOrigin(rect.topLeft())
+        painter.fillRect(rect, brush)
         painter.restore()
     
     def enterEvent(self, event):
@@ -104,6 +100,9 @@ class ColorPalette(QWidget):
         self.cols = 10
         self.spacing = 2
         self.swatch_size = 24
+        # Callable returning the ARGB32 pixels to extract palettes from and an
+        # optional selection mask, or None when there is no image
+        self.image_provider = None
         
         # Default color palette
         self.default_colors = [
@@ -211,7 +210,12 @@ class ColorPalette(QWidget):
         load_action = QAction("Load Palette...", self)
         load_action.triggered.connect(self.load_palette)
         
+        # Extract palette from the current image
+        extract_action = QAction("Extract From Image...", self)
+        extract_action.triggered.connect(self.extract_from_current_image)
+        
         menu.addAction(load_default_action)
+        menu.addAction(extract_action)
         menu.addSeparator()
         menu.addAction(save_action)
         menu.addAction(load_action)
@@ -308,6 +312,23 @@ class ColorPalette(QWidget):
         # This would be implemented to load a palette from a file
         pass
     
+    def extract_from_current_image(self):
+        """Ask for a palette size and extract it from the image provider's pixels."""
+        source = self.image_provider() if self.image_provider else None
+        if source is None:
+            QMessageBox.information(self, "Extract Palette", "There is no image to extract colors from.")
+            return
+        pixels, mask = source
+        count, ok = QInputDialog.getInt(self, "Extract Palette", "Number of colors:", 16, 1, 256)
+        if ok:
+            self.extract_from_image(pixels, count, mask=mask)
+    
+    def extract_from_image(self, pixels, count=16, method='kmeans', mask=None):
+        """Replace the palette with the main colors of an ARGB32 pixel array."""
+        colors = extract_palette(pixels, count, method, mask=mask)
+        self.set_colors([(QColor(int(r), int(g), int(b)), QColor(int(r), int(g), int(b)).name())
+                         for r, g, b in colors])
+    
     def get_colors(self):
         """Get a list of (color, name) tuples in the palette."""
         return [(swatch.color, swatch.name) for swatch in self.swatches]
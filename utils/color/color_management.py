@@ -0,0 +1,350 @@
+"""
+Color management for PixelCrafterX.
+Reads, converts and attaches ICC profiles with Pillow's ImageCms.
+
+Documents are edited in one working space (sRGB unless configured
+otherwise). Images are converted into it on load and carry its profile on
+export. Building a transform is expensive, so built transforms are kept
+in a TransformCache; applying one is done band- or tile-wise on a worker
+pool, and ImageCms releases the GIL while it transforms.
+"""
+
+import hashlib
+import io
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, Hashable, Optional, Tuple, Union
+
+import numpy as np
+
+from core.layers.tile_store import TILE_SIZE, TiledImage
+from utils.config import load_config
+from utils.lazy_import import lazy_import
+
+Image = lazy_import("PIL.Image")
+ImageCms = lazy_import("PIL.ImageCms")
+
+logger = logging.getLogger(__name__)
+
+INTENTS = {
+    'perceptual': 0,
+    'relative': 1,  # relative colorimetric
+    'saturation': 2,
+    'absolute': 3,  # absolute colorimetric
+}
+# Rows per work item when converting a plain array
+BAND_ROWS = TILE_SIZE
+
+
+@dataclass(frozen=True)
+class ColorProfile:
+    """An ICC profile, identified by the hash of its bytes."""
+    data: bytes = field(repr=False)
+    name: str = ''
+    digest: str = ''
+
+    @classmethod
+    def from_bytes(cls, data: bytes, name: Optional[str] = None) -> 'ColorProfile':
+        if name is None:
+            try:
+                name = ImageCms.getProfileDescription(ImageCms.ImageCmsProfile(io.BytesIO(data))).strip()
+            except Exception:
+                name = ''
+        return cls(bytes(data), name, hashlib.sha1(data).hexdigest())
+
+    @classmethod
+    def from_file(cls, path: str) -> 'ColorProfile':
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read())
+
+    @property
+    def color_space(self) -> str:
+        """ICC data color space signature, e.g. 'RGB', 'GRAY' or 'CMYK'."""
+        return self.data[16:20].decode('ascii', 'replace').strip()
+
+    def cms_profile(self) -> "ImageCms.ImageCmsProfile":
+        return ImageCms.ImageCmsProfile(io.BytesIO(self.data))
+
+
+_srgb_profile: Optional[ColorProfile] = None
+
+
+def srgb_profile() -> ColorProfile:
+    """Get the built-in sRGB profile."""
+    global _srgb_profile
+    if _srgb_profile is None:
+        _srgb_profile = ColorProfile.from_bytes(
+            ImageCms.ImageCmsProfile(ImageCms.createProfile('sRGB')).tobytes(), 'sRGB')
+    return _srgb_profile
+
+
+def as_profile(profile: Union[None, bytes, ColorProfile]) -> Optional[ColorProfile]:
+    """Wrap raw ICC bytes, e.g. from ``Image.info['icc_profile']``, in a ColorProfile."""
+    if profile is None or isinstance(profile, ColorProfile):
+        return profile
+    return ColorProfile.from_bytes(profile) if profile else None
+
+
+class TransformCache:
+    """LRU cache of built ImageCms transforms, keyed by (source hash, target hash, intent)."""
+
+    def __init__(self, max_entries: int = 16):
+        self.max_entries = max_entries
+        self._transforms: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.build_seconds = 0.0
+
+    def get(self, source: ColorProfile, target: ColorProfile, intent: int = 0) -> "ImageCms.ImageCmsTransform":
+        """Get a transform between RGBA images in two profiles, building it on first use."""
+        key = (source.digest, target.digest, intent)
+        with self._lock:
+            transform = self._transforms.get(key)
+            if transform is not None:
+                self._transforms.move_to_end(key)
+                self.hits += 1
+                return transform
+        start = time.perf_counter()
+        transform = ImageCms.buildTransform(source.cms_profile(), target.cms_profile(), 'RGBA', 'RGBA', intent)
+        elapsed = time.perf_counter() - start
+        logger.debug(f"Built color transform {source.name or source.digest[:8]} -> "
+                     f"{target.name or target.digest[:8]} in {elapsed * 1000:.1f} ms")
+        with self._lock:
+            self.misses += 1
+            self.build_seconds += elapsed
+            self._transforms[key] = transform
+            while len(self._transforms) > self.max_entries:
+                self._transforms.popitem(last=False)
+        return transform
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache usage statistics."""
+        with self._lock:
+            return {
+                'entries': len(self._transforms),
+                'hits': self.hits,
+                'misses': self.misses,
+                'build_seconds': self.build_seconds
+            }
+
+    def clear(self):
+        with self._lock:
+            self._transforms.clear()
+
+
+def apply_transform(transform: "ImageCms.ImageCmsTransform", pixels: np.ndarray) -> np.ndarray:
+    """Transform an h x w x 4 ARGB32 array and get the result as a new array."""
+    image = Image.fromarray(np.ascontiguousarray(pixels[..., [2, 1, 0, 3]]), 'RGBA')
+    ImageCms.applyTransform(image, transform, inPlace=True)
+    return np.asarray(image)[..., [2, 1, 0, 3]]
+
+
+class ColorManager:
+    """Converts images between ICC profiles and the working space.
+
+    ``convert_array`` and ``convert_image`` block until done but spread the
+    work over the pool; ``convert_image_async`` runs the whole conversion in
+    the background and returns a Future.
+    """
+
+    def __init__(self, working_profile: Optional[ColorProfile] = None, intent: str = 'perceptual',
+                 convert_on_load: bool = True, embed_profile: bool = True, workers: int = 0,
+                 cache: Optional[TransformCache] = None):
+        self._working_profile = working_profile
+        self.intent = intent
+        self.convert_on_load = convert_on_load
+        self.embed_profile = embed_profile
+        self.workers = workers or os.cpu_count() or 1
+        self.cache = cache or TransformCache()
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._coordinator: Optional[ThreadPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> 'ColorManager':
+        """Create a manager from the ``color_management`` config section."""
+        working = config.get('working_profile', 'sRGB')
+        profile = None
+        if working and working != 'sRGB':
+            try:
+                profile = ColorProfile.from_file(working)
+            except OSError as e:
+                logger.error(f"Error loading working profile {working}, using sRGB: {e}")
+        return cls(profile, config.get('rendering_intent', 'perceptual'), config.get('convert_on_load', True),
+                   config.get('embed_profile', True), config.get('workers', 0),
+                   TransformCache(config.get('transform_cache_entries', 16)))
+
+    @property
+    def working_profile(self) -> ColorProfile:
+        if self._working_profile is None:
+            self._working_profile = srgb_profile()
+        return self._working_profile
+
+    def transform(self, source: ColorProfile, target: ColorProfile,
+                  intent: Optional[str] = None) -> "ImageCms.ImageCmsTransform":
+        return self.cache.get(source, target, INTENTS[intent or self.intent])
+
+    def needs_conversion(self, source: Optional[ColorProfile], target: Optional[ColorProfile]) -> bool:
+        """Check whether two profiles differ and both describe RGB data."""
+        if source is None or target is None or source.digest == target.digest:
+            return False
+        if source.color_space != 'RGB' or target.color_space != 'RGB':
+            logger.debug(f"Not converting between {source.color_space} and {target.color_space} profiles")
+            return False
+        return True
+
+    def convert_array(self, arr: np.ndarray, source: Union[bytes, ColorProfile],
+                      target: Union[bytes, ColorProfile], intent: Optional[str] = None,
+                      out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Convert an ARGB32 array between profiles, a band of rows per work item.
+
+        Pass ``out=arr`` to convert in place. Returns the converted array,
+        which is ``arr`` itself when nothing needs converting and ``out`` is None.
+        """
+        source, target = as_profile(source), as_profile(target)
+        if not self.needs_conversion(source, target):
+            if out is not None and out is not arr:
+                out[...] = arr
+                return out
+            return arr
+        transform = self.transform(source, target, intent)
+        if out is None:
+            out = np.empty_like(arr)
+
+        def convert_band(y: int):
+            out[y:y + BAND_ROWS] = apply_transform(transform, arr[y:y + BAND_ROWS])
+
+        for future in [self._get_pool().submit(convert_band, y) for y in range(0, arr.shape[0], BAND_ROWS)]:
+            future.result()
+        return out
+
+    def convert_image(self, image: TiledImage, source: Union[bytes, ColorProfile],
+                      target: Union[bytes, ColorProfile], intent: Optional[str] = None,
+                      progress: Optional[Callable[[int, int], None]] = None) -> bool:
+        """
+        Convert a tiled image between profiles in place, tile by tile.
+
+        Workers transform copies of the tiles; results are written back on
+        the calling thread, with a bounded number of tiles in flight.
+        Returns whether anything was converted.
+        """
+        source, target = as_profile(source), as_profile(target)
+        if not self.needs_conversion(source, target):
+            return False
+        transform = self.transform(source, target, intent)
+
+        written, unwritten = [], []
+        for ty in range(image.tiles_y):
+            for tx in range(image.tiles_x):
+                (unwritten if image.uniform_pixel(tx, ty) is not None else written).append((tx, ty))
+        if unwritten:
+            # Tiles never written read as the fill color: convert it once
+            fill = image.uniform_pixel(*unwritten[0])
+            converted = apply_transform(transform, fill.reshape(1, 1, 4)).reshape(4)
+            if np.array_equal(converted, fill):
+                unwritten = []
+
+        total = len(written) + len(unwritten)
+        pool = self._get_pool()
+        pending: Deque[Tuple[Tuple[int, int], Future]] = deque()
+
+        def finish_one():
+            (tx, ty), future = pending.popleft()
+            image.tile_for_write(tx, ty)[:] = future.result()
+
+        done = 0
+        for tx, ty in written:
+            pending.append(((tx, ty), pool.submit(apply_transform, transform, np.array(image.tile(tx, ty)))))
+            if len(pending) >= self.workers * 2:
+                finish_one()
+                done += 1
+                if progress is not None:
+                    progress(done, total)
+        while pending:
+            finish_one()
+            done += 1
+            if progress is not None:
+                progress(done, total)
+        for tx, ty in unwritten:
+            image.tile_for_write(tx, ty)[:] = converted
+            done += 1
+            if progress is not None:
+                progress(done, total)
+        return True
+
+    def convert_image_async(self, image: TiledImage, source: Union[bytes, ColorProfile],
+                            target: Union[bytes, ColorProfile], intent: Optional[str] = None,
+                            progress: Optional[Callable[[int, int], None]] = None) -> Future:
+        """Convert a tiled image in the background; don't edit it until the Future is done."""
+        with self._pool_lock:
+            if self._coordinator is None:
+                self._coordinator = ThreadPoolExecutor(max_workers=1, thread_name_prefix="color-convert")
+        return self._coordinator.submit(self.convert_image, image, source, target, intent, progress)
+
+    def to_working(self, arr: np.ndarray, profile: Union[None, bytes, ColorProfile]) -> bool:
+        """Convert a decoded ARGB32 array from its embedded profile to the working space, in place."""
+        profile = as_profile(profile)
+        if not self.convert_on_load or not self.needs_conversion(profile, self.working_profile):
+            return False
+        self.convert_array(arr, profile, self.working_profile, out=arr)
+        return True
+
+    def image_to_working(self, image: TiledImage, profile: Union[None, bytes, ColorProfile]) -> bool:
+        """Convert a decoded tiled image from its embedded profile to the working space."""
+        profile = as_profile(profile)
+        if not self.convert_on_load:
+            return False
+        return self.convert_image(image, profile, self.working_profile)
+
+    def image_to_working_async(self, image: TiledImage, profile: Union[None, bytes, ColorProfile],
+                               progress: Optional[Callable[[int, int], None]] = None) -> Optional[Future]:
+        """Convert a decoded tiled image to the working space in the background.
+
+        Returns None when nothing needs converting; otherwise a Future whose
+        result tells whether anything was converted.
+        """
+        profile = as_profile(profile)
+        if not self.convert_on_load or not self.needs_conversion(profile, self.working_profile):
+            return None
+        return self.convert_image_async(image, profile, self.working_profile, progress=progress)
+
+    def export_profile(self, profile: Union[None, bytes, ColorProfile] = None) -> Optional[ColorProfile]:
+        """Get the profile to embed in an export: the requested one, else the working space."""
+        profile = as_profile(profile)
+        if profile is not None:
+            return profile
+        return self.working_profile if self.embed_profile else None
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="color-transform")
+            return self._pool
+
+    def shutdown(self):
+        """Finish pending conversions and stop the workers."""
+        with self._pool_lock:
+            coordinator, pool = self._coordinator, self._pool
+            self._coordinator = self._pool = None
+        if coordinator is not None:
+            coordinator.shutdown(wait=True)
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+
+_color_manager: Optional[ColorManager] = None
+
+
+def get_color_manager() -> ColorManager:
+    """Get the application-wide color manager configured from ``color_management``."""
+    global _color_manager
+    if _color_manager is None:
+        _color_manager = ColorManager.from_config(load_config().get('color_management', {}))
+    return _color_manager
@@ -0,0 +1,357 @@
+"""
+Color space conversion for PixelCrafterX.
+Converts whole pixel arrays between sRGB, linear RGB, HSV, HSL, CIE Lab, OKLab and YCbCr.
+
+Arrays are ... x 3 (or ... x 4 with alpha, which passes through) in RGB
+channel order, or BGR with ``order='bgr'`` for canonical image buffers.
+RGB, linear RGB and YCbCr accept and produce uint8 (0-255) or float
+(0-1); the other spaces are float32 only:
+
+    hsv, hsl   hue in degrees [0, 360), saturation/value/lightness in [0, 1]
+    lab        L in [0, 100], a and b roughly in [-128, 128], D65 white
+    oklab      L in [0, 1], a and b roughly in [-0.4, 0.4]
+    ycbcr      BT.601 full range, Cb and Cr centred on 0.5
+
+Work is done in float32 over chunks of ``chunk_pixels`` pixels, so
+temporary memory stays bounded whatever the image size. Passing the
+input as ``out`` converts in place.
+"""
+
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+SPACES = ('rgb', 'linear', 'hsv', 'hsl', 'lab', 'oklab', 'ycbcr')
+# Spaces whose values fit 0-255 and so may be stored as uint8
+BYTE_SPACES = ('rgb', 'linear', 'ycbcr')
+DEFAULT_CHUNK_PIXELS = 1 << 18
+
+# sRGB primaries with D65 white
+RGB_TO_XYZ = np.array([[0.4124564, 0.3575761, 0.1804375],
+                       [0.2126729, 0.7151522, 0.0721750],
+                       [0.0193339, 0.1191920, 0.9503041]], dtype=np.float32)
+XYZ_TO_RGB = np.linalg.inv(RGB_TO_XYZ).astype(np.float32)
+D65_WHITE = np.array([0.95047, 1.0, 1.08883], dtype=np.float32)
+LAB_EPSILON = 216 / 24389
+LAB_KAPPA = 24389 / 27
+
+# OKLab, from Björn Ottosson's reference implementation
+LINEAR_TO_LMS = np.array([[0.4122214708, 0.5363325363, 0.0514459929],
+                          [0.2119034982, 0.6806995451, 0.1073969566],
+                          [0.0883024619, 0.2817188376, 0.6299787005]], dtype=np.float32)
+LMS_TO_OKLAB = np.array([[0.2104542553, 0.7936177850, -0.0040720468],
+                         [1.9779984951, -2.4285922050, 0.4505937099],
+                         [0.0259040371, 0.7827717662, -0.8086757660]], dtype=np.float32)
+OKLAB_TO_LMS = np.array([[1.0, 0.3963377774, 0.2158037573],
+                         [1.0, -0.1055613458, -0.0638541728],
+                         [1.0, -0.0894841775, -1.2914855480]], dtype=np.float32)
+LMS_TO_LINEAR = np.array([[4.0767416621, -3.3077115913, 0.2309699292],
+                          [-1.2684380046, 2.6097574011, -0.3413193965],
+                          [-0.0041960863, -0.7034186147, 1.7076147010]], dtype=np.float32)
+
+# BT.601 full range (JPEG)
+RGB_TO_YCBCR = np.array([[0.299, 0.587, 0.114],
+                         [-0.168736, -0.331264, 0.5],
+                         [0.5, -0.418688, -0.081312]], dtype=np.float32)
+YCBCR_TO_RGB = np.linalg.inv(RGB_TO_YCBCR).astype(np.float32)
+CHROMA_OFFSET = np.array([0.0, 0.5, 0.5], dtype=np.float32)
+
+Kernel = Callable[[np.ndarray], np.ndarray]
+
+
+def _srgb_to_linear(rgb: np.ndarray) -> np.ndarray:
+    low = rgb * np.float32(1 / 12.92)
+    high = ((np.maximum(rgb, 0) + np.float32(0.055)) * np.float32(1 / 1.055)) ** np.float32(2.4)
+    return np.where(rgb <= 0.04045, low, high)
+
+
+def _linear_to_srgb(linear: np.ndarray) -> np.ndarray:
+    low = linear * np.float32(12.92)
+    high = np.float32(1.055) * np.maximum(linear, 0) ** np.float32(1 / 2.4) - np.float32(0.055)
+    return np.where(linear <= 0.0031308, low, high)
+
+
+# 8-bit shortcuts: decoding is a table lookup, encoding indexes a 16-bit quantization
+SRGB_TO_LINEAR_U8 = _srgb_to_linear(np.arange(256, dtype=np.float32) / 255)
+LINEAR_TO_SRGB_U16 = np.clip(_linear_to_srgb(np.arange(65536, dtype=np.float32) / 65535) * 255 + 0.5,
+                             0, 255).astype(np.uint8)
+
+
+def _hue_ramp(hue: np.ndarray, offset: float, period: float) -> np.ndarray:
+    """Position of one RGB channel along the hue circle, ``period`` steps per turn."""
+    return np.mod(offset + hue * np.float32(period / 360), period)
+
+
+def _hue(rgb: np.ndarray, maxc: np.ndarray, delta: np.ndarray) -> np.ndarray:
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    safe = np.where(delta > 0, delta, 1)
+    hue = np.where(maxc == r, (g - b) / safe, np.where(maxc == g, 2 + (b - r) / safe, 4 + (r - g) / safe))
+    hue = np.mod(hue * 60, 360)
+    hue[delta == 0] = 0
+    return hue
+
+
+def _rgb_to_hsv(rgb: np.ndarray) -> np.ndarray:
+    maxc = rgb.max(axis=-1)
+    delta = maxc - rgb.min(axis=-1)
+    saturation = np.divide(delta, maxc, out=np.zeros_like(maxc), where=maxc > 0)
+    return np.stack([_hue(rgb, maxc, delta), saturation, maxc], axis=-1)
+
+
+def _hsv_to_rgb(hsv: np.ndarray) -> np.ndarray:
+    hue = hsv[..., 0]
+    saturation = np.clip(hsv[..., 1], 0, 1)
+    value = np.clip(hsv[..., 2], 0, 1)
+    chroma = value * saturation
+    channels = []
+    for offset in (5, 3, 1):
+        k = _hue_ramp(hue, offset, 6)
+        channels.append(value - chroma * np.clip(np.minimum(k, 4 - k), 0, 1))
+    return np.stack(channels, axis=-1)
+
+
+def _rgb_to_hsl(rgb: np.ndarray) -> np.ndarray:
+    maxc = rgb.max(axis=-1)
+    minc = rgb.min(axis=-1)
+    delta = maxc - minc
+    lightness = (maxc + minc) / 2
+    scale = 1 - np.abs(2 * lightness - 1)
+    saturation = np.divide(delta, scale, out=np.zeros_like(delta), where=(delta > 0) & (scale > 0))
+    return np.stack([_hue(rgb, maxc, delta), saturation, lightness], axis=-1)
+
+
+def _hsl_to_rgb(hsl: np.ndarray) -> np.ndarray:
+    hue = hsl[..., 0]
+    saturation = np.clip(hsl[..., 1], 0, 1)
+    lightness = np.clip(hsl[..., 2], 0, 1)
+    amplitude = saturation * np.minimum(lightness, 1 - lightness)
+    channels = []
+    for offset in (0, 8, 4):
+        k = _hue_ramp(hue, offset, 12)
+        channels.append(lightness - amplitude * np.clip(np.minimum(k - 3, 9 - k), -1, 1))
+    return np.stack(channels, axis=-1)
+
+
+def _lab_f(t: np.ndarray) -> np.ndarray:
+    return np.where(t > LAB_EPSILON, np.cbrt(t), (LAB_KAPPA * t + 16) / 116)
+
+
+def _lab_f_inverse(f: np.ndarray) -> np.ndarray:
+    cube = f ** 3
+    return np.where(cube > LAB_EPSILON, cube, (116 * f - 16) / LAB_KAPPA)
+
+
+def _linear_to_lab(linear: np.ndarray) -> np.ndarray:
+    f = _lab_f((linear @ RGB_TO_XYZ.T) / D65_WHITE)
+    fx, fy, fz = f[..., 0], f[..., 1], f[..., 2]
+    return np.stack([116 * fy - 16, 500 * (fx - fy), 200 * (fy - fz)], axis=-1)
+
+
+def _lab_to_linear(lab: np.ndarray) -> np.ndarray:
+    fy = (lab[..., 0] + 16) / 116
+    f = np.stack([fy + lab[..., 1] / 500, fy, fy - lab[..., 2] / 200], axis=-1)
+    return (_lab_f_inverse(f) * D65_WHITE) @ XYZ_TO_RGB.T
+
+
+def _linear_to_oklab(linear: np.ndarray) -> np.ndarray:
+    return np.cbrt(linear @ LINEAR_TO_LMS.T) @ LMS_TO_OKLAB.T
+
+
+def _oklab_to_linear(oklab: np.ndarray) -> np.ndarray:
+    return ((oklab @ OKLAB_TO_LMS.T) ** 3) @ LMS_TO_LINEAR.T
+
+
+def _rgb_to_ycbcr(rgb: np.ndarray) -> np.ndarray:
+    return rgb @ RGB_TO_YCBCR.T + CHROMA_OFFSET
+
+
+def _ycbcr_to_rgb(ycbcr: np.ndarray) -> np.ndarray:
+    return (ycbcr - CHROMA_OFFSET) @ YCBCR_TO_RGB.T
+
+
+# Each space converts to and from one hub: gamma-encoded sRGB or linear RGB
+_TO_HUB: Dict[str, Tuple[Optional[Kernel], str]] = {
+    'rgb': (None, 'rgb'), 'linear': (None, 'linear'),
+    'hsv': (_hsv_to_rgb, 'rgb'), 'hsl': (_hsl_to_rgb, 'rgb'), 'ycbcr': (_ycbcr_to_rgb, 'rgb'),
+    'lab': (_lab_to_linear, 'linear'), 'oklab': (_oklab_to_linear, 'linear')
+}
+_FROM_HUB: Dict[str, Tuple[Optional[Kernel], str]] = {
+    'rgb': (None, 'rgb'), 'linear': (None, 'linear'),
+    'hsv': (_rgb_to_hsv, 'rgb'), 'hsl': (_rgb_to_hsl, 'rgb'), 'ycbcr': (_rgb_to_ycbcr, 'rgb'),
+    'lab': (_linear_to_lab, 'linear'), 'oklab': (_linear_to_oklab, 'linear')
+}
+
+
+def map_pixels(pixels: np.ndarray, kernel: Kernel, out: Optional[np.ndarray] = None,
+               dtype: Optional[np.dtype] = None, order: str = 'rgb', decode: Optional[np.ndarray] = None,
+               encode: Optional[np.ndarray] = None,
+               chunk_pixels: int = DEFAULT_CHUNK_PIXELS) -> np.ndarray:
+    """
+    Apply a float32 kernel to the color channels of a pixel array, chunk by chunk.
+
+    Args:
+        pixels: ... x 3 or ... x 4 array, uint8 or float
+        kernel: Maps an N x 3 float32 array to an N x 3 array
+        out: Array to write to, possibly ``pixels`` itself; allocated if None
+        dtype: Output dtype when ``out`` is None; defaults to the input's
+        order: 'rgb', or 'bgr' to reverse the color channels on both sides
+        decode: 256-entry float table replacing the /255 scaling of uint8 input
+        encode: 65536-entry uint8 table replacing the rounding to uint8 output
+        chunk_pixels: Pixels converted per step
+
+    Returns:
+        The output array
+    """
+    channels = pixels.shape[-1]
+    if channels not in (3, 4):
+        raise ValueError(f"Expected 3 or 4 channels, got {channels}")
+    if out is None:
+        out = np.empty(pixels.shape, dtype=dtype or pixels.dtype)
+    elif out.shape != pixels.shape:
+        raise ValueError(f"Output shape {out.shape} does not match input shape {pixels.shape}")
+    elif not out.flags.c_contiguous:
+        raise ValueError("Output array must be C-contiguous")
+
+    source = pixels.reshape(-1, channels)
+    target = out.reshape(-1, channels)
+    color = [2, 1, 0] if order == 'bgr' else [0, 1, 2]
+    in_bytes = pixels.dtype == np.uint8
+    out_bytes = out.dtype == np.uint8
+    for start in range(0, source.shape[0], chunk_pixels):
+        chunk = source[start:start + chunk_pixels]
+        values = chunk[:, color]
+        if in_bytes:
+            values = decode[values] if decode is not None else values.astype(np.float32) * np.float32(1 / 255)
+        else:
+            values = values.astype(np.float32, copy=False)
+        alpha = chunk[:, 3].copy() if channels == 4 else None
+
+        result = kernel(values)
+        if out_bytes:
+            if encode is not None:
+                result = encode[(np.clip(result, 0, 1) * 65535 + 0.5).astype(np.uint16)]
+            else:
+                result = np.clip(result * 255 + 0.5, 0, 255).astype(np.uint8)
+        target[start:start + chunk_pixels, color] = result
+        if alpha is not None:
+            if in_bytes == out_bytes:
+                target[start:start + chunk_pixels, 3] = alpha
+            elif out_bytes:
+                target[start:start + chunk_pixels, 3] = np.clip(alpha * 255 + 0.5, 0, 255).astype(np.uint8)
+            else:
+                target[start:start + chunk_pixels, 3] = alpha * np.float32(1 / 255)
+    return out
+
+
+def convert(pixels: np.ndarray, src: str, dst: str, out: Optional[np.ndarray] = None,
+            dtype: Optional[np.dtype] = None, order: str = 'rgb',
+            chunk_pixels: int = DEFAULT_CHUNK_PIXELS) -> np.ndarray:
+    """
+    Convert a pixel array from one color space to another.
+
+    Output is uint8 for uint8 input when ``dst`` is 'rgb' or 'ycbcr', and
+    float32 otherwise, unless ``dtype`` or ``out`` says different.
+    """
+    for space in (src, dst):
+        if space not in SPACES:
+            raise ValueError(f"Unknown color space '{space}', expected one of {', '.join(SPACES)}")
+    if pixels.dtype == np.uint8 and src not in BYTE_SPACES:
+        raise ValueError(f"'{src}' values do not fit in uint8")
+    if dtype is None and out is None:
+        dtype = np.uint8 if pixels.dtype == np.uint8 and dst in ('rgb', 'ycbcr') else np.float32
+    out_dtype = out.dtype if out is not None else np.dtype(dtype)
+    if out_dtype == np.uint8 and dst not in BYTE_SPACES:
+        raise ValueError(f"'{dst}' values do not fit in uint8")
+
+    to_hub, src_hub = _TO_HUB[src]
+    from_hub, dst_hub = _FROM_HUB[dst]
+    decode = encode = None
+    steps = [to_hub] if to_hub else []
+    if src_hub != dst_hub:
+        if src == 'rgb' and pixels.dtype == np.uint8:
+            decode = SRGB_TO_LINEAR_U8
+        elif dst == 'rgb' and out_dtype == np.uint8:
+            encode = LINEAR_TO_SRGB_U16
+        else:
+            steps.append(_srgb_to_linear if dst_hub == 'linear' else _linear_to_srgb)
+    if from_hub:
+        steps.append(from_hub)
+
+    def kernel(values: np.ndarray) -> np.ndarray:
+        for step in steps:
+            values = step(values)
+        return values
+
+    return map_pixels(pixels, kernel, out, dtype, order, decode, encode, chunk_pixels)
+
+
+def srgb_to_linear(pixels: np.ndarray, out: Optional[np.ndarray] = None, **kwargs) -> np.ndarray:
+    return convert(pixels, 'rgb', 'linear', out, **kwargs)
+
+
+def linear_to_srgb(pixels: np.ndarray, out: Optional[np.ndarray] = None, **kwargs) -> np.ndarray:
+    return convert(pixels, 'linear', 'rgb', out, **kwargs)
+
+
+def rgb_to_hsv(pixels: np.ndarray, out: Optional[np.ndarray] = None, **kwargs) -> np.ndarray:
+    return convert(pixels, 'rgb', 'hsv', out, **kwargs)
+
+
+def hsv_to_rgb(pixels: np.ndarray, out: Optional[np.ndarray] = None, **kwargs) -> np.ndarray:
+    return convert(pixels, 'hsv', 'rgb', out, **kwargs)
+
+
+def rgb_to_hsl(pixels: np.ndarray, out: Optional[np.ndarray] = None, **kwargs) -> np.ndarray:
+    return convert(pixels, 'rgb', 'hsl', out, **kwargs)
+
+
+def hsl_to_rgb(pixels: np.ndarray, out: Optional[np.ndarray] = None, **kwargs) -> np.ndarray:
+    return convert(pixels, 'hsl', 'rgb', out, **kwargs)
+
+
+def rgb_to_lab(pixels: np.ndarray, out: Optional[np.ndarray] = None, **kwargs) -> np.ndarray:
+    return convert(pixels, 'rgb', 'lab', out, **kwargs)
+
+
+def lab_to_rgb(pixels: np.ndarray, out: Optional[np.ndarray] = None, **kwargs) -> np.ndarray:
+    return convert(pixels, 'lab', 'rgb', out, **kwargs)
+
+
+def rgb_to_oklab(pixels: np.ndarray, out: Optional[np.ndarray] = None, **kwargs) -> np.ndarray:
+    return convert(pixels, 'rgb', 'oklab', out, **kwargs)
+
+
+def oklab_to_rgb(pixels: np.ndarray, out: Optional[np.ndarray] = None, **kwargs) -> np.ndarray:
+    return convert(pixels, 'oklab', 'rgb', out, **kwargs)
+
+
+def rgb_to_ycbcr(pixels: np.ndarray, out: Optional[np.ndarray] = None, **kwargs) -> np.ndarray:
+    return convert(pixels, 'rgb', 'ycbcr', out, **kwargs)
+
+
+def ycbcr_to_rgb(pixels: np.ndarray, out: Optional[np.ndarray] = None, **kwargs) -> np.ndarray:
+    return convert(pixels, 'ycbcr', 'rgb', out, **kwargs)
+
+
+def adjust_saturation(pixels: np.ndarray, factor: float, out: Optional[np.ndarray] = None,
+                      **kwargs) -> np.ndarray:
+    """Scale HSV saturation by ``1 + factor`` over an RGB pixel array."""
+    def kernel(rgb: np.ndarray) -> np.ndarray:
+        hsv = _rgb_to_hsv(rgb)
+        hsv[:, 1] = np.clip(hsv[:, 1] * np.float32(1 + factor), 0, 1)
+        return _hsv_to_rgb(hsv)
+
+    return map_pixels(pixels, kernel, out, **kwargs)
+
+
+def adjust_brightness(pixels: np.ndarray, factor: float, out: Optional[np.ndarray] = None,
+                      **kwargs) -> np.ndarray:
+    """Move RGB pixels towards white (factor > 0) or black (factor < 0), with factor in [-1, 1]."""
+    factor = np.float32(max(-1.0, min(1.0, factor)))
+
+    def kernel(rgb: np.ndarray) -> np.ndarray:
+        if factor > 0:
+            return rgb + (1 - rgb) * factor
+        return rgb * (1 + factor)
+
+    return map_pixels(pixels, kernel, out, **kwargs)
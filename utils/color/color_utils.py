@@ -8,6 +8,8 @@ from typing import Dict, List, Tuple, Union
 from dataclasses import dataclass
 from PyQt6.QtGui import QColor
 
+from utils.color import color_space
+
 @dataclass
 class Color:
     r: int
@@ -46,61 +48,25 @@ class Color:
         """Convert to QColor."""
         return QColor(self.r, self.g, self.b, self.a)
         
-    def to_hsv(self) -> Tuple[float, float, float]:
-        """Convert to HSV."""
-        r, g, b = self.r / 255.0, self.g / 255.0, self.b / 255.0
-        max_val = max(r, g, b)
-        min_val = min(r, g, b)
-        delta = max_val - min_val
+    def to_array(self) -> np.ndarray:
+        """Get the color as a uint8 RGBA array, for the array functions in color_space."""
+        return np.array([self.r, self.g, self.b, self.a], dtype=np.uint8)
         
-        h = 0.0
-        s = 0.0 if max_val == 0 else delta / max_val
-        v = max_val
+    @classmethod
+    def from_array(cls, rgba: np.ndarray) -> 'Color':
+        """Create a Color from a uint8 RGB or RGBA array."""
+        return cls(*(int(v) for v in rgba[:4]))
         
-        if delta != 0:
-            if max_val == r:
-                h = (g - b) / delta
-            elif max_val == g:
-                h = 2 + (b - r) / delta
-            else:
-                h = 4 + (r - g) / delta
-                
-            h *= 60
-            if h < 0:
-                h += 360
-                
-        return h, s, v
+    def to_hsv(self) -> Tuple[float, float, float]:
+        """Convert to HSV."""
+        h, s, v = color_space.rgb_to_hsv(self.to_array()[:3])
+        return float(h), float(s), float(v)
         
     @classmethod
     def from_hsv(cls, h: float, s: float, v: float, a: int = 255) -> 'Color':
         """Create a Color from HSV."""
-        h = h % 360
-        s = max(0, min(1, s))
-        v = max(0, min(1, v))
-        
-        c = v * s
-        x = c * (1 - abs((h / 60) % 2 - 1))
-        m = v - c
-        
-        if 0 <= h < 60:
-            r, g, b = c, x, 0
-        elif 60 <= h < 120:
-            r, g, b = x, c, 0
-        elif 120 <= h < 180:
-            r, g, b = 0, c, x
-        elif 180 <= h < 240:
-            r, g, b = 0, x, c
-        elif 240 <= h < 300:
-            r, g, b = x, 0, c
-        else:
-            r, g, b = c, 0, x
-            
-        return cls(
-            int((r + m) * 255),
-            int((g + m) * 255),
-            int((b + m) * 255),
-            a
-        )
+        rgb = color_space.hsv_to_rgb(np.array([h, s, v], dtype=np.float32), dtype=np.uint8)
+        return cls(int(rgb[0]), int(rgb[1]), int(rgb[2]), a)
 
 class ColorUtils:
     @staticmethod
@@ -117,28 +83,12 @@ class ColorUtils:
     @staticmethod
     def adjust_brightness(color: Color, factor: float) -> Color:
         """Adjust color brightness."""
-        factor = max(-1, min(1, factor))
-        if factor > 0:
-            return Color(
-                int(color.r + (255 - color.r) * factor),
-                int(color.g + (255 - color.g) * factor),
-                int(color.b + (255 - color.b) * factor),
-                color.a
-            )
-        else:
-            return Color(
-                int(color.r * (1 + factor)),
-                int(color.g * (1 + factor)),
-                int(color.b * (1 + factor)),
-                color.a
-            )
+        return Color.from_array(color_space.adjust_brightness(color.to_array(), factor))
             
     @staticmethod
     def adjust_saturation(color: Color, factor: float) -> Color:
         """Adjust color saturation."""
-        h, s, v = color.to_hsv()
-        s = max(0, min(1, s * (1 + factor)))
-        return Color.from_hsv(h, s, v, color.a)
+        return Color.from_array(color_space.adjust_saturation(color.to_array(), factor))
         
     @staticmethod
     def get_complementary(color: Color) -> Color:
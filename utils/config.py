@@ -4,10 +4,13 @@ Handles loading, saving, and validating application settings.
 """
 import os
 import json
-import yaml
 from pathlib import Path
 from typing import Dict, Any, Optional
 
+from utils.lazy_import import lazy_import
+
+yaml = lazy_import("yaml")
+
 # Default configuration
 default_config = {
     "app": {
@@ -32,8 +35,52 @@ default_config = {
     "performance": {
         "use_gpu": True,
         "gpu_backend": "auto",  # 'auto', 'opengl', 'vulkan', 'software'
-        "cache_size_mb": 1024,
+        "cache_size_mb": 1024,  # budget for resident layer tiles
+        "display_cache_mb": 256,  # budget for cached zoom levels of the canvas
+        "adjustment_cache_mb": 256,  # budget for cached adjustment layer tiles
+        "show_repaints": False,  # outline repainted canvas regions with frame times
+        "stroke_compaction": True,  # bake older canvas items into raster tiles
+        "live_item_limit": 64,  # vector items per layer before compaction
+        "scratch_dir": "",  # '' = system temp dir
         "threads": 0,  # 0 = auto
+        "inference_workers": 0,  # concurrent AI tiles, 0 = auto
+        "inference_cache_mb": 256,  # cached AI tile results
+        "inference_memory_mb": 1024,  # cap for auto-tuned AI batch sizes
+        "inference_autotune": True,  # tune AI batch sizes on first use
+        "plugin_sandbox": False,  # run plugin filters in worker processes
+        "plugin_workers": 2,  # warm sandbox worker processes
+        "plugin_timeout": 30.0,  # seconds before a sandboxed filter is killed
+        "plugin_profiling": True,  # time plugin initialize, event handlers and filters
+        "plugin_event_budget_ms": 16.0,  # per-event handler budget, None = unlimited
+        "plugin_budget_action": "warn",  # 'warn' or 'disable' handlers over budget
+        "plugin_track_memory": False,  # record memory deltas (slows allocations)
+    },
+    "color_management": {
+        "working_profile": "sRGB",  # 'sRGB' or the path of an RGB ICC profile
+        "rendering_intent": "perceptual",  # 'perceptual', 'relative', 'saturation', 'absolute'
+        "convert_on_load": True,  # convert images with embedded profiles to the working space
+        "embed_profile": True,  # attach the working (or requested) profile on export
+        "transform_cache_entries": 16,  # built transforms kept for reuse
+        "workers": 0,  # 0 = one per CPU
+    },
+    "luts": {
+        "size": 33,  # lattice points per axis of baked adjustment LUTs
+        "interpolation": "tetrahedral",  # 'tetrahedral' or 'trilinear'
+        "cache_entries": 32,  # baked LUTs kept for reuse
+        "workers": 0,  # 0 = one per CPU
+    },
+    "export": {
+        # Rendered together by "Export All Presets"; scale is relative to the document
+        "presets": [
+            {"name": "3x", "suffix": "@3x", "scale": 1.0},
+            {"name": "2x", "suffix": "@2x", "scale": 0.6667},
+            {"name": "1x", "suffix": "", "scale": 0.3333},
+            {"name": "thumbnail-512", "suffix": "_512", "max_size": [512, 512]},
+            {"name": "thumbnail-256", "suffix": "_256", "max_size": [256, 256]},
+            {"name": "thumbnail-128", "suffix": "_128", "max_size": [128, 128]},
+            {"name": "preview", "suffix": "_preview", "max_size": [1024, 1024],
+             "format": "JPEG", "options": {"jpeg_quality": 85, "jpeg_progressive": True}},
+        ],
     },
     "tools": {
         "brush": {
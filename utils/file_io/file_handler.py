@@ -4,13 +4,21 @@ Handles file operations, formats, and metadata.
 """
 
 import os
-from pathlib import Path
 from typing import Dict, List, Optional, Tuple, Any
-from PIL import Image, ExifTags
 import json
-import numpy as np
 from PyQt6.QtGui import QImage
 
+from core.layers.tile_store import TiledImage
+from utils.color.color_management import as_profile, get_color_manager
+from utils.file_io.image_loader import ImageLoader
+from utils.file_io.export_presets import ExportPreset, get_presets, render_presets
+from utils.file_io.image_exporter import ExportOptions, ExportResult, encode_array
+from utils.image.image_buffer import array_to_qimage, qimage_to_array
+from utils.lazy_import import lazy_import
+
+Image = lazy_import("PIL.Image")
+ExifTags = lazy_import("PIL.ExifTags")
+
 class FileHandler:
     SUPPORTED_FORMATS = {
         'image': ['.png', '.jpg', '.jpeg', '.bmp', '.tiff', '.webp'],
@@ -21,19 +29,21 @@ class FileHandler:
     def __init__(self):
         self.recent_files: List[str] = []
         self.max_recent_files = 10
+        self.loader = ImageLoader()
+        self.color_manager = get_color_manager()
+        self.last_export: Optional[ExportResult] = None
         
-    def load_image(self, file_path: str) -> Tuple[Optional[QImage], Dict[str, Any]]:
-        """Load an image file and its metadata."""
+    def load_image(self, file_path: str,
+                   preview_size: Optional[Tuple[int, int]] = None) -> Tuple[Optional[QImage], Dict[str, Any]]:
+        """Load an image file and its metadata; colors are converted before it returns."""
         try:
-            # Load image using PIL for metadata
-            pil_image = Image.open(file_path)
-            metadata = self._extract_metadata(pil_image)
-            
-            # Convert to QImage
-            if pil_image.mode == 'RGBA':
-                qimage = QImage(pil_image.tobytes(), pil_image.width, pil_image.height, QImage.Format.Format_RGBA8888)
-            else:
-                qimage = QImage(pil_image.tobytes(), pil_image.width, pil_image.height, QImage.Format.Format_RGB888)
+            with Image.open(file_path) as pil_image:
+                metadata = self._extract_metadata(pil_image)
+                arr, stats = self.loader.decode_to_array(pil_image, file_path, preview_size)
+            metadata['decode'] = stats.as_dict()
+            # Bring embedded-profile pixels into the working space before anything composites them
+            metadata['color_converted'] = self.color_manager.to_working(arr, metadata['icc_profile'])
+            qimage = array_to_qimage(arr)
                 
             # Add to recent files
             self._add_recent_file(file_path)
@@ -43,19 +53,46 @@ class FileHandler:
             print(f"Error loading image {file_path}: {e}")
             return None, {}
             
-    def save_image(self, image: QImage, file_path: str, format: str = 'PNG', quality: int = 95) -> bool:
-        """Save an image to file."""
+    def load_layer_image(self, file_path: str, preview_size: Optional[Tuple[int, int]] = None,
+                         convert_async: bool = False) -> Tuple[Optional[TiledImage], Dict[str, Any]]:
+        """Load an image file directly into a tiled layer buffer.
+        
+        With ``convert_async`` the conversion to the working space runs in the
+        background: ``metadata['color_conversion']`` holds its Future, or None
+        if nothing needs converting, and the image must not be used before
+        the Future is done.
+        """
         try:
-            # Convert QImage to PIL Image
-            width = image.width()
-            height = image.height()
-            ptr = image.bits()
-            ptr.setsize(height * width * 4)
-            arr = np.frombuffer(ptr, np.uint8).reshape((height, width, 4))
-            pil_image = Image.fromarray(arr)
+            with Image.open(file_path) as pil_image:
+                metadata = self._extract_metadata(pil_image)
+                image, stats = self.loader.decode_to_tiles(pil_image, file_path, preview_size)
+            metadata['decode'] = stats.as_dict()
+            if convert_async:
+                conversion = self.color_manager.image_to_working_async(image, metadata['icc_profile'])
+                metadata['color_conversion'] = conversion
+                metadata['color_converted'] = conversion is not None
+            else:
+                metadata['color_converted'] = self.color_manager.image_to_working(image, metadata['icc_profile'])
             
-            # Save image
-            pil_image.save(file_path, format=format, quality=quality)
+            # Add to recent files
+            self._add_recent_file(file_path)
+            
+            return image, metadata
+        except Exception as e:
+            print(f"Error loading image {file_path}: {e}")
+            return None, {}
+            
+    def save_image(self, image: QImage, file_path: str, format: Optional[str] = None, quality: int = 95,
+                   options: Optional[ExportOptions] = None) -> bool:
+        """Save an image to file."""
+        try:
+            if options is None:
+                options = ExportOptions.for_path(file_path, jpeg_quality=quality, webp_quality=quality)
+                if format:
+                    options.format = format.upper()
+                    
+            # Encode with only the options that apply to the target format
+            self.last_export = encode_array(qimage_to_array(image, copy=False), file_path, options)
             
             # Add to recent files
             self._add_recent_file(file_path)
@@ -65,6 +102,16 @@ class FileHandler:
             print(f"Error saving image {file_path}: {e}")
             return False
             
+    def export_presets(self, image: QImage, base_path: str,
+                       presets: Optional[List[ExportPreset]] = None) -> List[ExportResult]:
+        """Export an image at every preset size and format in one pass."""
+        try:
+            presets = get_presets() if presets is None else presets
+            return render_presets(qimage_to_array(image, copy=False), base_path, presets)
+        except Exception as e:
+            print(f"Error exporting presets for {base_path}: {e}")
+            return []
+            
     def load_project(self, file_path: str) -> Optional[Dict[str, Any]]:
         """Load a project file."""
         try:
@@ -93,14 +140,17 @@ class FileHandler:
             print(f"Error saving project {file_path}: {e}")
             return False
             
-    def _extract_metadata(self, image: Image.Image) -> Dict[str, Any]:
+    def _extract_metadata(self, image: "Image.Image") -> Dict[str, Any]:
         """Extract metadata from an image."""
         metadata = {
             'format': image.format,
             'mode': image.mode,
             'size': image.size,
-            'dpi': image.info.get('dpi', (72, 72))
+            'dpi': image.info.get('dpi', (72, 72)),
+            'icc_profile': image.info.get('icc_profile') or None
         }
+        if metadata['icc_profile']:
+            metadata['color_profile'] = as_profile(metadata['icc_profile']).name
         
         # Extract EXIF data
         exif_data = {}
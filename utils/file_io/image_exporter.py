@@ -0,0 +1,314 @@
+"""
+Image export for PixelCrafterX.
+Encodes flattened images with per-format options, off the UI thread.
+"""
+
+import io
+import itertools
+import logging
+import os
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+from PyQt6.QtCore import QObject, pyqtSignal
+
+from utils.color.color_management import get_color_manager
+from utils.lazy_import import lazy_import
+
+Image = lazy_import("PIL.Image")
+
+logger = logging.getLogger(__name__)
+
+# zlib strategies accepted by Pillow's PNG encoder as ``compress_type``
+PNG_STRATEGIES = {
+    'default': 0,
+    'filtered': 1,
+    'huffman_only': 2,
+    'rle': 3,
+    'fixed': 4,
+}
+
+JPEG_SUBSAMPLING = {
+    '4:4:4': 0,
+    '4:2:2': 1,
+    '4:2:0': 2,
+}
+
+TIFF_COMPRESSIONS = ('raw', 'tiff_lzw', 'tiff_adobe_deflate', 'packbits', 'jpeg', 'zstd')
+
+EXTENSION_FORMATS = {
+    '.png': 'PNG',
+    '.jpg': 'JPEG',
+    '.jpeg': 'JPEG',
+    '.webp': 'WEBP',
+    '.tif': 'TIFF',
+    '.tiff': 'TIFF',
+    '.bmp': 'BMP',
+}
+
+# Formats that cannot store an alpha channel
+OPAQUE_FORMATS = ('JPEG', 'BMP')
+
+# Formats that can embed an ICC profile
+ICC_FORMATS = ('PNG', 'JPEG', 'WEBP', 'TIFF')
+
+
+@dataclass
+class ExportOptions:
+    """Encoder settings for a single export."""
+    format: str = 'PNG'
+    # PNG
+    png_compress_level: int = 6
+    png_strategy: str = 'default'
+    png_optimize: bool = False
+    # JPEG
+    jpeg_quality: int = 95
+    jpeg_progressive: bool = False
+    jpeg_optimize: bool = False
+    jpeg_subsampling: str = '4:2:0'
+    # WebP
+    webp_lossless: bool = False
+    webp_quality: int = 90
+    webp_method: int = 4
+    # TIFF
+    tiff_compression: str = 'tiff_lzw'
+    # Common
+    dpi: Optional[Tuple[int, int]] = None
+    icc_profile: Optional[bytes] = None  # convert to and embed this profile; None = the working space
+    embed_profile: bool = True
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+    @classmethod
+    def for_path(cls, file_path: str, **kwargs) -> 'ExportOptions':
+        """Create options with the format inferred from the file extension."""
+        ext = os.path.splitext(file_path)[1].lower()
+        return cls(format=EXTENSION_FORMATS.get(ext, 'PNG'), **kwargs)
+
+    def to_save_kwargs(self) -> Dict[str, Any]:
+        """Get the Pillow ``save`` arguments for the chosen format only."""
+        fmt = self.format.upper()
+        if fmt == 'PNG':
+            kwargs = {
+                'compress_level': self.png_compress_level,
+                'compress_type': PNG_STRATEGIES[self.png_strategy],
+                'optimize': self.png_optimize
+            }
+        elif fmt == 'JPEG':
+            kwargs = {
+                'quality': self.jpeg_quality,
+                'progressive': self.jpeg_progressive,
+                'optimize': self.jpeg_optimize,
+                'subsampling': JPEG_SUBSAMPLING[self.jpeg_subsampling]
+            }
+        elif fmt == 'WEBP':
+            kwargs = {
+                'lossless': self.webp_lossless,
+                'quality': self.webp_quality,
+                'method': self.webp_method
+            }
+        elif fmt == 'TIFF':
+            if self.tiff_compression not in TIFF_COMPRESSIONS:
+                raise ValueError(f"Unsupported TIFF compression: {self.tiff_compression}")
+            kwargs = {'compression': self.tiff_compression}
+        else:
+            kwargs = {}
+        if self.dpi is not None:
+            kwargs['dpi'] = self.dpi
+        kwargs.update(self.extra)
+        return kwargs
+
+
+@dataclass
+class ExportResult:
+    """Outcome and timing of an export."""
+    path: str
+    width: int
+    height: int
+    bytes_written: int
+    flatten_seconds: float = 0.0
+    encode_seconds: float = 0.0
+
+    @property
+    def encode_megapixels_per_second(self) -> float:
+        if self.encode_seconds <= 0:
+            return 0.0
+        return self.width * self.height / 1e6 / self.encode_seconds
+
+    @property
+    def output_bytes_per_second(self) -> float:
+        return self.bytes_written / self.encode_seconds if self.encode_seconds > 0 else 0.0
+
+
+class _CountingWriter:
+    """File wrapper that reports how many bytes have been written."""
+
+    def __init__(self, f, callback: Optional[Callable[[int], None]] = None):
+        self._f = f
+        self._callback = callback
+        self.written = 0
+
+    def write(self, data) -> int:
+        n = self._f.write(data)
+        self.written += len(data)
+        if self._callback is not None:
+            self._callback(self.written)
+        return n
+
+    def fileno(self):
+        # Force encoders through write() so every byte is counted
+        raise io.UnsupportedOperation("fileno")
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
+
+def argb32_to_pil(arr: np.ndarray, fmt: str) -> "Image.Image":
+    """Wrap an ARGB32 array as a PIL image suitable for the target format."""
+    if fmt.upper() in OPAQUE_FORMATS:
+        return Image.fromarray(np.ascontiguousarray(arr[..., [2, 1, 0]]), 'RGB')
+    return Image.fromarray(np.ascontiguousarray(arr[..., [2, 1, 0, 3]]), 'RGBA')
+
+
+def encode_array(arr: np.ndarray, file_path: str, options: ExportOptions,
+                 on_bytes: Optional[Callable[[int], None]] = None) -> ExportResult:
+    """Encode an ARGB32 array to a file (blocking; call from a worker)."""
+    start = time.perf_counter()
+    save_kwargs = options.to_save_kwargs()
+    if options.embed_profile and options.format.upper() in ICC_FORMATS:
+        color_manager = get_color_manager()
+        profile = color_manager.export_profile(options.icc_profile)
+        if profile is not None:
+            # Pixels are in the working space; move them into the requested profile
+            arr = color_manager.convert_array(arr, color_manager.working_profile, profile)
+            save_kwargs.setdefault('icc_profile', profile.data)
+    pil_image = argb32_to_pil(arr, options.format)
+    with open(file_path, 'wb') as f:
+        writer = _CountingWriter(f, on_bytes)
+        pil_image.save(writer, format=options.format.upper(), **save_kwargs)
+    return ExportResult(
+        path=file_path,
+        width=arr.shape[1],
+        height=arr.shape[0],
+        bytes_written=writer.written,
+        encode_seconds=time.perf_counter() - start
+    )
+
+
+class ExportService(QObject):
+    """Flattens and encodes documents in the background.
+
+    Flattening runs on one worker thread and encoding on another, so the
+    next export can be flattened while the previous one is still encoding.
+    Pillow releases the GIL inside its zlib/libjpeg/libwebp encoders.
+    """
+
+    # Signals
+    progress = pyqtSignal(int, str, int, int)  # job id, stage, done, total (0 = unknown)
+    export_finished = pyqtSignal(int, object)  # job id, ExportResult or list of them
+    export_failed = pyqtSignal(int, str)  # job id, error message
+
+    def __init__(self, parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self._flatten_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="export-flatten")
+        self._encode_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="export-encode")
+        self._job_ids = itertools.count(1)
+        self.jobs: Dict[int, Future] = {}
+
+    def export_layers(self, layer_manager, file_path: str,
+                      options: Optional[ExportOptions] = None) -> int:
+        """Export the visible layers of a document; returns a job id."""
+        options = options or ExportOptions.for_path(file_path)
+        return self._submit(layer_manager, file_path, self._encoder(file_path, options))
+
+    def export_array(self, arr: np.ndarray, file_path: str,
+                     options: Optional[ExportOptions] = None) -> int:
+        """Encode an already flattened ARGB32 array; returns a job id."""
+        options = options or ExportOptions.for_path(file_path)
+        return self._submit(arr, file_path, self._encoder(file_path, options))
+
+    def export_presets(self, source, base_path: str, presets=None) -> int:
+        """Flatten once and render every export preset; returns a job id.
+
+        ``source`` is a layer manager or an already flattened ARGB32 array.
+        The job result is the list of ExportResults, one per preset.
+        """
+        from utils.file_io.export_presets import get_presets, render_presets  # avoids an import cycle
+        presets = get_presets() if presets is None else presets
+        return self._submit(source, base_path,
+                            lambda job_id, arr: render_presets(arr, base_path, presets))
+
+    def wait(self, job_id: int, timeout: Optional[float] = None):
+        """Block until a job is done (mainly for scripts and batch use)."""
+        return self.jobs[job_id].result(timeout)
+
+    def shutdown(self):
+        """Finish pending exports and stop the workers."""
+        self._flatten_pool.shutdown(wait=True)
+        self._encode_pool.shutdown(wait=True)
+
+    def _encoder(self, file_path: str, options: ExportOptions) -> Callable:
+        """Create the encode step for a single file."""
+        def encode(job_id: int, arr: np.ndarray) -> ExportResult:
+            result = encode_array(
+                arr, file_path, options,
+                lambda written: self.progress.emit(job_id, 'encode', written, 0))
+            logger.info(f"Exported {file_path}: {result.encode_megapixels_per_second:.1f} MP/s, "
+                        f"{result.output_bytes_per_second / 1e6:.1f} MB/s written")
+            return result
+        return encode
+
+    def _submit(self, source, label: str, encode: Callable) -> int:
+        """Queue a job that flattens ``source`` (unless it is an array) and encodes it."""
+        job_id = next(self._job_ids)
+        self.jobs[job_id] = Future()
+        if isinstance(source, np.ndarray):
+            self._submit_encode(job_id, source, label, encode, 0.0)
+            return job_id
+
+        # Freezing is cheap and keeps the export consistent while editing continues
+        compositor = source.get_compositor(frozen=True)
+
+        def flatten():
+            start = time.perf_counter()
+            try:
+                arr = compositor.flatten(
+                    lambda done, total: self.progress.emit(job_id, 'flatten', done, total))
+            finally:
+                source.release_compositor(compositor)
+            return arr, time.perf_counter() - start
+
+        flatten_future = self._flatten_pool.submit(flatten)
+        flatten_future.add_done_callback(
+            lambda future: self._on_flattened(job_id, future, label, encode))
+        return job_id
+
+    def _on_flattened(self, job_id: int, future: Future, label: str, encode: Callable):
+        """Hand a flattened buffer to the encoder thread."""
+        try:
+            arr, flatten_seconds = future.result()
+        except Exception as e:
+            logger.error(f"Error flattening {label}: {e}")
+            self.jobs[job_id].set_exception(e)
+            self.export_failed.emit(job_id, str(e))
+            return
+        self._submit_encode(job_id, arr, label, encode, flatten_seconds)
+
+    def _submit_encode(self, job_id: int, arr: np.ndarray, label: str,
+                       encode: Callable, flatten_seconds: float):
+        def run():
+            try:
+                result = encode(job_id, arr)
+            except Exception as e:
+                logger.error(f"Error encoding {label}: {e}")
+                self.jobs[job_id].set_exception(e)
+                self.export_failed.emit(job_id, str(e))
+                return
+            for item in result if isinstance(result, list) else [result]:
+                item.flatten_seconds = flatten_seconds
+            self.jobs[job_id].set_result(result)
+            self.export_finished.emit(job_id, result)
+
+        self._encode_pool.submit(run)
@@ -0,0 +1,217 @@
+"""
+Image decoding for PixelCrafterX.
+Decodes image files once, straight into the canonical layer buffer.
+"""
+
+import io
+import logging
+import os
+import struct
+import time
+from dataclasses import dataclass
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+
+from core.layers.tile_store import TILE_SIZE, TileCache, TiledImage
+from utils.lazy_import import lazy_import
+
+# Pillow is loaded when the first image is opened
+Image = lazy_import("PIL.Image")
+TiffImagePlugin = lazy_import("PIL.TiffImagePlugin")
+TiffTags = lazy_import("PIL.TiffTags")
+
+logger = logging.getLogger(__name__)
+
+# TIFFs with at least this many pixels are decoded strip by strip
+TIFF_STREAM_PIXELS = 4096 * 4096
+
+# TIFF tags copied into the per-band in-memory TIFF
+_TIFF_IMAGE_WIDTH = 256
+_TIFF_IMAGE_LENGTH = 257
+_TIFF_STRIP_OFFSETS = 273
+_TIFF_ROWS_PER_STRIP = 278
+_TIFF_STRIP_BYTE_COUNTS = 279
+_TIFF_PLANAR_CONFIG = 284
+_TIFF_TILE_WIDTH = 322
+_TIFF_BAND_TAGS = (
+    256,  # ImageWidth
+    258,  # BitsPerSample
+    259,  # Compression
+    262,  # PhotometricInterpretation
+    277,  # SamplesPerPixel
+    284,  # PlanarConfiguration
+    317,  # Predictor
+    320,  # ColorMap
+    338,  # ExtraSamples
+    339,  # SampleFormat
+    347,  # JPEGTables
+    529,  # YCbCrCoefficients
+    530,  # YCbCrSubSampling
+    532,  # ReferenceBlackWhite
+)
+
+_SIXTEEN_BIT_MODES = ('I;16', 'I;16L', 'I;16B', 'I;16N')
+
+
+@dataclass
+class DecodeStats:
+    """Timing information for a single decode."""
+    path: str
+    file_bytes: int
+    seconds: float
+    width: int
+    height: int
+    streamed: bool = False
+
+    @property
+    def bytes_per_second(self) -> float:
+        return self.file_bytes / self.seconds if self.seconds > 0 else 0.0
+
+    @property
+    def megapixels_per_second(self) -> float:
+        return self.width * self.height / 1e6 / self.seconds if self.seconds > 0 else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            'seconds': self.seconds,
+            'file_bytes': self.file_bytes,
+            'bytes_per_second': self.bytes_per_second,
+            'megapixels_per_second': self.megapixels_per_second,
+            'streamed': self.streamed
+        }
+
+
+def pil_to_argb32(image: "Image.Image") -> np.ndarray:
+    """Convert a PIL image in any mode to an H x W x 4 ARGB32 array."""
+    mode = image.mode
+    if mode in _SIXTEEN_BIT_MODES or mode in ('I', 'F'):
+        values = np.asarray(image)
+        if mode == 'F':
+            scale = 1.0 if values.size == 0 or values.max() <= 1.0 else 255.0
+            gray = np.clip(values / scale * 255.0 + 0.5, 0, 255).astype(np.uint8)
+        else:
+            # 16-bit (and 32-bit integer) samples are rounded down to 8 bits
+            values = np.clip(values.astype(np.int64), 0, 65535)
+            gray = ((values * 255 + 32767) // 65535).astype(np.uint8)
+        rgba = np.empty(gray.shape + (4,), dtype=np.uint8)
+        rgba[..., 0] = rgba[..., 1] = rgba[..., 2] = gray
+        rgba[..., 3] = 255
+    else:
+        if mode != 'RGBA':
+            # Handles L, LA, P/PA (incl. tRNS transparency), 1, CMYK, YCbCr, RGB
+            image = image.convert('RGBA')
+        rgba = np.asarray(image)
+    # RGBA -> ARGB32 memory order (B, G, R, A)
+    return np.ascontiguousarray(rgba[..., [2, 1, 0, 3]])
+
+
+class ImageLoader:
+    """Decodes image files into layer buffers.
+
+    JPEGs opened for preview are downscaled inside the decoder via
+    ``Image.draft``; large strip-based TIFFs are decoded a band of strips
+    at a time so the full-resolution image is never resident at once.
+    """
+
+    def __init__(self, tile_cache: Optional[TileCache] = None):
+        self.tile_cache = tile_cache
+        self.last_stats: Optional[DecodeStats] = None
+
+    def decode_to_tiles(self, pil_image: "Image.Image", file_path: str,
+                        preview_size: Optional[Tuple[int, int]] = None) -> Tuple[TiledImage, DecodeStats]:
+        """Decode an opened image into a tiled layer buffer."""
+        start = time.perf_counter()
+        streamed = False
+        if preview_size is None and self._can_stream_tiff(pil_image):
+            image = TiledImage(pil_image.width, pil_image.height, cache=self.tile_cache)
+            for y, band in self._iter_tiff_bands(pil_image):
+                image.write_region(0, y, pil_to_argb32(band))
+            streamed = True
+        else:
+            pil_image = self._prepare(pil_image, preview_size)
+            image = TiledImage.from_array(pil_to_argb32(pil_image), cache=self.tile_cache)
+        stats = self._finish(file_path, start, image.width(), image.height(), streamed)
+        return image, stats
+
+    def decode_to_array(self, pil_image: "Image.Image", file_path: str,
+                        preview_size: Optional[Tuple[int, int]] = None) -> Tuple[np.ndarray, DecodeStats]:
+        """Decode an opened image into an H x W x 4 ARGB32 array."""
+        start = time.perf_counter()
+        pil_image = self._prepare(pil_image, preview_size)
+        arr = pil_to_argb32(pil_image)
+        stats = self._finish(file_path, start, arr.shape[1], arr.shape[0], False)
+        return arr, stats
+
+    def _prepare(self, pil_image: "Image.Image", preview_size: Optional[Tuple[int, int]]) -> "Image.Image":
+        """Decode the image, downscaling on decode when a preview size is given."""
+        if preview_size is not None:
+            if pil_image.format == 'JPEG':
+                # Let libjpeg skip DCT coefficients instead of resampling afterwards
+                pil_image.draft('RGB', preview_size)
+            pil_image.thumbnail(preview_size, Image.Resampling.LANCZOS)
+        pil_image.load()
+        return pil_image
+
+    def _finish(self, file_path: str, start: float, width: int, height: int, streamed: bool) -> DecodeStats:
+        """Record and log decode statistics."""
+        try:
+            file_bytes = os.path.getsize(file_path)
+        except OSError:
+            file_bytes = 0
+        stats = DecodeStats(file_path, file_bytes, time.perf_counter() - start, width, height, streamed)
+        self.last_stats = stats
+        logger.debug(f"Decoded {file_path} in {stats.seconds * 1000:.1f} ms "
+                     f"({stats.bytes_per_second / 1e6:.1f} MB/s)")
+        return stats
+
+    def _can_stream_tiff(self, pil_image: "Image.Image") -> bool:
+        """Check whether an image is a large, strip-organised TIFF."""
+        if pil_image.format != 'TIFF' or pil_image.width * pil_image.height < TIFF_STREAM_PIXELS:
+            return False
+        tags = pil_image.tag_v2
+        return (_TIFF_STRIP_OFFSETS in tags and _TIFF_TILE_WIDTH not in tags
+                and tags.get(_TIFF_PLANAR_CONFIG, 1) == 1)
+
+    def _iter_tiff_bands(self, pil_image: "Image.Image") -> Iterator[Tuple[int, "Image.Image"]]:
+        """Yield (y, band image) for groups of TIFF strips about one tile high."""
+        tags = pil_image.tag_v2
+        offsets = tags[_TIFF_STRIP_OFFSETS]
+        counts = tags[_TIFF_STRIP_BYTE_COUNTS]
+        rows_per_strip = min(tags.get(_TIFF_ROWS_PER_STRIP, pil_image.height), pil_image.height)
+        strips_per_band = max(1, TILE_SIZE // rows_per_strip)
+
+        for first in range(0, len(offsets), strips_per_band):
+            indices = range(first, min(first + strips_per_band, len(offsets)))
+            chunks = []
+            for i in indices:
+                pil_image.fp.seek(offsets[i])
+                chunks.append(pil_image.fp.read(counts[i]))
+            y = first * rows_per_strip
+            rows = min(len(chunks) * rows_per_strip, pil_image.height - y)
+            yield y, self._decode_band(tags, chunks, rows, rows_per_strip)
+
+    def _decode_band(self, tags, chunks, rows: int, rows_per_strip: int) -> "Image.Image":
+        """Decode a group of compressed strips by wrapping them in a minimal TIFF."""
+        ifd = TiffImagePlugin.ImageFileDirectory_v2(prefix=b'II')
+        for tag in _TIFF_BAND_TAGS:
+            if tag in tags:
+                ifd[tag] = tags[tag]
+                ifd.tagtype[tag] = tags.tagtype[tag]
+        ifd[_TIFF_IMAGE_LENGTH] = rows
+        ifd[_TIFF_ROWS_PER_STRIP] = rows_per_strip
+
+        # Strip offsets are relative to the end of the IFD; tobytes() rebases them
+        offsets, position = [], 0
+        for chunk in chunks:
+            offsets.append(position)
+            position += len(chunk)
+        ifd[_TIFF_STRIP_OFFSETS] = tuple(offsets)
+        ifd.tagtype[_TIFF_STRIP_OFFSETS] = TiffTags.LONG
+        ifd[_TIFF_STRIP_BYTE_COUNTS] = tuple(len(chunk) for chunk in chunks)
+        ifd.tagtype[_TIFF_STRIP_BYTE_COUNTS] = TiffTags.LONG
+
+        data = b'II*\x00' + struct.pack('<I', 8) + ifd.tobytes(8) + b''.join(chunks)
+        band = Image.open(io.BytesIO(data))
+        band.load()
+        return band
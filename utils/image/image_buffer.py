@@ -0,0 +1,51 @@
+"""
+Image buffer utilities for PixelCrafterX.
+Converts between QImage and numpy pixel buffers.
+
+Layer pixels are kept in the memory layout of ``QImage.Format_ARGB32``,
+which on little-endian machines is B, G, R, A per pixel.
+"""
+
+import numpy as np
+from PyQt6 import sip
+from PyQt6.QtGui import QImage
+
+CANONICAL_FORMAT = QImage.Format.Format_ARGB32
+
+
+def qimage_to_array(image: QImage, copy: bool = True) -> np.ndarray:
+    """Convert a QImage to an H x W x 4 uint8 array in ARGB32 layout."""
+    if image.format() != CANONICAL_FORMAT:
+        image = image.convertToFormat(CANONICAL_FORMAT)
+        # A view would outlive the converted temporary
+        copy = True
+    width = image.width()
+    height = image.height()
+    if width == 0 or height == 0:
+        return np.zeros((height, width, 4), dtype=np.uint8)
+
+    ptr = image.constBits()
+    ptr.setsize(image.sizeInBytes())
+    rows = np.frombuffer(ptr, np.uint8).reshape((height, image.bytesPerLine()))
+    arr = rows[:, :width * 4].reshape((height, width, 4))
+    return arr.copy() if copy else arr
+
+
+def array_to_qimage(arr: np.ndarray) -> QImage:
+    """Convert an H x W x 4 uint8 array in ARGB32 layout to a detached QImage."""
+    arr = np.ascontiguousarray(arr, dtype=np.uint8)
+    height, width = arr.shape[:2]
+    image = QImage(arr.data, width, height, width * 4, CANONICAL_FORMAT)
+    # Detach from the numpy buffer so the QImage owns its pixels
+    return image.copy()
+
+
+def qimage_view(arr: np.ndarray, fmt: QImage.Format = CANONICAL_FORMAT) -> QImage:
+    """Wrap a C-contiguous H x W x 4 uint8 array in a QImage that paints straight into it.
+
+    The array must outlive the image.
+    """
+    if not arr.flags.c_contiguous or not arr.flags.writeable:
+        raise ValueError("qimage_view needs a writable C-contiguous array")
+    height, width = arr.shape[:2]
+    return QImage(sip.voidptr(arr.ctypes.data), width, height, width * 4, fmt)
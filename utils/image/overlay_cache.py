@@ -0,0 +1,175 @@
+"""
+Overlay rendering cache for PixelCrafterX.
+Pre-renders grid, ruler and checkerboard tiles so they can be drawn as a single textured fill.
+
+Tiles are rendered in device pixels at a bucketed scale and handed out as
+QBrushes whose transform maps one tile onto its exact period in the
+caller's coordinates, so patterns stay aligned at any zoom.
+"""
+
+import math
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional
+
+from PyQt6.QtCore import QPointF, Qt
+from PyQt6.QtGui import QBrush, QColor, QPainter, QPen, QPixmap, QTransform
+
+# Grid lines closer than this many screen pixels are thinned out
+MIN_GRID_SPACING = 8
+# Major ruler ticks closer than this many screen pixels are thinned out
+MIN_RULER_SPACING = 60
+RULER_SIZE = 20  # ruler thickness in screen pixels
+RULER_SUBDIVISIONS = 10
+
+
+def zoom_bucket(scale: float) -> float:
+    """Round a device scale to a quarter octave, so nearby zooms share tiles."""
+    if scale <= 0:
+        return 1.0
+    return 2.0 ** (round(math.log2(scale) * 4) / 4)
+
+
+def grid_step(grid_size: float, zoom: float) -> float:
+    """Get the grid spacing to draw: ``grid_size`` doubled until lines are far enough apart."""
+    step = float(grid_size)
+    while step * zoom < MIN_GRID_SPACING:
+        step *= 2
+    return step
+
+
+def ruler_step(zoom: float) -> float:
+    """Get the spacing of labelled ruler ticks in scene units, a 1, 2 or 5 times power of ten."""
+    target = MIN_RULER_SPACING / max(zoom, 1e-6)
+    magnitude = 10.0 ** math.floor(math.log10(target))
+    for multiple in (1, 2, 5, 10):
+        if magnitude * multiple >= target:
+            return magnitude * multiple
+    return magnitude * 10
+
+
+class OverlayCache:
+    """LRU cache of pre-rendered overlay tiles, keyed by (kind, zoom bucket, size, colors, DPR)."""
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self._pixmaps: "OrderedDict[Hashable, QPixmap]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _pixmap(self, key: Hashable, width: int, height: int, render: Callable[[QPainter], None]) -> QPixmap:
+        with self._lock:
+            pixmap = self._pixmaps.get(key)
+            if pixmap is not None:
+                self._pixmaps.move_to_end(key)
+                self.hits += 1
+                return pixmap
+        pixmap = QPixmap(max(1, width), max(1, height))
+        painter = QPainter(pixmap)
+        render(painter)
+        painter.end()
+        with self._lock:
+            self.misses += 1
+            self._pixmaps[key] = pixmap
+            while len(self._pixmaps) > self.max_entries:
+                self._pixmaps.popitem(last=False)
+        return pixmap
+
+    def checkerboard_brush(self, cell: int = 8, color1: QColor = QColor(200, 200, 200),
+                           color2: QColor = QColor(255, 255, 255), dpr: float = 1.0) -> QBrush:
+        """Get a transparency checkerboard brush with ``color1`` in the top-left cell."""
+        px = max(1, round(cell * dpr))
+
+        def render(painter: QPainter):
+            painter.fillRect(0, 0, px * 2, px * 2, color2)
+            painter.fillRect(0, 0, px, px, color1)
+            painter.fillRect(px, px, px, px, color1)
+
+        pixmap = self._pixmap(('checker', cell, color1.rgba(), color2.rgba(), dpr), px * 2, px * 2, render)
+        brush = QBrush(pixmap)
+        brush.setTransform(QTransform.fromScale(cell / px, cell / px))
+        return brush
+
+    def grid_brush(self, grid_size: float, zoom: float, line_color: QColor, background: QColor,
+                   dpr: float = 1.0) -> QBrush:
+        """Get a brush tiling the background with grid lines every ``grid_step`` scene units.
+
+        Meant for painters in scene coordinates scaled by ``zoom``.
+        """
+        step = grid_step(grid_size, zoom)
+        bucket = zoom_bucket(zoom * dpr)
+        px = max(2, round(step * bucket))
+        line_width = max(1, round(dpr))
+
+        def render(painter: QPainter):
+            painter.fillRect(0, 0, px, px, background)
+            painter.setPen(QPen(line_color, line_width, Qt.PenStyle.DotLine))
+            offset = line_width / 2
+            painter.drawLine(QPointF(offset, 0), QPointF(offset, px))
+            painter.drawLine(QPointF(0, offset), QPointF(px, offset))
+
+        pixmap = self._pixmap(('grid', step, bucket, line_color.rgba(), background.rgba(), dpr), px, px, render)
+        brush = QBrush(pixmap)
+        brush.setTransform(QTransform.fromScale(step / px, step / px))
+        return brush
+
+    def ruler_brush(self, zoom: float, origin: float, vertical: bool, background: QColor,
+                    tick_color: QColor, dpr: float = 1.0) -> QBrush:
+        """Get a tick strip brush for a ruler in screen coordinates.
+
+        ``origin`` is the screen position of scene coordinate 0 along the
+        ruler. Labels are not part of the tile since they differ per tick.
+        """
+        step = ruler_step(zoom)
+        bucket = zoom_bucket(zoom * dpr)
+        length = max(RULER_SUBDIVISIONS, round(step * bucket))
+        thickness = max(1, round(RULER_SIZE * dpr))
+
+        def render(painter: QPainter):
+            if vertical:
+                # Swap the axes so the ticks end up on the right, next to the canvas
+                painter.setTransform(QTransform(0, 1, 1, 0, 0, 0))
+            painter.fillRect(0, 0, length, thickness, background)
+            painter.setPen(QPen(tick_color, max(1, round(dpr))))
+            for i in range(RULER_SUBDIVISIONS):
+                x = i * length / RULER_SUBDIVISIONS + 0.5
+                tick = thickness if i == 0 else thickness // 2 if i == RULER_SUBDIVISIONS // 2 else thickness // 4
+                painter.drawLine(QPointF(x, thickness), QPointF(x, thickness - tick))
+            painter.drawLine(QPointF(0, thickness - 0.5), QPointF(length, thickness - 0.5))
+
+        size = (thickness, length) if vertical else (length, thickness)
+        key = ('ruler', step, bucket, vertical, background.rgba(), tick_color.rgba(), dpr)
+        pixmap = self._pixmap(key, size[0], size[1], render)
+        brush = QBrush(pixmap)
+        along = step * zoom / length
+        across = 1 / dpr
+        if vertical:
+            brush.setTransform(QTransform(across, 0, 0, along, 0, origin))
+        else:
+            brush.setTransform(QTransform(along, 0, 0, across, origin, 0))
+        return brush
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get cache usage statistics."""
+        with self._lock:
+            return {
+                'entries': len(self._pixmaps),
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+    def clear(self):
+        with self._lock:
+            self._pixmaps.clear()
+
+
+_overlay_cache: Optional[OverlayCache] = None
+
+
+def get_overlay_cache() -> OverlayCache:
+    """Get the application-wide overlay cache."""
+    global _overlay_cache
+    if _overlay_cache is None:
+        _overlay_cache = OverlayCache()
+    return _overlay_cache
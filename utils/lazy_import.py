@@ -0,0 +1,79 @@
+"""
+Lazy imports for PixelCrafterX.
+Defers loading heavy dependencies until they are first used.
+"""
+
+import importlib
+import sys
+import threading
+import time
+import types
+from typing import Dict
+
+# Heavy packages that should not be imported before the first window shows
+HEAVY_MODULES = ('torch', 'torchvision', 'tensorflow', 'transformers', 'diffusers',
+                 'onnxruntime', 'scipy', 'sklearn', 'cv2')
+
+_proxies: Dict[str, "LazyModule"] = {}
+_import_times: Dict[str, float] = {}
+_lock = threading.RLock()
+
+
+class LazyModule(types.ModuleType):
+    """Stands in for a module and imports it on first attribute access."""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__['_lazy_module'] = None
+
+    def _load(self) -> types.ModuleType:
+        module = self.__dict__['_lazy_module']
+        if module is None:
+            with _lock:
+                module = self.__dict__['_lazy_module']
+                if module is None:
+                    start = time.perf_counter()
+                    module = importlib.import_module(self.__name__)
+                    _import_times[self.__name__] = time.perf_counter() - start
+                    self.__dict__['_lazy_module'] = module
+        return module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self) -> str:
+        state = "loaded" if self.__dict__['_lazy_module'] is not None else "not loaded"
+        return f"<lazy module '{self.__name__}' ({state})>"
+
+
+def lazy_import(name: str) -> types.ModuleType:
+    """Get a module, or a proxy that imports it on first use.
+
+    Missing modules only raise ImportError when they are actually used,
+    so optional dependencies can be referenced at module level.
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    with _lock:
+        if name not in _proxies:
+            _proxies[name] = LazyModule(name)
+        return _proxies[name]
+
+
+def is_loaded(name: str) -> bool:
+    """Check whether a module has really been imported."""
+    return name in sys.modules
+
+
+def get_import_times() -> Dict[str, float]:
+    """Get the seconds spent importing each lazily loaded module."""
+    return dict(_import_times)
+
+
+def loaded_heavy_modules():
+    """Get the heavy packages that have been imported so far."""
+    return [name for name in HEAVY_MODULES if name in sys.modules]
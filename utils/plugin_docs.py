@@ -17,8 +17,9 @@ class PluginDocumentation:
         if not os.path.exists(self.output_dir):
             os.makedirs(self.output_dir)
     
-    def generate_docs(self, plugin_name: str, plugin_module: Any, metadata: Dict = None) -> bool:
-        """Generate documentation for a specific plugin."""
+    def generate_docs(self, plugin_name: str, plugin_module: Any, metadata: Dict = None,
+                      profiler: Any = None) -> bool:
+        """Generate documentation for a specific plugin, with its timings if a profiler is given."""
         try:
             doc_data = {
                 'name': plugin_name,
@@ -28,6 +29,8 @@ class PluginDocumentation:
                 'classes': self._extract_classes(plugin_module),
                 'attributes': self._extract_attributes(plugin_module)
             }
+            if profiler is not None:
+                doc_data['performance'] = profiler.get_stats(plugin_name).get(plugin_name, {})
             
             # Generate markdown
             markdown = self._generate_markdown(doc_data)
@@ -48,6 +51,35 @@ class PluginDocumentation:
             logger.error(f"Error generating documentation for {plugin_name}: {e}")
             return False
     
+    def generate_performance_report(self, profiler: Any) -> bool:
+        """Write a performance report covering every profiled plugin."""
+        try:
+            report = {
+                'generated_at': datetime.now().isoformat(),
+                'event_budget_ms': profiler.event_budget_ms,
+                'event_budgets': profiler.event_budgets,
+                'plugin_costs_ms': dict(profiler.plugin_costs()),
+                'plugins': profiler.get_stats()
+            }
+            md = "# Plugin Performance\n\n"
+            md += f"Generated {report['generated_at']}\n\n"
+            md += "## Total time per plugin\n\n"
+            for name, total_ms in report['plugin_costs_ms'].items():
+                md += f"- **{name}**: {total_ms:.1f} ms\n"
+            md += "\n## Entry points\n\n"
+            md += profiler.format_markdown()
+            
+            with open(os.path.join(self.output_dir, "performance.md"), 'w') as f:
+                f.write(md)
+            with open(os.path.join(self.output_dir, "performance.json"), 'w') as f:
+                json.dump(report, f, indent=4)
+            
+            logger.info("Generated plugin performance report")
+            return True
+        except Exception as e:
+            logger.error(f"Error generating plugin performance report: {e}")
+            return False
+    
     def _extract_functions(self, module: Any) -> List[Dict]:
         """Extract function information from a module."""
         functions = []
@@ -179,4 +211,13 @@ class PluginDocumentation:
             for attr in doc_data['attributes']:
                 md += f"- `{attr['name']}`: {attr['type']} = {attr['value']}\n"
         
+        # Performance
+        if doc_data.get('performance'):
+            md += "\n## Performance\n\n"
+            md += "| Entry point | Calls | Mean ms | p95 ms | Max ms | CPU mean ms | Over budget |\n"
+            md += "|---|---|---|---|---|---|---|\n"
+            for entry, stats in doc_data['performance'].items():
+                md += (f"| {entry} | {stats['calls']} | {stats['wall_mean_ms']:.2f} | {stats['wall_p95_ms']:.2f} | "
+                       f"{stats['wall_max_ms']:.2f} | {stats['cpu_mean_ms']:.2f} | {stats['over_budget']} |\n")
+        
         return md 
\ No newline at end of file
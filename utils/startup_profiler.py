@@ -0,0 +1,117 @@
+"""
+Startup profiling for PixelCrafterX.
+Summarizes ``python -X importtime`` output and time to first window.
+"""
+
+import os
+import subprocess
+import sys
+from collections import defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Printed by ``main.py --startup-probe`` once the first window has been shown
+FIRST_WINDOW_MARKER = "PIXELCRAFTERX_FIRST_WINDOW_MS="
+HEAVY_MODULES_MARKER = "PIXELCRAFTERX_HEAVY_MODULES="
+
+
+@dataclass
+class ImportRecord:
+    """One line of ``-X importtime`` output."""
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+@dataclass
+class StartupProfile:
+    """Result of one profiled startup."""
+    first_window_ms: Optional[float]
+    heavy_modules: List[str] = field(default_factory=list)
+    imports: List[ImportRecord] = field(default_factory=list)
+
+    @property
+    def import_ms(self) -> float:
+        """Total time spent in imports."""
+        return sum(record.self_us for record in self.imports) / 1000
+
+    def by_package(self) -> Dict[str, float]:
+        """Import time in ms per top-level package, slowest first."""
+        totals: Dict[str, float] = defaultdict(float)
+        for record in self.imports:
+            totals[record.module.split('.')[0]] += record.self_us / 1000
+        return dict(sorted(totals.items(), key=lambda item: item[1], reverse=True))
+
+    def slowest(self, count: int = 15) -> List[ImportRecord]:
+        """Modules with the largest cumulative import time."""
+        return sorted(self.imports, key=lambda record: record.cumulative_us, reverse=True)[:count]
+
+    def format_report(self, count: int = 15) -> str:
+        """Render the profile as a text report."""
+        lines = ["PixelCrafterX startup profile", ""]
+        if self.first_window_ms is not None:
+            lines.append(f"Time to first window: {self.first_window_ms:8.1f} ms")
+        lines.append(f"Time in imports:      {self.import_ms:8.1f} ms ({len(self.imports)} modules)")
+        lines.append(f"Heavy modules loaded: {', '.join(self.heavy_modules) or 'none'}")
+        lines += ["", "Slowest imports (cumulative ms, self ms):"]
+        for record in self.slowest(count):
+            lines.append(f"  {record.cumulative_us / 1000:8.1f} {record.self_us / 1000:8.1f}  "
+                         f"{'  ' * record.depth}{record.module}")
+        lines += ["", "Import time by package (self ms):"]
+        for package, ms in list(self.by_package().items())[:count]:
+            lines.append(f"  {ms:8.1f}  {package}")
+        return "\n".join(lines)
+
+
+def parse_importtime(output: str) -> List[ImportRecord]:
+    """Parse the ``import time:`` lines written to stderr by ``-X importtime``."""
+    records = []
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # header line
+        name = parts[2].rstrip()
+        stripped = name.lstrip()
+        records.append(ImportRecord(
+            module=stripped,
+            self_us=int(parts[0]),
+            cumulative_us=int(parts[1]),
+            depth=(len(name) - len(stripped) - 1) // 2
+        ))
+    return records
+
+
+def run_startup_probe(main_script: Path, importtime: bool = True, timeout: float = 120) -> StartupProfile:
+    """Start the application in a child process and measure its startup."""
+    command = [sys.executable]
+    if importtime:
+        command += ["-X", "importtime"]
+    command += [str(main_script), "--startup-probe"]
+    result = subprocess.run(command, capture_output=True, text=True, timeout=timeout,
+                            cwd=str(main_script.parent), env=dict(os.environ))
+
+    first_window_ms = None
+    heavy_modules: List[str] = []
+    for line in result.stdout.splitlines():
+        if line.startswith(FIRST_WINDOW_MARKER):
+            first_window_ms = float(line[len(FIRST_WINDOW_MARKER):])
+        elif line.startswith(HEAVY_MODULES_MARKER):
+            heavy_modules = [name for name in line[len(HEAVY_MODULES_MARKER):].split(",") if name]
+    if first_window_ms is None:
+        raise RuntimeError(f"Startup probe failed (exit code {result.returncode}):\n{result.stderr[-2000:]}")
+    return StartupProfile(first_window_ms, heavy_modules, parse_importtime(result.stderr))
+
+
+def profile_startup(main_script: Path) -> int:
+    """Print a startup report; used by ``main.py --profile-startup``."""
+    try:
+        profile = run_startup_probe(main_script)
+    except Exception as e:
+        print(f"Error profiling startup: {e}")
+        return 1
+    print(profile.format_report())
+    return 0